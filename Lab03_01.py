@@ -3,24 +3,11 @@
 import numpy as np
 import matplotlib.pyplot as plt
 import json 
-from math import factorial, pi 
+from ccera.beam import airy
 import time 
 from datetime import datetime 
 
-# Airy function .   We will use this in Lab03_02.py 
-
-def airy(mean_time, base_temp, peak_temp, width) : 
-    times = np.linspace(mean_time-1000.,mean_time+1000.,200)
-    airy_function = [] 
-    for tt in times :
-        r = (tt-mean_time)/width 
-        t, I = 0.5*pi*r, 1.
-        for k in range(1,20) :
-            dI = (-1)**k * t**(2*k) / (factorial(k)*factorial(k+1))
-            I = I + dI 
-        I *= I
-        airy_function.append(I) 
-    return times, base_temp + peak_temp*np.array(airy_function)
+# the Airy beam model shared by the Lab03 and Lab04 scripts lives in ccera/beam.py
 
 # begin execution
 
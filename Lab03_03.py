@@ -3,24 +3,12 @@
 import numpy as np
 import matplotlib.pyplot as plt
 import json 
-from math import factorial, pi 
+from ccera.beam import airy
+from ccera.transit import fitTransit
 import time 
 from datetime import datetime 
 
-# Airy function .   We will use this in Lab03_02.py 
-
-def airy(mean_time, base_temp, peak_temp, width) : 
-    times = np.linspace(mean_time-1000.,mean_time+1000.,200)
-    airy_function = [] 
-    for tt in times :
-        r = (tt-mean_time)/width 
-        t, I = 0.5*pi*r, 1.
-        for k in range(1,20) :
-            dI = (-1)**k * t**(2*k) / (factorial(k)*factorial(k+1))
-            I = I + dI 
-        I *= I
-        airy_function.append(I) 
-    return times, base_temp + peak_temp*np.array(airy_function)
+# the Airy beam model shared by the Lab03 and Lab04 scripts lives in ccera/beam.py
 
 # begin execution
 
@@ -43,7 +31,11 @@ times = np.linspace(t_start, t_stop, nVals)
 calib = 17.3
 power *= calib
 
-mean_time, base_temp, peak_temp, width = 1855., 150., 13250., 325.
+# fit the Airy beam instead of tuning the parameters by hand
+(mean_time, base_temp, peak_temp, width), errors, rms, nFit, flag = fitTransit(times, power)
+print("mean_time={0:.1f}+/-{1:.1f} s base_temp={2:.1f}+/-{3:.1f} K peak_temp={4:.1f}+/-{5:.1f} K width={6:.1f}+/-{7:.1f} s".format(
+      mean_time, errors[0], base_temp, errors[1], peak_temp, errors[2], width, errors[3]))
+if flag : print("Warning: fit rejected ({0:s})".format(flag))
 
 airy_times, airy_function = airy(mean_time, base_temp, peak_temp, width)
 
@@ -3,24 +3,12 @@
 import numpy as np
 import matplotlib.pyplot as plt
 import json 
-from math import factorial, pi 
+from ccera.beam import airy
+from ccera.transit import fitTransit
 import time 
 from datetime import datetime
 
-# Airy function .   We will use this in Lab03_02.py 
-
-def airy(mean_time, base_temp, peak_temp, width) : 
-    times = np.linspace(mean_time-500.,mean_time+500.,200)
-    airy_function = [] 
-    for tt in times :
-        r = (tt-mean_time)/width 
-        t, I = 0.5*pi*r, 1.
-        for k in range(1,20) :
-            dI = (-1)**k * t**(2*k) / (factorial(k)*factorial(k+1))
-            I = I + dI 
-        I *= I
-        airy_function.append(I) 
-    return times, base_temp + peak_temp*np.array(airy_function)
+# the Airy beam model shared by the Lab03 and Lab04 scripts lives in ccera/beam.py
 
 # begin execution
 
@@ -44,12 +32,16 @@ times = np.linspace(t_start, t_stop, nVals)
 calib = 17.3
 power *= calib
 
-mean_time, base_temp, peak_temp, width = 3610., 91.5, 22., 400.
-airy_times, airy_function = airy(mean_time, base_temp, peak_temp, width)
-peak_idx = np.argmax(power)
-peak_time_sec = times[peak_idx]
+# fit the Airy beam; the peak time comes from the fit rather than from
+# the noisiest sample (np.argmax)
+(mean_time, base_temp, peak_temp, width), errors, rms, nFit, flag = fitTransit(times, power)
+airy_times, airy_function = airy(mean_time, base_temp, peak_temp, width, half_range=500.)
+peak_time_sec = mean_time
 time_string = time.strftime("%H:%M:%S", time.gmtime(peak_time_sec))
-print(f"Peak time for {base_name}: {time_string}")
+print(f"Peak time for {base_name}: {time_string} +/- {errors[0]:.1f} s")
+print("base_temp={0:.1f} K peak_temp={1:.1f}+/-{2:.1f} K width={3:.1f}+/-{4:.1f} s".format(
+      base_temp, peak_temp, errors[2], width, errors[3]))
+if flag : print("Warning: fit rejected ({0:s})".format(flag))
 
                              
 plt.plot(times, power, 'b.', label="Measured Power")
@@ -1,18 +1,15 @@
 import matplotlib.pyplot as plt
 import numpy as np
-from math import sqrt, sin
+from ccera.maps import radialMap, sinkr
 
 nRows, nCols = 500, 500
-mapData = 0.3*np.ones((nRows,nCols))   # gray background
 
 zMax = 1.
 k = 2.
 x = np.linspace(-1.,1.,nRows)
 y = np.linspace(-1.,1.,nCols)
-for i in range(nCols) :
-    for j in range(nRows) :
-        r = sqrt(x[j]*x[j] + y[i]*y[i])
-        mapData[j][i] = sin(k*r)/ r 
+# sin(kr)/r evaluated over the whole grid at once (safe at r=0) 
+mapData = radialMap(sinkr(k), x, y)
 
 fig = plt.figure(figsize=(10.5,8.))
 ax = fig.add_subplot(111)
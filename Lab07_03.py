@@ -1,119 +1,39 @@
 import matplotlib.pyplot as plt
 import numpy as np
-import glob
-
-def getMetaData(file) :
-    import json
-    with open(file) as json_file:
-        dict = json.load(json_file)
-        #print("From file {0:s} \nread dictionary={1:s}".format(file,str(dict)))
-    return dict 
-
-def getData(file,fft_size) :
-    vals = np.fromfile(file, dtype=np.float32)
-    cols = fft_size
-    rows = int(len(vals)/fft_size) 
-    return vals, rows, cols
-
-def getFreqs(metadata) :
-    dF = 1.e-6*metadata['srate']
-    fMin = 1.e-6*metadata['freq'] - 0.5*dF
-    fMax = 1.e-6*metadata['freq'] + 0.5*dF
-    #print("getFreqs: fMin={0:e} fMax={1:e}".format(fMin,fMax))
-    freqs = np.linspace(fMin,fMax,metadata['fft_size'])
-    return freqs
-
-def getVelocities(f) :
-    f0, c = 1420.41, 3.0e5
-    v = c*(f/f0 - 1.)
-    return v
-
-# fit spectrum to Chebyshev polynomial 
-# restrict range of fit to |vDoppler| > vSignal 
-def fitBackground(vDoppler,power,n,vSignal) :
-    weights = np.ones_like(vDoppler)
-    for i in range(len(vDoppler)) :
-        if abs(vDoppler[i]) < vSignal : weights[i] = 1.e-6 
-    series = np.polynomial.chebyshev.Chebyshev.fit(vDoppler, power, n, w=weights)
-    background = series(vDoppler) 
-    return background
-
-def anaSpectrum(base_name) :
-    #print("In anaSpectrum() base_name={0:s}".format(base_name))
-    metadata = getMetaData(base_name + ".json")
-    fft_size = metadata['fft_size']
-
-    # we will use channel 1 
-    chan = 1
-    data_file = base_name + "_{0:d}.avg".format(chan)
-    power, rows, cols = getData(data_file,fft_size)
-
-    freqs = getFreqs(metadata)
-    vDoppler = getVelocities(freqs)
-    power *= 1.10e5
-
-    vMin, vMax = -300., 300.
-    i1 = np.searchsorted(vDoppler,vMin)
-    i2 = np.searchsorted(vDoppler,vMax)
-    #print("i1={0:d} i2={1:d}".format(i1,i2))
-    freqs = freqs[i1:i2]
-    vDoppler = vDoppler[i1:i2]
-    power = power[i1:i2]
-
-    background = fitBackground(vDoppler,power,5,200.)
-  
-    return vDoppler, power-background 
-
+from ccera.index import updateIndex, selectDirectories, baseNames
+from ccera.parallel import anaCampaign
+from ccera.gridding import getAxis, gridSpectra
+from ccera.rotation import tangentVelocity, rotationCurve
 
 # begin execution here
 
-# Get a list of files.  Make sure that they are ordered by time
-files = glob.glob("./Lab07_data/*.json")
-files.sort() 
+# Get the metadata of every file from the index, ordered by time.  Only
+# sidecars that are new or changed since the last run are parsed.
+meta = selectDirectories(updateIndex(["./Lab07_data"]), ["./Lab07_data"])
+files = meta['path'].tolist()
 print("files={0:s}".format(str(files)))
 
-# analyse the first file to establish the parameters of the plot
-base_name = "." + files[0].strip(".json")
-vDoppler, power = anaSpectrum(base_name)
-nRows, nCols = len(files), len(vDoppler)
+# analyse all of the files in parallel, one row per file in time order
+base_names = baseNames(meta)
+vDoppler, spectra, errors = anaCampaign(base_names, meta=meta)
+for row, base_name, message in errors :
+    print("anaSpectrum failed for {0:s}: {1:s}".format(base_name, message))
+calculatedvLSR = meta['vlsr']
+glonList = meta['gLon']
+
+# grid the spectra onto 3 degree longitude pixels along the plane.  Pointings
+# that fall in the same pixel are averaged rather than overwriting each other,
+# and files that could not be analysed (rows of NaN) are left out.
+lonAxis = getAxis(0., 90., 3.)
+cube, weight = gridSpectra(meta['gLon'], meta['gLat'], spectra, lonAxis, [0.], fwhm=1.5, fill=0.)
+mapData = np.maximum(cube[:, 0, :], 0.)
+nRows, nCols = mapData.shape
 print("nRows={0:d} nCols={1:d}".format(nRows,nCols))
-mapData = np.zeros((nRows,nCols))
-calculatedvLSR=[]
-glonList = []
-vPrime = []
-
-longitude = []
-radius = []
-vRotation = []
-R = 2.46e20/1000
-Omega = 7.98e-16
-
-for i, file in enumerate(files) :
-    metadata = getMetaData(file)
-    base_name =  "." + file.strip(".json")
-    vDoppler, power = anaSpectrum(base_name)
-    gLon = float(metadata['gLon'])
-    row = int(gLon/3 + 0.5)
-    mapData[row] = np.maximum(power,0.)
-    vLSR = metadata['vlsr']
-    calculatedvLSR.append(vLSR)
-    glonList.append(gLon)
-    longitude.append(gLon)
-    v_uncorrected = ''
-    
-    for i, p in enumerate(power):
-        if p > 5.:
-            vPrime.append(vDoppler[i])
-            v_uncorrected = vDoppler[i]
-            break
-    
-    v_corrected = vLSR - v_uncorrected
-    v_r = v_corrected + R*Omega*np.sin(np.radians(gLon))
-    radius.append(R*np.sin(np.radians(gLon)))
-    vRotation.append(v_r)
 
-aRotation = [a/b for a,b in zip(vRotation, radius)]
-        
+# tangent point velocity: first channel above 5 K in every spectrum
+# (NaN where there is no signal), then the rotation curve for all of them
+vPrime = tangentVelocity(spectra, vDoppler, 5.)
+vRotation, radius, aRotation = rotationCurve(glonList, vPrime, calculatedvLSR)
 
 print("Rotational Velocity: ", vRotation)
 print("Radius: ", radius)
@@ -9,7 +9,7 @@
 import matplotlib.pyplot as plt
 import numpy as np
 from math import pi, sqrt, atan
-import scipy.special as sps
+from ccera.galaxy import fitRotationCurve, haloVelocity, diskVelocity, diskShape
 
 # define variations basic parameters 
 c = 3.0e8
@@ -47,20 +47,11 @@ def getKepler(Md) :
     print("M={0:e}".format(M))
     return R, vKepler 
 
+# the exponential disk comes from ccera.galaxy, which reads the
+# r^2 (I0K0 - I1K1) factor from a table instead of four Bessel function calls
 def getExponentialDisk(Md) :
-    M = Md*mSun*1.0e11
     r = np.linspace(0., fMax*R_D, 100)
-    arg = 0.5*r/R_D
-    I0 = sps.iv(0,arg)
-    K0 = sps.kn(0,arg)
-    I1 = sps.iv(1,arg)
-    K1 = sps.kn(1,arg)
-
-    rsq = np.multiply(r,r)
-    factor = 0.5*M*G/(R_D**3)
-    vsq = np.multiply(I0,K0) - np.multiply(I1,K1)
-    vsq = factor*np.multiply(rsq,vsq)
-    v = np.sqrt(vsq)
+    v = diskVelocity(r, Md)
     return r, v 
 
 def getIsothermalSphere(Md,mIso,aIso) :
@@ -76,8 +67,7 @@ def getIsothermalSphere(Md,mIso,aIso) :
     rhoIso = mIso/(4.*pi*(rSun**2+aIso**2)*(rSun - aIso*atan(rSun/aIso)))
     print("rhoIso={0:e}".format(rhoIso)) 
     vIso = 4.*pi*rhoIso*G*(rSun**2 + aIso**2)*(1. - np.multiply(aIso/r,np.arctan(r/aIso)))
-    dummy, vExpoDisk = getExponentialDisk(Md)
-    vsq = np.multiply(vExpoDisk,vExpoDisk) 
+    vsq = Md*diskShape(r)
     vIso += vsq
     vIso = np.sqrt(vIso)
     mMW = 4*pi*rhoIso*(rSun**2 + aIso**2)*(390000*lightYear)
@@ -101,5 +91,14 @@ plt.plot((np.array(radius)*1000/lightYear)/1000,np.array(vRotation),'ro',label='
 plt.plot(0.001*rKepler/lightYear,0.001*vKepler,'b--',label='Kepler')
 plt.plot(0.001*r/lightYear, 0.001*v, 'g--', label="Exponential Disk")
 plt.plot(0.001*rIso/lightYear, 0.001*vIso, 'r--', label="Isothermal Sphere")
+
+# fit the disk + isothermal sphere model to the data over a grid of parameters 
+fit = fitRotationCurve(radius, vRotation, np.linspace(0.01,3.,100),
+                       np.linspace(0.01,3.,100), np.linspace(1.,60.,100))
+print("Best fit: Md={0:.3f}+/-{1:.3f} mIso={2:.3f}+/-{3:.3f} aIso={4:.2f}+/-{5:.2f} k.l-y chi2={6:.1f} for {7:d} points".format(
+      fit['Md'],fit['dMd'],fit['mIso'],fit['dmIso'],fit['aIso'],fit['daIso'],fit['chi2'],fit['nData']))
+rFit = np.linspace(0.1*R_D,fMax*R_D,100)
+vFit = haloVelocity(rFit,fit['Md'],fit['mIso'],fit['aIso'])
+plt.plot(0.001*rFit/lightYear, 0.001*vFit, 'k-', label="Best Fit")
 plt.legend()
 plt.show()
\ No newline at end of file
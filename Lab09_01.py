@@ -3,6 +3,10 @@
 import numpy as np
 import matplotlib.pyplot as plt 
 import json 
+from ccera.reader import openSeries, ScaledSeries
+from ccera.pulsar import openPulsarRun, foldSeries
+from ccera.search import searchRun
+from ccera.singlepulse import searchRunPulses
 
 # get the JSON file 
 base_name = './data/2024-07-26-1804'
@@ -16,9 +20,37 @@ c_rate = f_sample/fft_size/n_decimate
 t_fft = 1./c_rate 
 
 # for now, we will look at just a single file (there are two, 
-# one for each polarization) 
+# one for each polarization).  The file is memory mapped and the factor
+# of 1000 is only applied to the samples we actually look at.
 file = base_name + "_1.sum"
-power_time_series = 1000*np.fromfile(file, dtype=np.float32)
+power_time_series = ScaledSeries(openSeries(file), 1000.)
 nSamples = len(power_time_series)
 print("nSamples={0:d}".format(nSamples))
-times = np.linspace(0.,nSamples*t_fft,nSamples) 
\ No newline at end of file
+times = np.linspace(0.,nSamples*t_fft,nSamples) 
+
+# look for the pulsar with an FFT periodicity search (harmonic sums of
+# 1 to 16 harmonics) before folding
+candidates = searchRun(base_name, fMin=0.5, nCandidates=5)
+for cand in candidates[:5] :
+    print("P={0:.6f} s  f={1:.5f} Hz  harmonics={2:d}  sigma={3:.1f}".format(
+        cand['period'], cand['freq'], cand['harmonics'], cand['sigma']))
+
+# individual bright pulses (and RFI bursts) above 6 sigma 
+events = searchRunPulses(base_name, threshold=6.)
+print("{0:d} single pulse events".format(len(events)))
+for event in events[np.argsort(events['snr'])[::-1][:10]] :
+    print("t={0:9.4f} s  width={1:4d} samples  S/N={2:.1f}".format(event['time'], event['width'], event['snr']))
+
+# fold both polarizations at the pulsar period.  The series are streamed
+# from disk a chunk at a time, so this works for runs of any length. 
+period = 0.714519699      # J0332+5434 period (s) 
+nBins = 128
+metadata, series = openPulsarRun(base_name)
+profile, counts = foldSeries(series, t_fft, period, nBins=nBins)
+phase = (np.arange(nBins) + 0.5)/nBins
+
+plt.plot(phase, 1000*profile, 'b-')
+plt.title("Folded profile of {0:s} at P={1:.6f} s".format(metadata['target'], period))
+plt.xlabel("Pulse phase")
+plt.ylabel("Power")
+plt.show()
@@ -0,0 +1,5 @@
+# Shared analysis code for the CCERA radio telescope labs.
+#
+# The Lab scripts import what they need directly from the submodules
+# (e.g. "from ccera.beam import airy") so that importing the package
+# itself stays cheap.
@@ -0,0 +1,5 @@
+# python -m ccera <subcommand> ...; see ccera/cli.py
+
+from ccera.cli import main
+
+main()
@@ -0,0 +1,138 @@
+# Animation of the HI spectra of a campaign (Lab06_animation).
+#
+# The spectra are analysed ahead of the display on a background thread
+# (prefetchSpectra), so showing a frame never waits on anaSpectrum.
+#
+# animate() shows the frames in a window using blitting: the axes,
+# labels and ticks are drawn once and saved, and each frame only restores
+# that background and redraws the line and the time label.
+#
+# renderFrames() is the headless mode.  It draws on an Agg canvas without
+# going through pyplot, so it works on a node with no display, and
+# writes a PNG sequence (output is a directory), an animated GIF or, if
+# ffmpeg is installed, a video (.mp4, ...).
+#
+#     python -m ccera.animation ./AL045 AL045.gif
+
+import glob
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from ccera import instrument
+from ccera.spectrum import anaSpectrum
+
+def listBaseNames(directory) :
+    files = glob.glob(os.path.join(directory, "*.json"))
+    files.sort()
+    return [file.removesuffix(".json") for file in files]
+
+def prefetchSpectra(base_names, depth=8, **kwargs) :
+    """Yield (base_name, vDoppler, power) with up to depth files analysed ahead.
+
+    kwargs are passed on to anaSpectrum().  A file that cannot be analysed
+    is reported and skipped.
+    """
+    with ThreadPoolExecutor(max_workers=1) as pool :
+        pending = deque()
+        names = iter(base_names)
+
+        def submit() :
+            base_name = next(names, None)
+            if base_name is not None :
+                pending.append((base_name, pool.submit(anaSpectrum, base_name, **kwargs)))
+
+        for i in range(depth) : submit()
+        while pending :
+            base_name, future = pending.popleft()
+            submit()
+            try :
+                vDoppler, power = future.result()
+            except Exception as e :
+                print("anaSpectrum failed for {0:s}: {1:s}: {2:s}".format(base_name, type(e).__name__, str(e)))
+                continue
+            yield base_name, vDoppler, power
+
+def setupAxes(fig, vMin=-200., vMax=200., yMin=-5., yMax=50.) :
+    """The spectrum axes of the animation; returns (ax, line, timeText)."""
+    ax = fig.add_subplot(111)
+    ax.set_xlim([vMin,vMax])
+    ax.set_ylim([yMin,yMax])
+    line, = ax.plot([], [], 'b.')
+    ax.set_title("PSD vs Approach Velocity")
+    ax.set_xlabel("v (km/s)")
+    ax.set_ylabel("PSD (K)")
+    timeText = ax.text(vMin+0.5*(vMax-vMin), 40., " ", fontsize=14)
+    return ax, line, timeText
+
+def animate(base_names, interval=0.5, **kwargs) :
+    """Show the spectra one after another in a window, using blitting."""
+    import matplotlib.pyplot as plt
+    fig = plt.figure(1)
+    ax, line, timeText = setupAxes(fig)
+    line.set_animated(True)
+    timeText.set_animated(True)
+    plt.show(block=False)
+    fig.canvas.draw()
+    background = fig.canvas.copy_from_bbox(fig.bbox)
+    for base_name, vDoppler, power in prefetchSpectra(base_names, **kwargs) :
+        if not plt.fignum_exists(fig.number) : break
+        line.set_data(vDoppler, power)
+        timeText.set_text(os.path.basename(base_name))
+        fig.canvas.restore_region(background)
+        ax.draw_artist(line)
+        ax.draw_artist(timeText)
+        fig.canvas.blit(fig.bbox)
+        fig.canvas.flush_events()
+        fig.canvas.start_event_loop(interval)
+    plt.show()
+
+@instrument.timed()
+def renderFrames(base_names, output, fps=10, dpi=100, figsize=(6.4, 4.8), **kwargs) :
+    """Render every spectrum to output without a display.
+
+    output: a directory (PNG frames frame_0000.png, ...), a .gif file or a
+    video file (needs ffmpeg).  Returns the number of frames written.
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax, line, timeText = setupAxes(fig)
+
+    writer = None
+    ext = os.path.splitext(output)[1].lower()
+    if ext :
+        from matplotlib import animation
+        if ext == ".gif" : writer = animation.PillowWriter(fps=fps)
+        elif animation.writers.is_available("ffmpeg") : writer = animation.FFMpegWriter(fps=fps)
+        else : raise RuntimeError("ffmpeg is needed to write {0:s}; use a .gif or a directory".format(output))
+        writer.setup(fig, output, dpi=dpi)
+    else :
+        os.makedirs(output, exist_ok=True)
+
+    nFrames = 0
+    for base_name, vDoppler, power in prefetchSpectra(base_names, **kwargs) :
+        line.set_data(vDoppler, power)
+        timeText.set_text(os.path.basename(base_name))
+        with instrument.stage("render") :
+            if writer is None : fig.savefig(os.path.join(output, "frame_{0:04d}.png".format(nFrames)), dpi=dpi)
+            else : writer.grab_frame()
+        nFrames += 1
+    if writer is not None : writer.finish()
+    return nFrames
+
+if __name__ == "__main__" :
+    import argparse
+    parser = argparse.ArgumentParser(description="Animate the HI spectra of a campaign")
+    parser.add_argument("directory")
+    parser.add_argument("output", nargs="?", help="directory, .gif or video file; omit to show a window")
+    parser.add_argument("--fps", type=float, default=10.)
+    parser.add_argument("--calib", type=float, default=1.10e5, help="default 1.10e5, as in Lab06_animation.py")
+    args = parser.parse_args()
+    base_names = listBaseNames(args.directory)
+    if args.output is None :
+        animate(base_names, calib=args.calib)
+    else :
+        print("{0:d} frames written to {1:s}".format(
+            renderFrames(base_names, args.output, args.fps, calib=args.calib), args.output))
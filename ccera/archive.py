@@ -0,0 +1,205 @@
+# Single-file campaign archives.
+#
+# A campaign directory such as AL045 holds one JSON sidecar plus one
+# _N.avg file per channel for every observation, so reading it costs
+# hundreds of open/stat calls.  packCampaign() copies the whole directory
+# into one file laid out as
+#
+#     magic (8 bytes) | header length (uint64) | JSON header
+#     structured metadata table, one record per observation
+#     float32 block of shape (nFiles, nChans, nVals)
+#
+# with both binary blocks 64-byte aligned, so openCampaign() can hand back
+# the spectra as a single read-only memmap.  The header keeps the original
+# JSON text of every sidecar and unpackCampaign() restores the directory.
+#
+#     python -m ccera.archive pack ./AL045 ./AL045.ccera
+#     python -m ccera.archive unpack ./AL045.ccera ./AL045
+
+import glob
+import json
+import os
+import struct
+
+import numpy as np
+
+from ccera import instrument
+from ccera.reader import openSeries
+
+MAGIC = b"CCERA\x00a1"
+ALIGN = 64
+EXTENSION = ".ccera"
+
+# the metadata table; keys missing from a sidecar are stored as NaN / -1 / ""
+META_FIELDS = [('name', 'U32'), ('t_start', 'f8'), ('run_time', 'f8'),
+               ('gLon', 'f8'), ('gLat', 'f8'), ('RA', 'f8'), ('dec', 'f8'),
+               ('az', 'f8'), ('alt', 'f8'), ('vlsr', 'f8'),
+               ('freq', 'f8'), ('srate', 'f8'), ('t_sample', 'f8'),
+               ('fft_size', 'i8'), ('decimation_factor', 'i8'), ('n_chans', 'i8'),
+               ('run_mode', 'U16'), ('run_type', 'U16'), ('target', 'U32')]
+META_DTYPE = np.dtype(META_FIELDS)
+
+def _missing(kind) :
+    return {'f': np.nan, 'i': -1, 'U': ''}[kind]
+
+def metaRecord(name, metadata) :
+    return tuple([name] + [metadata.get(field, _missing(np.dtype(kind).kind))
+                           for field, kind in META_FIELDS[1:]])
+
+def metaTable(names, metadatas) :
+    return np.array([metaRecord(n, m) for n, m in zip(names, metadatas)], dtype=META_DTYPE)
+
+def _pad(n) :
+    return -n % ALIGN
+
+def listCampaign(directory) :
+    """Sorted base names (without .json) of the observations in directory."""
+    files = glob.glob(os.path.join(directory, "*.json"))
+    files.sort()
+    return [file.removesuffix(".json") for file in files]
+
+def packCampaign(directory, archive=None, suffix=".avg") :
+    """Pack every sidecar/data-file set in directory into one archive.
+
+    The data files are streamed into the archive one at a time, so packing
+    needs no more memory than a single spectrum.  Returns the archive path.
+    """
+    if archive is None : archive = directory.rstrip("/") + EXTENSION
+    base_names = listCampaign(directory)
+    if not base_names : raise ValueError("no .json files in {0:s}".format(directory))
+    sidecars, metadatas = [], []
+    for base_name in base_names :
+        with open(base_name + ".json") as json_file : text = json_file.read()
+        sidecars.append(text)
+        metadatas.append(json.loads(text))
+    names = [os.path.basename(b) for b in base_names]
+    table = metaTable(names, metadatas)
+
+    n_chans = int(metadatas[0].get('n_chans', 2))
+    n_vals = os.path.getsize(base_names[0] + "_1" + suffix)//4
+    header = {'names': names, 'sidecars': sidecars, 'suffix': suffix,
+              'n_files': len(names), 'n_chans': n_chans, 'n_vals': n_vals,
+              'meta_descr': [list(f) for f in META_FIELDS]}
+    # the offsets are part of the header, so lay it out until they settle
+    header['meta_offset'] = header['data_offset'] = 0
+    while True :
+        text = json.dumps(header).encode()
+        start = len(MAGIC) + 8 + len(text)
+        meta_offset = start + _pad(start)
+        data_offset = meta_offset + table.nbytes
+        data_offset += _pad(data_offset)
+        if (meta_offset, data_offset) == (header['meta_offset'], header['data_offset']) : break
+        header['meta_offset'], header['data_offset'] = meta_offset, data_offset
+
+    with open(archive, "wb") as out :
+        out.write(MAGIC)
+        out.write(struct.pack("<Q", len(text)))
+        out.write(text)
+        out.write(b"\0"*(meta_offset - out.tell()))
+        out.write(table.tobytes())
+        out.write(b"\0"*(data_offset - out.tell()))
+        for base_name in base_names :
+            for chan in range(1, n_chans+1) :
+                vals = np.fromfile(base_name + "_{0:d}".format(chan) + suffix, dtype=np.float32)
+                if len(vals) != n_vals :
+                    raise ValueError("{0:s}_{1:d}{2:s} has {3:d} values, expected {4:d}".format(
+                        base_name, chan, suffix, len(vals), n_vals))
+                out.write(vals.astype('<f4').tobytes())
+    return archive
+
+def readHeader(archive) :
+    with open(archive, "rb") as f :
+        if f.read(len(MAGIC)) != MAGIC : raise ValueError("{0:s} is not a campaign archive".format(archive))
+        length, = struct.unpack("<Q", f.read(8))
+        return json.loads(f.read(length))
+
+def openCampaign(archive) :
+    """Open an archive made by packCampaign().
+
+    Returns (meta, spectra): the structured metadata table and a read-only
+    (nFiles, nChans, nVals) float32 memmap of all of the data.
+    """
+    header = readHeader(archive)
+    dtype = np.dtype([tuple(f) for f in header['meta_descr']])
+    n_files = header['n_files']
+    meta = np.fromfile(archive, dtype=dtype, count=n_files, offset=header['meta_offset'])
+    shape = (n_files, header['n_chans'], header['n_vals'])
+    spectra = np.memmap(archive, dtype='<f4', mode='r', offset=header['data_offset'], shape=shape)
+    return meta, spectra
+
+def unpackCampaign(archive, directory) :
+    """Recreate the sidecar and data files of an archive in directory."""
+    header = readHeader(archive)
+    meta, spectra = openCampaign(archive)
+    os.makedirs(directory, exist_ok=True)
+    for i, name in enumerate(header['names']) :
+        base_name = os.path.join(directory, name)
+        with open(base_name + ".json", "w") as json_file : json_file.write(header['sidecars'][i])
+        for chan in range(header['n_chans']) :
+            spectra[i, chan].tofile(base_name + "_{0:d}".format(chan+1) + header['suffix'])
+
+# the archive holds exactly the observations of base_names and is newer
+# than each of their sidecars and data files
+def _isFresh(archive, base_names, suffix) :
+    try :
+        header = readHeader(archive)
+    except ValueError :
+        return False
+    if header.get('suffix') != suffix or header['names'] != sorted(os.path.basename(b) for b in base_names) :
+        return False
+    newest = 0.
+    for base_name in base_names :
+        files = [base_name + ".json"] + [base_name + "_{0:d}".format(chan) + suffix
+                                         for chan in range(1, header['n_chans']+1)]
+        try :
+            newest = max([newest] + [os.path.getmtime(f) for f in files])
+        except OSError :
+            return False
+    return os.path.getmtime(archive) >= newest
+
+@instrument.timed()
+def loadCampaign(path, suffix=".avg", index=None) :
+    """(meta, spectra) for a campaign given as an archive or a directory.
+
+    A directory uses its packed archive (path + ".ccera") when one exists,
+    holds the same observations and is newer than every sidecar and data
+    file; otherwise the files are read one by one.
+    index: a table from ccera.index.updateIndex() that covers the
+    directory; its rows are used instead of parsing every sidecar.
+    """
+    if os.path.isfile(path) : return openCampaign(path)
+    archive = path.rstrip("/") + EXTENSION
+    base_names = listCampaign(path)
+    if os.path.exists(archive) and _isFresh(archive, base_names, suffix) :
+        with instrument.stage("archive") : return openCampaign(archive)
+    with instrument.stage("metadata") :
+        if index is not None :
+            rows = dict(zip([os.path.normpath(p) for p in index['path'].tolist()], index))
+            meta = np.zeros(len(base_names), dtype=META_DTYPE)
+            for i, base_name in enumerate(base_names) :
+                row = rows[os.path.normpath(base_name + ".json")]
+                meta[i] = tuple(row[field] for field in META_DTYPE.names)
+        else :
+            metadatas = []
+            for base_name in base_names :
+                with open(base_name + ".json") as json_file : metadatas.append(json.load(json_file))
+            meta = metaTable([os.path.basename(b) for b in base_names], metadatas)
+    n_chans = int(meta['n_chans'][0]) if len(meta) else 0
+    if n_chans < 0 : n_chans = 2      # no n_chans in the sidecar
+    with instrument.stage("read") :
+        spectra = np.array([[openSeries(b + "_{0:d}".format(chan) + suffix) for chan in range(1, n_chans+1)]
+                            for b in base_names], dtype=np.float32)
+    return meta, spectra
+
+if __name__ == "__main__" :
+    import argparse
+    parser = argparse.ArgumentParser(description="Pack or unpack a campaign directory")
+    parser.add_argument("command", choices=["pack", "unpack"])
+    parser.add_argument("source")
+    parser.add_argument("target", nargs="?")
+    parser.add_argument("--suffix", default=".avg")
+    args = parser.parse_args()
+    if args.command == "pack" :
+        print(packCampaign(args.source, args.target, args.suffix))
+    else :
+        unpackCampaign(args.source, args.target or args.source.removesuffix(EXTENSION))
@@ -0,0 +1,62 @@
+# Chebyshev baseline fitting for HI spectra.
+#
+# fitBackground() is the routine from the Lab05-Lab07 scripts: fit a
+# polynomial of degree n to the spectrum, restricting the fit to
+# |vDoppler| > vSignal by giving the line region a weight of 1.e-6.
+#
+# fitBackgroundStack() does the same for a whole (spectra x channels)
+# stack on a shared velocity axis.  The weighted design matrix and its
+# pseudo-inverse are built once and every spectrum is solved with a single
+# matrix product, so the cost per spectrum is one (channels x n) multiply.
+
+import numpy as np
+from numpy.polynomial import chebyshev as C
+from numpy.polynomial import polyutils as pu
+
+from ccera import instrument
+
+def getWeights(vDoppler, vSignal) :
+    vDoppler = np.asarray(vDoppler)
+    return np.where(np.abs(vDoppler) < vSignal, 1.e-6, 1.)
+
+# Chebyshev Vandermonde matrix on the same [-1,1] window that
+# Chebyshev.fit maps vDoppler onto, and the pseudo-inverse of its
+# weighted, column-normalised version.
+def getDesign(vDoppler, n, vSignal) :
+    vDoppler = np.asarray(vDoppler, dtype=np.float64)
+    domain = pu.getdomain(vDoppler)
+    x = pu.mapdomain(vDoppler, domain, C.Chebyshev.window)
+    V = C.chebvander(x, n)
+    w = getWeights(vDoppler, vSignal)
+    lhs = V*w[:, np.newaxis]
+    scl = np.sqrt(np.square(lhs).sum(axis=0))
+    scl[scl == 0] = 1.
+    pinv = np.linalg.pinv(lhs/scl, rcond=len(vDoppler)*np.finfo(np.float64).eps)
+    pinv /= scl[:, np.newaxis]
+    return V, w, pinv
+
+# fit spectrum to Chebyshev polynomial 
+# restrict range of fit to |vDoppler| > vSignal 
+def fitBackground(vDoppler, power, n, vSignal) :
+    return fitBackgroundStack(vDoppler, power, n, vSignal)
+
+@instrument.timed()
+def fitBackgroundStack(vDoppler, powers, n, vSignal, chunk=4096, design=None) :
+    """Fit a Chebyshev baseline to every spectrum in powers.
+
+    vDoppler: velocity axis shared by all spectra, shape (nChan,)
+    powers: array of shape (nChan,) or (nSpectra, nChan)
+    returns the fitted backgrounds with the same shape as powers.
+    Rows are processed in blocks of chunk spectra to bound the size of the
+    temporaries.  design may be a (V, w, pinv) tuple from getDesign() that
+    was already built for this axis.
+    """
+    powers = np.asarray(powers)
+    V, w, pinv = getDesign(vDoppler, n, vSignal) if design is None else design
+    stack = np.atleast_2d(powers)
+    background = np.empty(stack.shape, dtype=np.result_type(stack.dtype, np.float64))
+    for i in range(0, len(stack), chunk) :
+        rhs = stack[i:i+chunk]*w
+        coefs = rhs @ pinv.T
+        background[i:i+chunk] = coefs @ V.T
+    return background.reshape(powers.shape)
@@ -0,0 +1,64 @@
+# Airy beam model used to fit the Sun and Cygnus transits (Lab03, Lab04).
+#
+# The power pattern of a uniformly illuminated circular dish is
+#     P(r) = [2 J1(pi r)/(pi r)]^2 ,   r = (t - mean_time)/width
+# which is the closed form of the 19 term power series the labs used to
+# sum by hand.  Everything here is vectorized: the parameters may be
+# scalars or arrays of candidate beams, and broadcast against the time grid.
+
+import numpy as np
+from scipy.special import j1, jv
+
+# [2 J1(x)/x]^2 with the removable singularity at x=0 handled 
+def airyPattern(x) :
+    x = np.asarray(x, dtype=np.float64)
+    small = np.abs(x) < 1.e-8
+    xs = np.where(small, 1., x)
+    pattern = 2.*j1(xs)/xs
+    pattern = np.where(small, 1., pattern)
+    return pattern*pattern
+
+def airyBeam(times, mean_time, base_temp, peak_temp, width) :
+    """Evaluate base_temp + peak_temp*P((times-mean_time)/width).
+
+    times: 1-D array of sample times
+    mean_time, base_temp, peak_temp, width: scalars or arrays of shape (M,)
+    returns an array of shape (N,) for scalar parameters or (M, N) when
+    M candidate beams are evaluated at once.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    mean_time, base_temp, peak_temp, width = np.broadcast_arrays(
+        *[np.asarray(p, dtype=np.float64) for p in (mean_time, base_temp, peak_temp, width)])
+    shape = mean_time.shape + (1,)*times.ndim
+    r = (times - mean_time.reshape(shape))/width.reshape(shape)
+    return base_temp.reshape(shape) + peak_temp.reshape(shape)*airyPattern(np.pi*r)
+
+# dP/dx of airyPattern: d/dx [2 J1(x)/x] = -2 J2(x)/x, so
+# P'(x) = -8 J1(x) J2(x)/x^2, which tends to -x/2 at small x
+def airyDerivative(x) :
+    x = np.asarray(x, dtype=np.float64)
+    small = np.abs(x) < 1.e-4
+    xs = np.where(small, 1., x)
+    derivative = -8.*j1(xs)*jv(2, xs)/(xs*xs)
+    return np.where(small, -0.5*x, derivative)
+
+def airyJacobian(times, mean_time, base_temp, peak_temp, width) :
+    """Derivatives of airyBeam() with respect to its four parameters.
+
+    Same broadcasting as airyBeam(); returns an array of shape
+    (..., N, 4) with the columns d/d(mean_time, base_temp, peak_temp, width).
+    """
+    times = np.asarray(times, dtype=np.float64)
+    mean_time, base_temp, peak_temp, width = np.broadcast_arrays(
+        *[np.asarray(p, dtype=np.float64) for p in (mean_time, base_temp, peak_temp, width)])
+    shape = mean_time.shape + (1,)*times.ndim
+    width = width.reshape(shape)
+    x = np.pi*(times - mean_time.reshape(shape))/width
+    dP = peak_temp.reshape(shape)*airyDerivative(x)
+    return np.stack(np.broadcast_arrays(-np.pi/width*dP, np.ones_like(x), airyPattern(x), -x/width*dP), axis=-1)
+
+# Airy function on a grid of n points spanning mean_time +/- half_range.
+# Same call and return values as the old per-script helper.
+def airy(mean_time, base_temp, peak_temp, width, half_range=1000., n=200) :
+    times = np.linspace(mean_time-half_range, mean_time+half_range, n)
+    return times, airyBeam(times, mean_time, base_temp, peak_temp, width)
@@ -0,0 +1,220 @@
+# Pipeline benchmarks on synthetic observations (ccera/synthetic.py).
+#
+# Each benchmark times one stage of the analysis over a whole synthetic
+# campaign and records the best and median of a few repeats:
+#   spectrum.read     getMetaData + getData, touching every byte read
+#   spectrum.axis     frequency/velocity axes and window (cold, then cached)
+#   spectrum.slice    calibrated velocity window of every spectrum
+#   spectrum.fit      stacked baseline fit of the whole campaign
+#   spectrum.ana      anaSpectrum() end to end, file by file
+#   waterfall.build   anaCampaign() of the whole campaign
+#   waterfall.refresh refreshWaterfall() into a fresh state directory
+#   waterfall.render  Agg render of the l-v waterfall to PNG
+#   airy.model        airyBeam() for a batch of candidate beams
+#   pulsar.load       openPulsarRun() + sumChunks() over a pulsar run
+#   pulsar.fold       foldSeries() of the same run
+# The results go to a JSON file together with the git revision and the
+# library versions, and --compare flags stages that got slower than a
+# previous results file, so regressions show up between versions.
+
+import glob
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+
+from ccera.synthetic import generateCampaign
+
+def timeStage(func, repeat=3, setup=None) :
+    """Run func() repeat times; returns the list of wall-clock seconds.
+
+    setup(), if given, runs untimed before every repeat.
+    """
+    seconds = []
+    for i in range(repeat) :
+        if setup is not None : setup()
+        t0 = time.perf_counter()
+        func()
+        seconds.append(time.perf_counter() - t0)
+    return seconds
+
+def _summary(seconds, items) :
+    return {"seconds": seconds, "best": min(seconds), "median": float(np.median(seconds)),
+            "items": items, "per_item": min(seconds)/max(items, 1)}
+
+def getVersion() :
+    here = os.path.dirname(os.path.abspath(__file__))
+    try :
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=here, capture_output=True,
+                             text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError) :
+        rev = None
+    import scipy, matplotlib
+    return {"git": rev, "python": platform.python_version(), "numpy": np.__version__,
+            "scipy": scipy.__version__, "matplotlib": matplotlib.__version__,
+            "machine": platform.machine(), "cpus": os.cpu_count()}
+
+# synthetic campaign of nFiles runs under work/, reused if already there
+def getCampaign(work, kind, nFiles, fft_size=None, **kwargs) :
+    directory = os.path.join(work, "{0:s}_{1:d}_{2:s}".format(kind, nFiles, str(fft_size or "default")))
+    base_names = sorted(f[:-5] for f in glob.glob(os.path.join(directory, "*.json")))
+    if len(base_names) != nFiles :
+        shutil.rmtree(directory, ignore_errors=True)
+        base_names = generateCampaign(directory, nFiles, kind, fft_size, **kwargs)
+    return directory, base_names
+
+def benchSpectrum(base_names, repeat=3, nWorkers=None) :
+    from ccera.spectrum import getMetaData, getData, getAxes, getWindow, anaSpectrum
+    from ccera.baseline import fitBackgroundStack
+    from ccera.parallel import anaCampaign
+    results = {}
+    n = len(base_names)
+    metas = [getMetaData(b + ".json") for b in base_names]
+
+    def read() :
+        for b in base_names :
+            metadata = getMetaData(b + ".json")
+            vals, rows, cols = getData(b + "_1.avg", metadata['fft_size'])
+            np.add.reduce(vals)
+    results["spectrum.read"] = _summary(timeStage(read, repeat), n)
+
+    def axis() :
+        for metadata in metas : getWindow(metadata)
+    results["spectrum.axis.cold"] = _summary(timeStage(axis, repeat, setup=getAxes.cache_clear), n)
+    results["spectrum.axis"] = _summary(timeStage(axis, repeat), n)
+
+    freqs, vDoppler, i1, i2 = getWindow(metas[0])
+    spectra = [getData(b + "_1.avg", m['fft_size'])[0] for b, m in zip(base_names, metas)]
+    powers = np.empty((n, i2-i1))
+    def sliceSpectra() :
+        for i, vals in enumerate(spectra) : np.multiply(vals[i1:i2], 1.10e5, out=powers[i])
+    results["spectrum.slice"] = _summary(timeStage(sliceSpectra, repeat), n)
+
+    # fitBackgroundStack builds its design matrix on every call, so every
+    # repeat times the cold path
+    def fit() :
+        fitBackgroundStack(vDoppler[i1:i2], powers, 5, 200.)
+    results["spectrum.fit"] = _summary(timeStage(fit, repeat), n)
+
+    def ana() :
+        for b, m in zip(base_names, metas) : anaSpectrum(b, metadata=m)
+    results["spectrum.ana"] = _summary(timeStage(ana, repeat), n)
+
+    results["waterfall.build"] = _summary(timeStage(lambda : anaCampaign(base_names, nWorkers), repeat), n)
+    return results
+
+def benchWaterfall(directory, n, repeat=3) :
+    from ccera.watch import refreshWaterfall, loadWaterfall
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    import io
+    results = {}
+    state = tempfile.mkdtemp(prefix="waterfall_")
+    try :
+        clear = lambda : (shutil.rmtree(state, ignore_errors=True), os.makedirs(state))
+        results["waterfall.refresh"] = _summary(timeStage(lambda : refreshWaterfall(directory, state, settle=0.),
+                                                          repeat, setup=clear), n)
+        vDoppler, mapData, names, t_start = loadWaterfall(state)
+        mapData = np.array(mapData)
+    finally :
+        shutil.rmtree(state, ignore_errors=True)
+
+    fig = Figure(figsize=(6.4, 4.8), dpi=100)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    image = ax.imshow(mapData, aspect='auto', origin='lower', vmin=-5., vmax=50.,
+                      extent=(vDoppler[0], vDoppler[-1], 0, len(mapData)))
+    def render() :
+        image.set_data(mapData)
+        fig.savefig(io.BytesIO(), format="png")
+    results["waterfall.render"] = _summary(timeStage(render, repeat), n)
+    return results
+
+def benchAiry(nTimes=1569, nBeams=1000, repeat=3) :
+    from ccera.beam import airyBeam
+    times = 2.29376*np.arange(nTimes)
+    rng = np.random.default_rng(0)
+    params = (rng.uniform(1500., 2100., nBeams), 150., rng.uniform(1.e4, 1.5e4, nBeams), rng.uniform(250., 400., nBeams))
+    return {"airy.model": _summary(timeStage(lambda : airyBeam(times, *params), repeat), nBeams*nTimes)}
+
+def benchPulsar(base_names, repeat=3) :
+    from ccera.pulsar import openPulsarRun, sumChunks, foldSeries, getSampleTime
+    results = {}
+    def load() :
+        for b in base_names :
+            metadata, series = openPulsarRun(b)
+            for start, power in sumChunks(series) : pass
+    metadata, series = openPulsarRun(base_names[0])
+    nSamples = len(series[0])*len(base_names)
+    results["pulsar.load"] = _summary(timeStage(load, repeat), nSamples)
+    def fold() :
+        for b in base_names :
+            metadata, series = openPulsarRun(b)
+            foldSeries(series, getSampleTime(metadata), 0.714519699)
+    results["pulsar.fold"] = _summary(timeStage(fold, repeat), nSamples)
+    return results
+
+def runBenchmarks(work, nFiles=1000, fft_size=2048, nPulsar=2, nSamples=1<<22, repeat=3, nWorkers=None) :
+    """Generate (or reuse) the synthetic data under work and time every stage.
+
+    Returns the results dict that saveResults() writes.
+    """
+    directory, base_names = getCampaign(work, "doppler", nFiles, fft_size)
+    results = {}
+    results.update(benchSpectrum(base_names, repeat, nWorkers))
+    results.update(benchWaterfall(directory, nFiles, repeat))
+    results.update(benchAiry(repeat=repeat))
+    directory, base_names = getCampaign(work, "pulsar", nPulsar, nSamples=nSamples)
+    results.update(benchPulsar(base_names, repeat))
+    return {"version": getVersion(), "time": time.time(),
+            "config": {"files": nFiles, "fft_size": fft_size, "pulsar_runs": nPulsar,
+                       "pulsar_samples": nSamples, "repeat": repeat, "workers": nWorkers},
+            "results": results}
+
+def saveResults(results, output) :
+    with open(output, "w") as f :
+        json.dump(results, f, indent=1)
+
+def compareResults(old, new, tolerance=1.2) :
+    """Stages present in both results whose best time per item grew by more
+    than tolerance.  Returns a list of (stage, old, new, ratio)."""
+    slower = []
+    for stage, result in new['results'].items() :
+        if stage not in old['results'] : continue
+        ratio = result['per_item']/old['results'][stage]['per_item']
+        if ratio > tolerance : slower.append((stage, old['results'][stage]['per_item'], result['per_item'], ratio))
+    return slower
+
+if __name__ == "__main__" :
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline on synthetic data")
+    parser.add_argument("--work", default=os.path.join(tempfile.gettempdir(), "ccera_bench"),
+                        help="directory for the synthetic data (kept between runs)")
+    parser.add_argument("--files", type=int, default=1000, help="doppler runs (e.g. 1000, 10000, 100000)")
+    parser.add_argument("--fft-size", type=int, default=2048, help="spectral channels, up to 32768")
+    parser.add_argument("--pulsar-samples", type=int, default=1<<22)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="earlier results file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=1.2)
+    args = parser.parse_args()
+
+    results = runBenchmarks(args.work, args.files, args.fft_size, nSamples=args.pulsar_samples,
+                            repeat=args.repeat, nWorkers=args.workers)
+    saveResults(results, args.output)
+    for stage, result in results['results'].items() :
+        print("{0:20s} best {1:9.4f} s  median {2:9.4f} s  {3:10.3e} s/item".format(
+            stage, result['best'], result['median'], result['per_item']))
+    print("Results written to {0:s}".format(args.output))
+    if args.compare :
+        with open(args.compare) as f : old = json.load(f)
+        slower = compareResults(old, results, args.tolerance)
+        for stage, before, after, ratio in slower :
+            print("SLOWER {0:20s} {1:10.3e} -> {2:10.3e} s/item  x{3:.2f}".format(stage, before, after, ratio))
+        if not slower : print("No stage slower than x{0:.2f} of {1:s}".format(args.tolerance, args.compare))
@@ -0,0 +1,317 @@
+# One command line for the lab analyses, with the data set and the
+# parameters given as arguments instead of edited into each Lab script:
+#
+#     python -m ccera sunscan ./Lab03_data/2024-07-03-1340 --airy 1855 150 13250 325 --show
+#     python -m ccera cygnus ./Lab04_data/2024-07-01-2301 --output cygnus.png
+#     python -m ccera spectrum ./Lab05_data/2024-07-09-2244 --data spectrum.txt
+#     python -m ccera waterfall ./AL045 --data waterfall.npy --output waterfall.png
+#     python -m ccera lvmap ./Lab07_data --output lv.png
+#     python -m ccera rotation ./Lab07_data --data rotation.txt
+#     python -m ccera pulsar ./Lab09_data/2024-11-23-1831 --period 0.714519699
+#     python -m ccera dedisperse ./Lab09_data/2024-11-23-1831 --dm 0 60 0.5
+#
+# Only argparse is imported up front; each subcommand imports what it
+# uses when it runs, and matplotlib is only loaded when a figure is asked
+# for with --output (rendered with Agg, no display) or --show.  A batch of
+# numeric runs therefore never pays for matplotlib, astropy or the scipy
+# modules it does not use.
+
+import argparse
+import os
+import sys
+
+def _figure(args, **kwargs) :
+    """A new figure: Agg-backed when saving to --output, pyplot for --show."""
+    if args.output :
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        fig = Figure(**kwargs)
+        FigureCanvasAgg(fig)
+        return fig
+    import matplotlib.pyplot as plt
+    return plt.figure(**kwargs)
+
+def _finish(args, fig) :
+    if args.output :
+        fig.savefig(args.output)
+        print("Figure written to {0:s}".format(args.output))
+    else :
+        import matplotlib.pyplot as plt
+        plt.show()
+
+def _wantFigure(args) :
+    return bool(args.output or args.show)
+
+# Sun and Cygnus drift scans (Lab03, Lab04); the transit is located with
+# the same Airy beam fit as ccera.transit
+def transit(args) :
+    import time
+    import numpy as np
+    from ccera.spectrum import getMetaData
+    from ccera.reader import openSeries
+    from ccera.beam import airyBeam
+    from ccera.transit import fitTransit, BEAM_WIDTH
+    metadata = getMetaData(args.base_name + ".json")
+    power = args.calib*np.asarray(openSeries(args.base_name + "_{0:d}.sum".format(args.chan)), dtype=np.float64)
+    nVals = len(power)
+    times = metadata['t_sample']*np.arange(nVals)
+    p, errors, rms, n, flag = fitTransit(times, power, width=BEAM_WIDTH if args.width is None else args.width)
+    mean_time, base_temp, peak_temp, width = p
+    print("{0:s}: {1:d} samples, start {2:s} UTC".format(
+        args.base_name, nVals, time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(metadata['t_start']))))
+    print("peak {0:.1f} +/- {1:.1f} K above {2:.1f} K at t={3:.1f} +/- {4:.1f} s ({5:s}), width {6:.1f} +/- {7:.1f} s{8:s}".format(
+        peak_temp, errors[2], base_temp, mean_time, errors[0], time.strftime("%H:%M:%S", time.gmtime(mean_time)),
+        width, errors[3], "" if flag == "" else "  REJECTED: " + flag))
+    if args.data : np.savetxt(args.data, np.column_stack((times, power)), header="time(s) T(K)")
+    if not _wantFigure(args) : return
+    fig = _figure(args)
+    ax = fig.add_subplot(111)
+    ax.plot(times, power, 'b.', label="Measured Power")
+    ax.plot(times, airyBeam(times, *p), 'g-', label="Airy fit")
+    if args.airy is not None :
+        from ccera.beam import airy
+        airy_times, airy_function = airy(*args.airy, half_range=args.half_range)
+        ax.plot(airy_times, airy_function, 'r-', label="Airy Function")
+    ax.set_title("Antenna Temperature based on Time")
+    ax.set_xlabel("Time (s)")
+    ax.set_ylabel("Antenna Temperature")
+    ax.legend()
+    _finish(args, fig)
+
+# one baseline-subtracted HI spectrum (Lab05)
+def spectrum(args) :
+    import numpy as np
+    from ccera.spectrum import anaSpectrum
+    calib = _calib(args, os.path.dirname(args.base_name))
+    vDoppler, power = anaSpectrum(args.base_name, args.chan, calib, args.vmin, args.vmax, args.n, args.vsignal)
+    i = np.argmax(power)
+    print("{0:s}: {1:d} channels, peak {2:.2f} K at {3:.1f} km/s".format(args.base_name, len(power), power[i], vDoppler[i]))
+    if args.data : np.savetxt(args.data, np.column_stack((vDoppler, power)), header="v(km/s) T(K)")
+    if not _wantFigure(args) : return
+    fig = _figure(args)
+    ax = fig.add_subplot(111)
+    ax.plot(vDoppler, power, 'b-')
+    ax.set_title(os.path.basename(args.base_name))
+    ax.set_xlabel("Doppler velocity (km/s)")
+    ax.set_ylabel("Antenna Temperature (K)")
+    _finish(args, fig)
+
+# --calib, or the constant the Lab scripts use for directory
+def _calib(args, directory) :
+    from ccera.spectrum import getCalib
+    return getCalib(directory) if args.calib is None else args.calib
+
+# analyse a campaign in time order; the metadata comes from the index
+# (ccera.index), which only parses new or changed sidecars
+def _campaign(args) :
+    from ccera.index import updateIndex, selectDirectories, baseNames
+    from ccera.parallel import anaCampaign
+    meta = selectDirectories(updateIndex([args.directory]), [args.directory])
+    if not len(meta) : sys.exit("No .json files in {0:s}".format(args.directory))
+    vDoppler, mapData, errors = anaCampaign(baseNames(meta), args.workers, meta=meta, chan=args.chan,
+                                            calib=_calib(args, args.directory), vMin=args.vmin, vMax=args.vmax)
+    for row, base_name, message in errors :
+        print("anaSpectrum failed for {0:s}: {1:s}".format(base_name, message))
+    return meta, vDoppler, mapData
+
+def _image(args, mapData, extent, title, ylabel) :
+    fig = _figure(args, figsize=(9,7))
+    ax = fig.add_subplot(111)
+    ax.set_title(title)
+    ax.set_xlabel("Approach velocity (km/s)")
+    ax.set_ylabel(ylabel)
+    im = ax.imshow(mapData, extent=extent, aspect='auto', cmap='jet')
+    fig.colorbar(im, ax=ax)
+    return fig, ax
+
+# spectra of a campaign, one row per file in time order (Lab06)
+def waterfall(args) :
+    import numpy as np
+    meta, vDoppler, mapData = _campaign(args)
+    print("{0:s}: {1:d} spectra x {2:d} channels".format(args.directory, *mapData.shape))
+    if args.data : np.save(args.data, mapData)
+    if not _wantFigure(args) : return
+    fig, ax = _image(args, mapData, [vDoppler[0], vDoppler[-1], len(mapData), 0], "Waterfall", "Observation")
+    _finish(args, fig)
+
+# longitude-velocity map of a galactic scan (Lab07_01)
+def lvmap(args) :
+    import numpy as np
+    from ccera.gridding import getAxis, gridSpectra
+    meta, vDoppler, spectra = _campaign(args)
+    lonAxis = getAxis(args.lon_min, args.lon_max, args.step)
+    cube, weight = gridSpectra(meta['gLon'], meta['gLat'], spectra, lonAxis, [0.], fwhm=args.fwhm, fill=0.)
+    mapData = np.maximum(cube[:, 0, :], 0.)
+    print("{0:s}: {1:d} longitudes x {2:d} channels".format(args.directory, *mapData.shape))
+    if args.data : np.save(args.data, mapData)
+    if not _wantFigure(args) : return
+    fig, ax = _image(args, mapData, [vDoppler[0], vDoppler[-1], lonAxis[-1], lonAxis[0]],
+                     "Galactic Scan", "Galactic Longitude (deg)")
+    _finish(args, fig)
+
+# tangent-point rotation curve of a galactic scan (Lab07_03)
+def rotation(args) :
+    import numpy as np
+    from ccera.rotation import tangentVelocity, rotationCurve
+    meta, vDoppler, spectra = _campaign(args)
+    gLon = meta['gLon']
+    vLSR = np.nan_to_num(meta['vlsr'])
+    vPrime = tangentVelocity(spectra, vDoppler, args.threshold)
+    vRotation, radius, aRotation = rotationCurve(gLon, vPrime, vLSR)
+    for l, r, v in zip(gLon, radius, vRotation) :
+        print("gLon={0:7.2f}  R={1:.4e} km  v={2:7.2f} km/s".format(l, r, v))
+    if args.data : np.savetxt(args.data, np.column_stack((gLon, radius, vRotation, aRotation)),
+                              header="gLon(deg) R(km) v(km/s) Omega(1/s)")
+    if not _wantFigure(args) : return
+    fig = _figure(args)
+    ax = fig.add_subplot(111)
+    ax.scatter(radius, vRotation, color='blue')
+    ax.set_xlabel("Galactic Radius (km)")
+    ax.set_ylabel("Rotational Velocity v(r) (km/s)")
+    ax.set_title("Galactic Rotation Curve")
+    ax.grid(True)
+    _finish(args, fig)
+
+# folded profile of a pulsar run, with optional periodicity and single
+# pulse searches (Lab09)
+def pulsar(args) :
+    import numpy as np
+    from ccera.pulsar import openPulsarRun, foldSeries, getSampleTime, profileSignificance
+    if args.search :
+        from ccera.search import searchRun
+        for cand in searchRun(args.base_name, fMin=0.5, nCandidates=5) :
+            print("P={0:.6f} s  f={1:.5f} Hz  harmonics={2:d}  sigma={3:.1f}".format(
+                cand['period'], cand['freq'], cand['harmonics'], cand['sigma']))
+    if args.pulses :
+        from ccera.singlepulse import searchRunPulses
+        events = searchRunPulses(args.base_name, threshold=args.threshold)
+        print("{0:d} single pulse events".format(len(events)))
+        for event in events[np.argsort(events['snr'])[::-1][:10]] :
+            print("t={0:9.4f} s  width={1:4d} samples  S/N={2:.1f}".format(event['time'], event['width'], event['snr']))
+    metadata, series = openPulsarRun(args.base_name)
+    profile, counts = foldSeries(series, getSampleTime(metadata), args.period, nBins=args.bins)
+    print("{0:s} folded at P={1:.9f} s: peak {2:.1f} sigma".format(
+        metadata.get('target', args.base_name), args.period, profileSignificance(profile)))
+    phase = (np.arange(args.bins) + 0.5)/args.bins
+    if args.data : np.savetxt(args.data, np.column_stack((phase, profile)), header="phase power")
+    if not _wantFigure(args) : return
+    fig = _figure(args)
+    ax = fig.add_subplot(111)
+    ax.plot(phase, 1000*profile, 'b-')
+    ax.set_title("Folded profile of {0:s} at P={1:.6f} s".format(metadata.get('target', ''), args.period))
+    ax.set_xlabel("Pulse phase")
+    ax.set_ylabel("Power")
+    _finish(args, fig)
+
+# fold the filterbank of a pulsar run at one period for a range of trial
+# DMs (Lab09); the series are dedispersed and folded a chunk at a time
+def dedisperse(args) :
+    import numpy as np
+    from ccera.dedisperse import openFilterbank, dedisperseChunks
+    from ccera.pulsar import foldSeries, profileSignificance
+    dmMin, dmMax, dmStep = args.dm
+    dms = np.arange(dmMin, dmMax + 0.5*dmStep, dmStep)
+    data, freqs, t_sample = openFilterbank(args.base_name, args.chan)
+    sums, counts = np.zeros((len(dms), args.bins)), np.zeros((len(dms), args.bins))
+    for start, block in dedisperseChunks(data, freqs, t_sample, dms, args.subbands) :
+        for i, series in enumerate(block) :
+            profile, n = foldSeries([series], t_sample, args.period, nBins=args.bins, t0=start*t_sample)
+            sums[i] += np.nan_to_num(profile)*n
+            counts[i] += n
+    with np.errstate(invalid='ignore', divide='ignore') :
+        profiles = sums/counts
+    sigma = profileSignificance(profiles)
+    for dm, s in zip(dms, sigma) : print("DM={0:7.2f}  peak {1:.1f} sigma".format(dm, s))
+    best = np.nanargmax(sigma) if np.any(np.isfinite(sigma)) else 0
+    print("Best DM {0:.2f} pc/cm^3 at P={1:.9f} s".format(dms[best], args.period))
+    if args.data : np.savetxt(args.data, np.column_stack((dms, sigma)), header="DM(pc/cm^3) sigma")
+    if not _wantFigure(args) : return
+    fig = _figure(args)
+    ax = fig.add_subplot(111)
+    ax.plot(dms, sigma, 'b.-')
+    ax.set_title("Folded significance vs DM at P={0:.6f} s".format(args.period))
+    ax.set_xlabel("DM (pc/cm^3)")
+    ax.set_ylabel("Peak significance (sigma)")
+    _finish(args, fig)
+
+def _output(parser) :
+    parser.add_argument("--output", help="write the figure to this file (png, svg, pdf ...) without a display")
+    parser.add_argument("--show", action="store_true", help="show the figure in a window")
+    parser.add_argument("--data", help="write the numbers to this file")
+
+def _spectral(parser, chan=1) :
+    parser.add_argument("--chan", type=int, default=chan)
+    parser.add_argument("--calib", type=float, default=None,
+                        help="K per unit power; default 1.3e5 for Lab05/Lab06/AL045 data, else 1.10e5")
+    parser.add_argument("--vmin", type=float, default=-300.)
+    parser.add_argument("--vmax", type=float, default=300.)
+
+def getParser() :
+    parser = argparse.ArgumentParser(prog="python -m ccera", description="CCERA lab analyses")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    for name, half_range, text in (("sunscan", 1000., "Sun drift scan (Lab03)"), ("cygnus", 500., "Cygnus A drift scan (Lab04)")) :
+        p = sub.add_parser(name, help=text)
+        p.add_argument("base_name", help="run name without extension, e.g. ./Lab03_data/2024-07-03-1340")
+        p.add_argument("--chan", type=int, default=2)
+        p.add_argument("--calib", type=float, default=17.3)
+        p.add_argument("--airy", type=float, nargs=4, metavar=("MEAN_TIME", "BASE_TEMP", "PEAK_TEMP", "WIDTH"),
+                       help="overlay an Airy beam with these parameters")
+        p.add_argument("--width", type=float, default=None, help="expected beam width (s), default 340")
+        p.add_argument("--half-range", type=float, default=half_range)
+        _output(p)
+        p.set_defaults(func=transit)
+
+    p = sub.add_parser("spectrum", help="baseline-subtracted HI spectrum (Lab05)")
+    p.add_argument("base_name")
+    _spectral(p)
+    p.add_argument("--n", type=int, default=5, help="baseline polynomial order")
+    p.add_argument("--vsignal", type=float, default=200., help="|v| below which the line is excluded from the baseline fit")
+    _output(p)
+    p.set_defaults(func=spectrum)
+
+    for name, func, text in (("waterfall", waterfall, "spectra of a campaign in time order (Lab06)"),
+                             ("lvmap", lvmap, "longitude-velocity map (Lab07_01)"),
+                             ("rotation", rotation, "tangent-point rotation curve (Lab07_03)")) :
+        p = sub.add_parser(name, help=text)
+        p.add_argument("directory")
+        _spectral(p)
+        p.add_argument("--workers", type=int, default=None)
+        if name == "lvmap" :
+            p.add_argument("--lon-min", type=float, default=0.)
+            p.add_argument("--lon-max", type=float, default=90.)
+            p.add_argument("--step", type=float, default=3., help="longitude pixel (deg)")
+            p.add_argument("--fwhm", type=float, default=1.5, help="gridding kernel (deg)")
+        if name == "rotation" :
+            p.add_argument("--threshold", type=float, default=5., help="tangent point threshold (K)")
+        _output(p)
+        p.set_defaults(func=func)
+
+    p = sub.add_parser("pulsar", help="fold a pulsar run (Lab09)")
+    p.add_argument("base_name")
+    p.add_argument("--period", type=float, default=0.714519699, help="folding period (s), default J0332+5434")
+    p.add_argument("--bins", type=int, default=128)
+    p.add_argument("--search", action="store_true", help="run the FFT periodicity search first")
+    p.add_argument("--pulses", action="store_true", help="list single pulse events")
+    p.add_argument("--threshold", type=float, default=6., help="single pulse threshold (sigma)")
+    _output(p)
+    p.set_defaults(func=pulsar)
+
+    p = sub.add_parser("dedisperse", help="fold the filterbank of a pulsar run over trial DMs (Lab09)")
+    p.add_argument("base_name")
+    p.add_argument("--dm", type=float, nargs=3, default=[0., 60., 1.], metavar=("MIN", "MAX", "STEP"),
+                   help="trial DMs (pc/cm^3), all >= 0")
+    p.add_argument("--period", type=float, default=0.714519699, help="folding period (s), default J0332+5434")
+    p.add_argument("--bins", type=int, default=128)
+    p.add_argument("--chan", type=int, default=1, help="polarization of the _N.avg filterbank")
+    p.add_argument("--subbands", type=int, default=8)
+    _output(p)
+    p.set_defaults(func=dedisperse)
+    return parser
+
+def main(argv=None) :
+    args = getParser().parse_args(argv)
+    args.func(args)
+
+if __name__ == "__main__" :
+    main()
@@ -0,0 +1,108 @@
+# Incoherent dedispersion of the pulsar-mode filterbank (Lab09).
+#
+# In pulsar mode the receiver runs an fft_size (32) channel filterbank
+# across srate Hz centred on freq.  The channelized output is read like an
+# .avg file, as float32 rows of fft_size channel powers, one row per
+# t_sample.  A pulse at dispersion measure DM reaches channel frequency f
+# (MHz) later than the top of the band by
+#     KDM*DM*(f^-2 - fTop^-2)  seconds.
+#
+# dedisperse() uses the subband algorithm instead of shifting and summing
+# every channel for every trial DM:
+#   1. the channels are split into nSub subbands and, for a coarse grid of
+#      nominal DMs fine enough that the smearing inside a subband stays
+#      under half a sample, each subband is dedispersed to its own top
+#      frequency;
+#   2. every trial DM then only shifts and sums the nSub subband series of
+#      its nearest nominal DM.
+# Time is processed in chunks that overlap by the largest delay, so the
+# memory used does not depend on the length of the run.
+
+import numpy as np
+
+from ccera.reader import openSpectra
+from ccera.spectrum import getMetaData, getAxes
+from ccera.pulsar import getSampleTime
+
+KDM = 4.148808e3          # dispersion constant (s MHz^2 pc^-1 cm^3)
+
+def openFilterbank(base_name, chan=1, suffix=".avg") :
+    """(data, freqs, t_sample) for the channelized data of a pulsar run.
+
+    data is a read-only (nSamples, fft_size) memmap and freqs the channel
+    centre frequencies in MHz.
+    """
+    metadata = getMetaData(base_name + ".json")
+    fft_size = metadata['fft_size']
+    data = openSpectra(base_name + "_{0:d}".format(chan) + suffix, fft_size)
+    freqs = getAxes(metadata['freq'], metadata['srate'], fft_size)[0]
+    return data, freqs, getSampleTime(metadata)
+
+# delay (in samples) of each frequency relative to fRef at dispersion measure dm
+def getDelays(freqs, dm, t_sample, fRef=None) :
+    freqs = np.asarray(freqs, dtype=np.float64)
+    if fRef is None : fRef = freqs.max()
+    return np.rint(KDM*dm*(freqs**-2 - fRef**-2)/t_sample).astype(np.intp)
+
+def _plan(freqs, t_sample, dms, nSub) :
+    # a negative DM would give negative delays, which wrap around the block
+    if not np.all(np.isfinite(dms)) or np.any(dms < 0.) :
+        raise ValueError("trial DMs must be finite and >= 0, got {0:s}".format(str(dms[~(dms >= 0.)])))
+    nChan = len(freqs)
+    edges = np.linspace(0, nChan, nSub+1).astype(np.intp)
+    subbands = [np.arange(edges[i], edges[i+1]) for i in range(nSub) if edges[i+1] > edges[i]]
+    subTop = np.array([freqs[s].max() for s in subbands])
+    # coarse DM step that keeps the smearing inside any subband under 0.5 sample
+    span = max(KDM*(freqs[s].min()**-2 - freqs[s].max()**-2) for s in subbands)
+    step = t_sample/span if span > 0 else np.inf
+    nominal = np.rint(np.asarray(dms)/step)*step if np.isfinite(step) else np.zeros(len(dms))
+    groups = {}
+    for i, dm0 in enumerate(nominal) : groups.setdefault(dm0, []).append(i)
+    inner = {dm0 : [getDelays(freqs[s], dm0, t_sample, top) for s, top in zip(subbands, subTop)]
+             for dm0 in groups}
+    outer = [getDelays(subTop, dm, t_sample, freqs.max()) for dm in dms]
+    maxInner = max(max(d.max() for d in ds) for ds in inner.values())
+    maxOuter = max(d.max() for d in outer)
+    return subbands, groups, inner, outer, maxInner, maxOuter
+
+def dedisperseChunks(data, freqs, t_sample, dms, nSub=8, chunk=1<<16) :
+    """Yield (start, block) with block[i] the series at trial DM dms[i].
+
+    data: (nSamples, nChan) array or memmap, freqs: channel frequencies (MHz)
+    Each block covers output samples start .. start+block.shape[1]; the
+    output stops maxDelay samples before the end of the data so that every
+    sample is a sum over all channels.  DMs must be >= 0 (ValueError).
+    """
+    dms = np.atleast_1d(np.asarray(dms, dtype=np.float64))
+    freqs = np.asarray(freqs, dtype=np.float64)
+    subbands, groups, inner, outer, maxInner, maxOuter = _plan(freqs, t_sample, dms, nSub)
+    overlap = maxInner + maxOuter
+    nOut = len(data) - overlap
+    for start in range(0, max(nOut, 0), chunk) :
+        length = min(chunk, nOut-start)
+        block = np.asarray(data[start:start+length+overlap], dtype=np.float64)
+        result = np.zeros((len(dms), length))
+        subLength = length + maxOuter
+        for dm0, members in groups.items() :
+            sub = np.zeros((len(subbands), subLength))
+            for j, (channels, delays) in enumerate(zip(subbands, inner[dm0])) :
+                for c, d in zip(channels, delays) :
+                    sub[j] += block[d:d+subLength, c]
+            for i in members :
+                for j, d in enumerate(outer[i]) :
+                    result[i] += sub[j, d:d+length]
+        yield start, result
+
+def dedisperse(data, freqs, t_sample, dms, nSub=8, chunk=1<<16, out=None) :
+    """Dedispersed series for every trial DM, shape (nDMs, nOut).
+
+    out may be a preallocated array or np.memmap (e.g. for an hour of
+    data at hundreds of DMs) to write the result into.
+    """
+    dms = np.atleast_1d(np.asarray(dms, dtype=np.float64))
+    subbands, groups, inner, outer, maxInner, maxOuter = _plan(np.asarray(freqs, dtype=np.float64), t_sample, dms, nSub)
+    nOut = max(len(data) - maxInner - maxOuter, 0)
+    if out is None : out = np.zeros((len(dms), nOut), dtype=np.float32)
+    for start, block in dedisperseChunks(data, freqs, t_sample, dms, nSub, chunk) :
+        out[:, start:start+block.shape[1]] = block
+    return out
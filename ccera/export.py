@@ -0,0 +1,244 @@
+# Unattended, headless export of the lab products for whole archives.
+#
+#     python -m ccera.export Lab03_data Lab04_data Lab05_data AL045 --out products --formats png svg
+#
+# Every run in the given directories becomes one job: a baseline-subtracted
+# HI spectrum for runs with .avg files, a drift scan plot for runs with
+# .sum files.  Every directory of spectra also gets a waterfall (spectra in
+# time order) and, with --lvmap, a longitude-velocity map.  Pulsar-mode
+# runs are skipped.  Products go to <out>/<directory name>/<run>.<format>.
+#
+# The jobs run on a pool of worker processes.  Each worker builds one
+# Agg figure with its line artists and one with an image artist and a
+# colorbar when it starts, and every product only updates their data,
+# limits and titles before savefig, so no axes are created per product.
+# A product whose files are newer than all of its inputs is skipped
+# unless force is set, so a rerun only redraws what changed.
+# Spectra are calibrated with the constant the Lab scripts use for their
+# directory (ccera.spectrum.getCalib) unless calib is given.
+
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from ccera.parallel import getContext
+
+LINE_FIGSIZE = (8., 5.)
+IMAGE_FIGSIZE = (9., 7.)
+
+class Renderer :
+    """One reusable Agg figure for line plots and one for images."""
+
+    def __init__(self, dpi=100) :
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        self.dpi = dpi
+        self.lineFig = Figure(figsize=LINE_FIGSIZE, dpi=dpi)
+        FigureCanvasAgg(self.lineFig)
+        self.lineAx = self.lineFig.add_subplot(111)
+        self.lines = [self.lineAx.plot([], [], style, label=label)[0]
+                      for style, label in (('b-', "Channel 1"), ('r-', "Channel 2"))]
+        self.lineAx.legend(loc='upper right')
+        self.style = None
+        self.imageFig = Figure(figsize=IMAGE_FIGSIZE, dpi=dpi)
+        FigureCanvasAgg(self.imageFig)
+        self.imageAx = self.imageFig.add_subplot(111)
+        self.image = self.imageAx.imshow(np.zeros((2, 2)), aspect='auto', cmap='jet', interpolation='nearest')
+        self.colorbar = self.imageFig.colorbar(self.image, ax=self.imageAx)
+
+    def plotLines(self, curves, title, xlabel, ylabel, outputs, style=None) :
+        """curves: list of (x, y), one per channel; style: marker for points,
+        None for lines."""
+        if style != self.style :
+            for line in self.lines :
+                line.set_linestyle('-' if style is None else 'none')
+                line.set_marker('None' if style is None else style)
+            self.lineAx.legend(loc='upper right')
+            self.style = style
+        for i, line in enumerate(self.lines) :
+            if i < len(curves) : line.set_data(*curves[i])
+            line.set_visible(i < len(curves))
+        self.lineAx.relim(visible_only=True)
+        self.lineAx.autoscale_view()
+        self.lineAx.set_title(title)
+        self.lineAx.set_xlabel(xlabel)
+        self.lineAx.set_ylabel(ylabel)
+        for output in outputs : self.lineFig.savefig(output, dpi=self.dpi)
+
+    def plotImage(self, mapData, extent, title, xlabel, ylabel, outputs, vmin=None, vmax=None) :
+        finite = mapData[np.isfinite(mapData)]
+        if vmin is None : vmin = np.percentile(finite, 1.) if finite.size else 0.
+        if vmax is None : vmax = np.percentile(finite, 99.5) if finite.size else 1.
+        self.image.set_data(mapData)
+        self.image.set_extent(extent)
+        self.image.set_clim(vmin, vmax)
+        self.imageAx.set_title(title)
+        self.imageAx.set_xlabel(xlabel)
+        self.imageAx.set_ylabel(ylabel)
+        for output in outputs : self.imageFig.savefig(output, dpi=self.dpi)
+
+_renderer = None
+
+def _initWorker(dpi) :
+    global _renderer
+    _renderer = Renderer(dpi)
+
+def _getRenderer() :
+    if _renderer is None : _initWorker(100)
+    return _renderer
+
+def _outputs(outDir, name, formats) :
+    return [os.path.join(outDir, name + "." + fmt) for fmt in formats]
+
+def _upToDate(outputs, inputs) :
+    try :
+        newest = max(os.path.getmtime(f) for f in inputs)
+        return all(os.path.getmtime(f) >= newest for f in outputs)
+    except (OSError, ValueError) :
+        return False
+
+def renderSpectrum(base_name, outputs, calib=None, vMin=-300., vMax=300.) :
+    from ccera.spectrum import getMetaData, anaSpectrum, getCalib
+    if calib is None : calib = getCalib(os.path.dirname(base_name))
+    metadata = getMetaData(base_name + ".json")
+    curves = [anaSpectrum(base_name, chan, calib, vMin, vMax, metadata=metadata)
+              for chan in range(1, metadata.get('n_chans', 2)+1)]
+    _getRenderer().plotLines(curves, "{0:s}  {1:s}".format(os.path.basename(base_name), metadata.get('target', '')),
+                             "Doppler velocity (km/s)", "Antenna Temperature (K)", outputs)
+
+def renderTransit(base_name, outputs, calib=17.3) :
+    from ccera.spectrum import getMetaData
+    from ccera.reader import openSeries
+    metadata = getMetaData(base_name + ".json")
+    curves = []
+    for chan in range(1, metadata.get('n_chans', 2)+1) :
+        power = calib*np.asarray(openSeries(base_name + "_{0:d}.sum".format(chan)), dtype=np.float64)
+        curves.append((metadata['t_sample']*np.arange(len(power)), power))
+    _getRenderer().plotLines(curves, "{0:s}  {1:s}".format(os.path.basename(base_name), metadata.get('target', '')),
+                             "Time (s)", "Antenna Temperature (K)", outputs, style='.')
+
+def renderWaterfall(directory, outputs, chan=1, calib=None, vMin=-300., vMax=300.) :
+    from ccera.parallel import anaCampaign
+    from ccera.spectrum import getCalib
+    if calib is None : calib = getCalib(directory)
+    base_names = _spectralRuns(directory)
+    vDoppler, mapData, errors = anaCampaign(base_names, 1, chan=chan, calib=calib, vMin=vMin, vMax=vMax)
+    _getRenderer().plotImage(mapData, [vDoppler[0], vDoppler[-1], len(mapData), 0],
+                             "Waterfall {0:s}".format(os.path.basename(os.path.normpath(directory))),
+                             "Doppler velocity (km/s)", "Observation", outputs, vmin=0.)
+
+def renderLvMap(directory, outputs, lonMin=0., lonMax=90., step=3., fwhm=1.5, chan=1, calib=None) :
+    from ccera.parallel import anaCampaign
+    from ccera.spectrum import getMetaData, getCalib
+    if calib is None : calib = getCalib(directory)
+    from ccera.gridding import getAxis, gridSpectra
+    base_names = _spectralRuns(directory)
+    vDoppler, spectra, errors = anaCampaign(base_names, 1, chan=chan, calib=calib)
+    metadatas = [getMetaData(b + ".json") for b in base_names]
+    lon = np.array([m['gLon'] for m in metadatas])
+    lat = np.array([m['gLat'] for m in metadatas])
+    lonAxis = getAxis(lonMin, lonMax, step)
+    cube, weight = gridSpectra(lon, lat, spectra, lonAxis, [0.], fwhm=fwhm, fill=0.)
+    _getRenderer().plotImage(np.maximum(cube[:, 0, :], 0.), [vDoppler[0], vDoppler[-1], lonAxis[-1], lonAxis[0]],
+                             "Galactic Scan {0:s}".format(os.path.basename(os.path.normpath(directory))),
+                             "Approach velocity (km/s)", "Galactic Longitude (deg)", outputs, vmin=0.)
+
+def _spectralRuns(directory) :
+    return sorted(f.removesuffix(".json") for f in glob.glob(os.path.join(directory, "*.json"))
+                  if os.path.exists(f.removesuffix(".json") + "_1.avg"))
+
+def _runJob(job) :
+    kind, source, outputs, kwargs = job
+    t0 = time.perf_counter()
+    try :
+        {'spectrum': renderSpectrum, 'transit': renderTransit,
+         'waterfall': renderWaterfall, 'lvmap': renderLvMap}[kind](source, outputs, **kwargs)
+        return kind, source, outputs, None, time.perf_counter() - t0
+    except Exception as e :
+        return kind, source, outputs, "{0:s}: {1:s}".format(type(e).__name__, str(e)), time.perf_counter() - t0
+
+def listJobs(directories, outDir, formats=("png",), lvmap=False, force=False) :
+    """(kind, source, outputs, kwargs) for every product that is out of date."""
+    from ccera.spectrum import getMetaData
+    jobs = []
+    for directory in directories :
+        target = os.path.join(outDir, os.path.basename(os.path.normpath(directory)))
+        os.makedirs(target, exist_ok=True)
+        spectral = []
+        for json_file in sorted(glob.glob(os.path.join(directory, "*.json"))) :
+            base_name = json_file.removesuffix(".json")
+            name = os.path.basename(base_name)
+            if os.path.exists(base_name + "_1.avg") :
+                kind, inputs = 'spectrum', glob.glob(base_name + "_*.avg")
+                spectral.append(json_file)
+            elif os.path.exists(base_name + "_1.sum") :
+                if getMetaData(json_file).get('run_mode') == 'pulsar' : continue
+                kind, inputs = 'transit', glob.glob(base_name + "_*.sum")
+            else :
+                continue
+            outputs = _outputs(target, name, formats)
+            if force or not _upToDate(outputs, [json_file] + inputs) :
+                jobs.append((kind, base_name, outputs, {}))
+        if len(spectral) < 2 : continue
+        inputs = spectral + glob.glob(os.path.join(directory, "*_1.avg"))
+        products = [('waterfall', "waterfall")] + ([('lvmap', "lvmap")] if lvmap else [])
+        for kind, name in products :
+            outputs = _outputs(target, name, formats)
+            if force or not _upToDate(outputs, inputs) :
+                jobs.append((kind, directory, outputs, {}))
+    return jobs
+
+def exportProducts(directories, outDir, formats=("png",), nWorkers=None, lvmap=False, force=False,
+                   dpi=100, verbose=True) :
+    """Render every out-of-date product of directories into outDir.
+
+    Returns a list of (kind, source, error message) for the jobs that failed.
+    """
+    jobs = listJobs(directories, outDir, formats, lvmap, force)
+    # campaign products take longest, start them first
+    jobs.sort(key=lambda job : job[0] not in ('waterfall', 'lvmap'))
+    if nWorkers is None : nWorkers = os.cpu_count() or 1
+    nWorkers = max(1, min(nWorkers, len(jobs)))
+    failed = []
+    t0 = time.perf_counter()
+    if nWorkers == 1 :
+        _initWorker(dpi)
+        results = map(_runJob, jobs)
+        failed = _report(results, verbose)
+    else :
+        with ProcessPoolExecutor(max_workers=nWorkers, mp_context=getContext(),
+                                 initializer=_initWorker, initargs=(dpi,)) as pool :
+            failed = _report(pool.map(_runJob, jobs, chunksize=max(1, len(jobs)//(8*nWorkers))), verbose)
+    if verbose :
+        print("{0:d} products ({1:d} failed) in {2:.1f} s on {3:d} workers".format(
+            len(jobs), len(failed), time.perf_counter() - t0, nWorkers))
+    return failed
+
+def _report(results, verbose) :
+    failed = []
+    for kind, source, outputs, error, seconds in results :
+        if error is not None :
+            failed.append((kind, source, error))
+            if verbose : print("FAILED {0:s} {1:s}: {2:s}".format(kind, source, error))
+        elif verbose :
+            print("{0:9s} {1:s} -> {2:s} ({3:.2f} s)".format(kind, source, ", ".join(outputs), seconds))
+    return failed
+
+if __name__ == "__main__" :
+    import argparse
+    parser = argparse.ArgumentParser(description="Render spectra, drift scans, waterfalls and l-v maps without a display")
+    parser.add_argument("directories", nargs="+")
+    parser.add_argument("--out", default="products")
+    parser.add_argument("--formats", nargs="+", default=["png"], help="png, svg, pdf ...")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--lvmap", action="store_true", help="also grid each spectral directory into an l-v map")
+    parser.add_argument("--force", action="store_true", help="redraw products that are up to date")
+    parser.add_argument("--dpi", type=int, default=100)
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args()
+    failed = exportProducts(args.directories, args.out, args.formats, args.workers, args.lvmap, args.force,
+                            args.dpi, not args.quiet)
+    if failed : raise SystemExit(1)
@@ -0,0 +1,183 @@
+# Rotation-curve models of Lab08EZ, vectorized over parameter sets, and
+# a fitter for them.
+#
+# Models (SI units, r in m, v in m/s; masses in units of 1e11 mSun and the
+# isothermal core radius aIso in kilo-light-years, as in Lab08EZ.py):
+#   Kepler            v^2 = G M / r
+#   exponential disk  v^2 = Md * G*1e11*mSun * r^2/(2 R_D^3) (I0K0 - I1K1)(r/2R_D)
+#                     (Freeman, Ap. J. 160 (1970) 811)
+#   isothermal sphere v^2 = mIso * G*1e11*mSun (1 - a/r atan(r/a))/(rSun - a atan(rSun/a))
+#                     added in quadrature to the disk
+# The disk factor x^2 (I0K0 - I1K1)(x), x = r/(2 R_D), is read from a
+# cached table interpolated in log x (see besselTable), so no Bessel
+# function is evaluated per model call.
+# Every model is linear in its mass, so the radial shapes are computed
+# once and a batch of parameter sets only costs a broadcast multiply:
+# parameters of shape (P,) give velocities of shape (P, nR).
+
+import time
+from functools import lru_cache
+
+import numpy as np
+import scipy.special as sps
+from scipy.optimize import least_squares
+
+c = 3.0e8
+year = 3.154e7
+lightYear = c*year
+R_D = 7000.*lightYear
+G = 6.67e-11
+mSun = 1.98e30
+rSun = 26000.*lightYear
+mUnit = 1.0e11*mSun
+
+# range of x = r/(2 R_D) covered by the table; outside it the factor is
+# evaluated directly
+X_MIN = 1.e-4
+X_MAX = 1.e3
+
+# x^2 (I0(x)K0(x) - I1(x)K1(x)) from scipy.  The exponentially scaled
+# functions keep it finite for large x, where iv overflows.
+def besselExact(x) :
+    x = np.asarray(x, dtype=np.float64)
+    with np.errstate(invalid='ignore', divide='ignore') :
+        y = x*x*(sps.ive(0,x)*sps.kve(0,x) - sps.ive(1,x)*sps.kve(1,x))
+    return np.where(x > 0., y, 0.)
+
+@lru_cache(maxsize=8)
+def besselTable(tol=1.e-6) :
+    """Table of x^2 (I0K0 - I1K1) on a uniform grid in log x.
+
+    The grid is doubled until the relative error of linear interpolation,
+    checked at every interval midpoint (where it peaks), is below tol.
+    Returns read-only (logX, y) and the measured maximum relative error.
+    """
+    n = 1024
+    while True :
+        u = np.linspace(np.log(X_MIN), np.log(X_MAX), n)
+        y = besselExact(np.exp(u))
+        uMid = 0.5*(u[1:] + u[:-1])
+        err = np.max(np.abs(np.interp(uMid, u, y)/besselExact(np.exp(uMid)) - 1.))
+        if err < tol or n >= 1<<22 : break
+        n *= 2
+    u.setflags(write=False)
+    y.setflags(write=False)
+    return u, y, err
+
+# x^2 (I0K0 - I1K1) interpolated from the table, 0 at x=0
+def besselFactor(x, tol=1.e-6) :
+    x = np.asarray(x, dtype=np.float64)
+    u, y, err = besselTable(tol)
+    inside = (x >= X_MIN) & (x <= X_MAX)
+    with np.errstate(divide='ignore') :
+        result = np.interp(np.log(x), u, y)
+    if not np.all(inside) :
+        result = np.asarray(result)
+        result[~inside] = besselExact(x[~inside])
+    return result
+
+# v^2 per unit Md of the exponential disk
+def diskShape(r) :
+    r = np.asarray(r, dtype=np.float64)
+    return 2.*G*mUnit/R_D*besselFactor(0.5*r/R_D)
+
+# v^2 per unit mIso of the isothermal sphere, shape (..., nR) for aIso of shape (...)
+def isoShape(r, aIso) :
+    r = np.asarray(r, dtype=np.float64)
+    a = 1000.*lightYear*np.asarray(aIso, dtype=np.float64)[..., np.newaxis]
+    return G*mUnit*(1. - a/r*np.arctan(r/a))/(rSun - a*np.arctan(rSun/a))
+
+def _col(p) :
+    return np.asarray(p, dtype=np.float64)[..., np.newaxis]
+
+def keplerVelocity(r, Md) :
+    return np.sqrt(G*mUnit*_col(Md)/np.asarray(r, dtype=np.float64))
+
+def diskVelocity(r, Md) :
+    return np.sqrt(_col(Md)*diskShape(r))
+
+def haloVelocity(r, Md, mIso, aIso) :
+    return np.sqrt(_col(Md)*diskShape(r) + _col(mIso)*isoShape(r, aIso))
+
+def gridScan(r, v, Md, mIso, aIso, sigma=None, maxElements=1<<24) :
+    """chi-square of the disk + isothermal model on a 3-D parameter grid.
+
+    r, v: measured radius (m) and rotation velocity (m/s)
+    Md, mIso, aIso: 1-D grids of each parameter
+    sigma: velocity uncertainty (m/s), scalar or per point; 1 if None
+    Returns chi2 with shape (len(Md), len(mIso), len(aIso)).  The aIso
+    axis is processed in blocks of at most maxElements model values.
+    """
+    r = np.asarray(r, dtype=np.float64)
+    v = np.asarray(v, dtype=np.float64)
+    Md, mIso, aIso = (np.atleast_1d(np.asarray(p, dtype=np.float64)) for p in (Md, mIso, aIso))
+    w = 1. if sigma is None else 1./np.square(np.broadcast_to(sigma, r.shape))
+    disk = Md[:, np.newaxis]*diskShape(r)                    # (nMd, nR)
+    chi2 = np.empty((len(Md), len(mIso), len(aIso)))
+    block = max(1, maxElements//(len(Md)*len(mIso)*len(r)))
+    for k in range(0, len(aIso), block) :
+        iso = mIso[:, np.newaxis, np.newaxis]*isoShape(r, aIso[k:k+block])   # (nIso, nA, nR)
+        model = np.sqrt(disk[:, np.newaxis, np.newaxis, :] + iso[np.newaxis])
+        chi2[:, :, k:k+block] = np.sum(w*np.square(model - v), axis=-1)
+    return chi2
+
+def fitHalo(r, v, start, sigma=None) :
+    """Least-squares refinement of (Md, mIso, aIso) from start.
+
+    Returns (best, errors, chi2).  Without sigma the errors are scaled by
+    the reduced chi-square of the fit.
+    """
+    r = np.asarray(r, dtype=np.float64)
+    v = np.asarray(v, dtype=np.float64)
+    s = 1. if sigma is None else np.broadcast_to(sigma, r.shape)
+    residual = lambda p : (haloVelocity(r, p[0], p[1], p[2]) - v)/s
+    result = least_squares(residual, np.asarray(start, dtype=np.float64),
+                           bounds=([0., 0., 1.e-3], [np.inf, np.inf, np.inf]), x_scale='jac')
+    chi2 = float(np.sum(result.fun**2))
+    J = result.jac
+    cov = np.linalg.pinv(J.T @ J)
+    if sigma is None : cov *= chi2/max(len(r) - 3, 1)
+    return result.x, np.sqrt(np.diag(cov)), chi2
+
+def fitRotationCurve(radius, vRotation, Md, mIso, aIso, sigma=None) :
+    """Grid scan followed by a least-squares refinement.
+
+    radius in km and vRotation in km/s, as produced by Lab07_03 (sigma in
+    km/s).  Returns a dict with the best-fit Md, mIso, aIso, their
+    uncertainties, the chi-square and the chi-square grid (a plain sum of
+    squares in (km/s)^2 when no sigma is given).
+    """
+    r = 1000.*np.asarray(radius, dtype=np.float64)
+    v = 1000.*np.asarray(vRotation, dtype=np.float64)
+    s = None if sigma is None else 1000.*np.asarray(sigma, dtype=np.float64)
+    chi2 = gridScan(r, v, Md, mIso, aIso, s)
+    i, j, k = np.unravel_index(np.argmin(chi2), chi2.shape)
+    best, errors, chi2Best = fitHalo(r, v, (Md[i], mIso[j], aIso[k]), s)
+    if s is None :
+        # unweighted sums of squares are reported in (km/s)^2
+        chi2, chi2Best = 1.e-6*chi2, 1.e-6*chi2Best
+    return {'Md': best[0], 'mIso': best[1], 'aIso': best[2],
+            'dMd': errors[0], 'dmIso': errors[1], 'daIso': errors[2],
+            'chi2': chi2Best, 'nData': len(r), 'grid': chi2}
+
+def compareBessel(n=1000000, xMax=5., tol=1.e-6) :
+    """Accuracy and speed of the table against direct scipy evaluation.
+
+    Returns (max relative error, scipy seconds, table seconds) for n
+    random points in (0, xMax], after the table has been built.
+    """
+    x = np.random.default_rng(1).uniform(0., xMax, n) + 1.e-12
+    besselTable(tol)
+    t0 = time.perf_counter()
+    exact = x*x*(sps.iv(0,x)*sps.kn(0,x) - sps.iv(1,x)*sps.kn(1,x))
+    t1 = time.perf_counter()
+    table = besselFactor(x, tol)
+    t2 = time.perf_counter()
+    return np.max(np.abs(table/exact - 1.)), t1 - t0, t2 - t1
+
+if __name__ == "__main__" :
+    u, y, err = besselTable()
+    print("Table: {0:d} points in log x over [{1:.0e},{2:.0e}], max relative error {3:.2e}".format(len(u), X_MIN, X_MAX, err))
+    err, tScipy, tTable = compareBessel()
+    print("1e6 points: scipy {0:.3f} s  table {1:.3f} s  speedup {2:.1f}  max relative error {3:.2e}".format(
+          tScipy, tTable, tScipy/tTable, err))
@@ -0,0 +1,107 @@
+# Gridding of pointed spectra onto a regular (lon, lat, velocity) cube.
+#
+# Every spectrum is spread over the cube pixels near its pointing with a
+# Gaussian convolution kernel.  The cube keeps the weighted sum of the
+# spectra and a separate weight plane, and the gridded cube is their
+# ratio, so overlapping pointings are averaged instead of overwriting
+# each other.  Pointings are added in batches: the weights are scattered
+# with np.bincount, and the spectra with the equivalent of np.add.at done
+# as one sparse (pixels x pointings) matrix product, which avoids building
+# a weighted copy of every spectrum for every pixel it touches.  A survey
+# of any size is gridded in one streaming pass over its campaigns.
+#
+# The two sky axes are generic: pass gLon/gLat or RA/dec.  Distances in
+# the first coordinate are wrapped at 360 deg and scaled by cos(lat).
+
+import numpy as np
+import scipy.sparse
+
+def getAxis(start, stop, step) :
+    """Pixel centres start, start+step, ... up to and including stop."""
+    return start + step*np.arange(int(np.floor((stop - start)/step + 0.5)) + 1)
+
+class CubeGrid :
+    """Accumulator for a (nLon, nLat, nVel) cube.
+
+    lonAxis, latAxis: regularly spaced pixel centres (deg)
+    fwhm: FWHM of the Gaussian gridding kernel (deg)
+    support: kernel cut-off radius in units of fwhm
+    """
+
+    def __init__(self, lonAxis, latAxis, nVel, fwhm, support=1.5) :
+        self.lonAxis = np.asarray(lonAxis, dtype=np.float64)
+        self.latAxis = np.asarray(latAxis, dtype=np.float64)
+        self.nVel = nVel
+        self.fwhm = fwhm
+        self.radius = support*fwhm
+        self.dLon = self.lonAxis[1] - self.lonAxis[0] if len(self.lonAxis) > 1 else np.inf
+        self.dLat = self.latAxis[1] - self.latAxis[0] if len(self.latAxis) > 1 else np.inf
+        nLon, nLat = len(self.lonAxis), len(self.latAxis)
+        self.data = np.zeros((nLon*nLat, nVel))
+        self.weight = np.zeros(nLon*nLat)
+        # pixel offsets covered by the kernel footprint
+        sLon = int(np.ceil(self.radius/self.dLon)) if np.isfinite(self.dLon) else 0
+        sLat = int(np.ceil(self.radius/self.dLat)) if np.isfinite(self.dLat) else 0
+        oLon, oLat = np.meshgrid(np.arange(-sLon, sLon+1), np.arange(-sLat, sLat+1), indexing='ij')
+        self.offsets = (oLon.ravel(), oLat.ravel())
+
+    def _nearest(self, values, axis, step) :
+        if not np.isfinite(step) : return np.zeros(len(values), dtype=np.intp)
+        return np.rint((values - axis[0])/step).astype(np.intp)
+
+    def add(self, lon, lat, spectra, weights=None) :
+        """Grid a batch of M spectra (M, nVel) observed at (lon, lat).
+
+        Spectra with a non-finite value (e.g. the NaN rows anaCampaign()
+        leaves for files it could not analyse), or with a non-finite
+        position or weight, are left out.
+        """
+        lon = np.atleast_1d(np.asarray(lon, dtype=np.float64))
+        lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        spectra = np.atleast_2d(spectra)
+        good = np.isfinite(spectra).all(axis=1) & np.isfinite(lon) & np.isfinite(lat)
+        if weights is not None :
+            weights = np.asarray(weights, dtype=np.float64)
+            good &= np.isfinite(weights)
+        if not good.all() :
+            lon, lat, spectra = lon[good], lat[good], spectra[good]
+            if weights is not None : weights = weights[good]
+        nLon, nLat = len(self.lonAxis), len(self.latAxis)
+        # bring each longitude within 180 deg of the middle of the axis
+        mid = 0.5*(self.lonAxis[0] + self.lonAxis[-1])
+        lonNear = mid + np.mod(lon - mid + 180., 360.) - 180.
+        iLon = self._nearest(lonNear, self.lonAxis, self.dLon)[:, np.newaxis] + self.offsets[0]
+        iLat = self._nearest(lat, self.latAxis, self.dLat)[:, np.newaxis] + self.offsets[1]
+        inside = (iLon >= 0) & (iLon < nLon) & (iLat >= 0) & (iLat < nLat)
+        iLon, iLat = np.clip(iLon, 0, nLon-1), np.clip(iLat, 0, nLat-1)
+        dx = (np.mod(self.lonAxis[iLon] - lon[:, np.newaxis] + 180., 360.) - 180.)*np.cos(np.radians(lat))[:, np.newaxis]
+        dy = self.latAxis[iLat] - lat[:, np.newaxis]
+        r2 = dx*dx + dy*dy
+        inside &= r2 <= self.radius*self.radius
+        kernel = np.exp(-4.*np.log(2.)*r2/(self.fwhm*self.fwhm))
+        if weights is not None : kernel *= weights[:, np.newaxis]
+        m, k = np.nonzero(inside)
+        pix = iLon[m, k]*nLat + iLat[m, k]
+        w = kernel[m, k]
+        self.weight += np.bincount(pix, weights=w, minlength=len(self.weight))
+        scatter = scipy.sparse.csr_matrix((w, (pix, m)), shape=(len(self.weight), len(spectra)))
+        self.data += scatter @ spectra
+
+    def cube(self, fill=np.nan) :
+        """(cube, weight): the weighted mean spectra, shape (nLon, nLat, nVel),
+        and the weight plane, shape (nLon, nLat).  Empty pixels get fill."""
+        nLon, nLat = len(self.lonAxis), len(self.latAxis)
+        with np.errstate(invalid='ignore', divide='ignore') :
+            cube = self.data/self.weight[:, np.newaxis]
+        cube[self.weight == 0] = fill
+        return cube.reshape(nLon, nLat, self.nVel), self.weight.reshape(nLon, nLat)
+
+def gridSpectra(lon, lat, spectra, lonAxis, latAxis, fwhm, support=1.5, weights=None,
+                batch=4096, fill=np.nan) :
+    """Grid all spectra in one pass, batch pointings at a time."""
+    spectra = np.atleast_2d(spectra)
+    grid = CubeGrid(lonAxis, latAxis, spectra.shape[1], fwhm, support)
+    for i in range(0, len(spectra), batch) :
+        w = None if weights is None else weights[i:i+batch]
+        grid.add(lon[i:i+batch], lat[i:i+batch], spectra[i:i+batch], w)
+    return grid.cube(fill)
@@ -0,0 +1,132 @@
+# Persistent index of the JSON sidecar metadata of every observation.
+#
+# The index is a NumPy structured array (the campaign metadata table of
+# ccera.archive plus the path, mtime and size of each sidecar) saved as a
+# .npy file.  updateIndex() only parses sidecars that are new or whose
+# mtime/size changed since the index was written, so refreshing it costs
+# one scandir per directory.  Rows of directories that were not scanned
+# are kept, so one cache can serve several scripts that each refresh only
+# their own data.  A sidecar that cannot be read or parsed (e.g. one the
+# receiver is still writing) is reported and left out, and is tried again
+# on the next update.  queryIndex() selects observations with vectorized
+# comparisons on the table.
+#
+#     python -m ccera.index --run-mode pulsar --target J0332+5434
+
+import json
+import os
+
+import numpy as np
+
+from ccera.archive import META_FIELDS, metaRecord
+
+# the path field is as wide as the longest path in the index
+def indexDtype(pathLength=256) :
+    return np.dtype([('path', 'U{0:d}'.format(max(pathLength, 1))), ('mtime', 'f8'), ('size', 'i8')] + META_FIELDS)
+
+INDEX_DTYPE = indexDtype()
+INDEX_FILE = "metadata_index.npy"
+DATA_DIRS = ["./Lab03_data", "./Lab04_data", "./Lab05_data", "./Lab07_data", "./Lab09_data", "./AL045"]
+
+def loadIndex(cache=INDEX_FILE) :
+    if not os.path.exists(cache) : return np.empty(0, dtype=INDEX_DTYPE)
+    index = np.load(cache, allow_pickle=False)
+    if index.dtype.names is None or index.dtype['path'].kind != 'U' : return np.empty(0, dtype=INDEX_DTYPE)
+    if index.dtype != indexDtype(index.dtype['path'].itemsize//4) : return np.empty(0, dtype=INDEX_DTYPE)
+    return index
+
+def _record(path, stat) :
+    with open(path) as json_file : metadata = json.load(json_file)
+    name = os.path.basename(path).removesuffix(".json")
+    return (path, stat.st_mtime, stat.st_size) + metaRecord(name, metadata)
+
+def updateIndex(directories=DATA_DIRS, cache=INDEX_FILE) :
+    """Bring the index for directories up to date and return it.
+
+    Unchanged sidecars are carried over from the cached index, changed or
+    new ones are parsed, and deleted ones are dropped.  Cached rows of
+    other directories are kept as they are.  The result is sorted by
+    t_start and written back to cache (if cache is not None) when
+    anything changed; use selectDirectories() for the rows of one run.
+    """
+    old = loadIndex(cache) if cache is not None else np.empty(0, dtype=INDEX_DTYPE)
+    oldPaths = [os.path.normpath(p) for p in old['path'].tolist()]
+    known = dict(zip(oldPaths, range(len(old))))
+    scanned = set()
+    keep, fresh = [], []
+    for directory in directories :
+        if not os.path.isdir(directory) : continue
+        directory = os.path.normpath(directory)
+        if directory in scanned : continue
+        scanned.add(directory)
+        with os.scandir(directory) as entries :
+            for entry in entries :
+                if not entry.name.endswith(".json") : continue
+                path = os.path.join(directory, entry.name)
+                stat = entry.stat()
+                i = known.get(path)
+                if i is not None and old['mtime'][i] == stat.st_mtime and old['size'][i] == stat.st_size :
+                    keep.append(i)
+                else :
+                    try : fresh.append(_record(path, stat))
+                    except (OSError, ValueError) as e :
+                        print("updateIndex: skipped {0:s}: {1:s}: {2:s}".format(path, type(e).__name__, str(e)))
+    keep += [i for i, p in enumerate(oldPaths) if os.path.dirname(p) not in scanned]
+    paths = [oldPaths[i] for i in keep] + [record[0] for record in fresh]
+    dtype = indexDtype(max((len(p) for p in paths), default=1))
+    index = np.concatenate([old[np.array(keep, dtype=np.intp)].astype(dtype), np.array(fresh, dtype=dtype)])
+    index['path'] = paths
+    index = index[np.lexsort((index['path'], index['t_start']))]
+    renamed = old['path'].tolist() != oldPaths
+    if cache is not None and (fresh or len(keep) != len(old) or renamed) :
+        np.save(cache, index, allow_pickle=False)
+    return index
+
+def queryIndex(index, t_min=None, t_max=None, run_mode=None, target=None, lon=None, lat=None) :
+    """Rows of index matching every criterion that is given.
+
+    t_min, t_max: range of t_start (unix seconds)
+    run_mode, target: exact match, or a list of accepted values
+    lon, lat: (low, high) boxes in galactic coordinates (deg).  A lon box
+    with low > high wraps through 0, e.g. (350., 10.).
+    """
+    mask = np.ones(len(index), dtype=bool)
+    if t_min is not None : mask &= index['t_start'] >= t_min
+    if t_max is not None : mask &= index['t_start'] <= t_max
+    if run_mode is not None : mask &= np.isin(index['run_mode'], np.atleast_1d(run_mode))
+    if target is not None : mask &= np.isin(index['target'], np.atleast_1d(target))
+    if lon is not None :
+        gLon = np.mod(index['gLon'], 360.)
+        low, high = np.mod(lon[0], 360.), np.mod(lon[1], 360.)
+        if low <= high : mask &= (gLon >= low) & (gLon <= high)
+        else : mask &= (gLon >= low) | (gLon <= high)
+    if lat is not None : mask &= (index['gLat'] >= lat[0]) & (index['gLat'] <= lat[1])
+    return index[mask]
+
+# rows of index whose sidecars are in one of directories
+def selectDirectories(index, directories) :
+    wanted = np.array([os.path.normpath(d) for d in directories])
+    folders = np.array([os.path.dirname(p) for p in index['path'].tolist()])
+    return index[np.isin(folders, wanted)]
+
+# base names (path without .json) of the selected rows, ready for anaSpectrum()
+def baseNames(index) :
+    return [path.removesuffix(".json") for path in index['path'].tolist()]
+
+if __name__ == "__main__" :
+    import argparse
+    parser = argparse.ArgumentParser(description="Query the observation metadata index")
+    parser.add_argument("directories", nargs="*", default=DATA_DIRS)
+    parser.add_argument("--cache", default=INDEX_FILE)
+    parser.add_argument("--t-min", type=float)
+    parser.add_argument("--t-max", type=float)
+    parser.add_argument("--run-mode")
+    parser.add_argument("--target")
+    parser.add_argument("--lon", type=float, nargs=2)
+    parser.add_argument("--lat", type=float, nargs=2)
+    args = parser.parse_args()
+    index = selectDirectories(updateIndex(args.directories, args.cache), args.directories)
+    rows = queryIndex(index, args.t_min, args.t_max, args.run_mode, args.target, args.lon, args.lat)
+    for row in rows :
+        print("{0:s} {1:s} {2:s} gLon={3:8.3f} gLat={4:7.3f}".format(
+            row['path'], row['run_mode'], row['target'], row['gLon'], row['gLat']))
@@ -0,0 +1,197 @@
+# Opt-in timing, counting and memory instrumentation of the pipeline.
+#
+#     from ccera import instrument
+#     with instrument.stage("fit") : ...
+#     @instrument.timed("anaCampaign")
+#     instrument.count("files", n)
+#
+# Nothing is recorded unless instrumentation has been switched on with
+# enable() or by setting CCERA_PROFILE=1 in the environment; while it is
+# off stage() returns one shared no-op context manager and timed()
+# functions call straight through, so the hooks left in the pipeline cost
+# a function call and a flag test.
+#
+# Stages nest: each is recorded under its path ("anaCampaign;anaSpectrum;
+# fit") with the number of calls, total and self time, and -- with
+# enable(memory=True), which turns on tracemalloc -- the peak memory
+# allocated while it was open.  summary() adds the peak RSS of this
+# process and of every worker that reported, and flameLines() gives the
+# folded-stack format of flamegraph.pl.  Pools pass initializer=initWorker,
+# initargs=workerArgs() so that workers record like their parent; they
+# send collect() back with their results and the parent merge()s it.
+# With CCERA_PROFILE set (CCERA_PROFILE=memory adds the allocation
+# tracking), the summary is written at exit to CCERA_PROFILE_OUT
+# (default ccera_profile.json).
+
+import atexit
+import contextlib
+import functools
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+
+_enabled = False
+_memory = False
+_lock = threading.Lock()
+_local = threading.local()
+_stats = {}          # path -> [calls, seconds, alloc peak]
+_counters = {}
+_processes = {}      # pid -> peak RSS (kB) of workers that reported
+_t0 = time.time()
+_NULL = contextlib.nullcontext()
+
+def _stack() :
+    stack = getattr(_local, 'stack', None)
+    if stack is None : stack = _local.stack = []
+    return stack
+
+def enable(memory=False) :
+    global _enabled, _memory, _t0
+    _enabled, _memory, _t0 = True, memory, time.time()
+    if memory and not tracemalloc.is_tracing() : tracemalloc.start()
+
+def disable() :
+    global _enabled, _memory
+    if _memory and tracemalloc.is_tracing() : tracemalloc.stop()
+    _enabled = _memory = False
+
+def isEnabled() :
+    return _enabled
+
+# (enabled, memory) of this process, for initWorker() in a pool
+def workerArgs() :
+    return _enabled, _memory
+
+def initWorker(enabled, memory=False) :
+    """Pool initializer: switch a worker on or off like its parent, which
+    a spawned worker (a fresh interpreter) does not inherit."""
+    if enabled : enable(memory)
+    else : disable()
+
+def reset() :
+    with _lock :
+        _stats.clear()
+        _counters.clear()
+        _processes.clear()
+
+class _Stage :
+    __slots__ = ('name', 'path', 't0', 'mem0', 'childPeak')
+
+    def __init__(self, name) :
+        self.name = name
+
+    def __enter__(self) :
+        stack = _stack()
+        if _memory and stack :
+            stack[-1].childPeak = max(stack[-1].childPeak, tracemalloc.get_traced_memory()[1])
+        stack.append(self)
+        self.path = ";".join(s.name for s in stack)
+        self.childPeak = 0
+        if _memory :
+            self.mem0 = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) :
+        dt = time.perf_counter() - self.t0
+        stack = _stack()
+        stack.pop()
+        peak = 0
+        if _memory and tracemalloc.is_tracing() :
+            # every stage resets the tracemalloc peak on entry, so the
+            # peaks seen before and inside nested stages are carried up
+            absPeak = max(tracemalloc.get_traced_memory()[1], self.childPeak)
+            peak = absPeak - self.mem0
+            if stack : stack[-1].childPeak = max(stack[-1].childPeak, absPeak)
+        with _lock :
+            rec = _stats.get(self.path)
+            if rec is None : rec = _stats[self.path] = [0, 0., 0]
+            rec[0] += 1
+            rec[1] += dt
+            rec[2] = max(rec[2], peak)
+        return False
+
+def stage(name) :
+    """Context manager timing the enclosed block as stage name."""
+    if not _enabled : return _NULL
+    return _Stage(name)
+
+def timed(name=None) :
+    """Decorator: time every call of the function as a stage."""
+    def decorate(func) :
+        label = name or func.__name__
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs) :
+            if not _enabled : return func(*args, **kwargs)
+            with _Stage(label) : return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def count(name, n=1) :
+    if not _enabled : return
+    with _lock : _counters[name] = _counters.get(name, 0) + n
+
+# peak resident set size of this process in kB
+def peakRss() :
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss//1024 if sys.platform == "darwin" else rss
+
+def collect() :
+    """This process's records, for a worker to return to its parent; the
+    records are cleared so that the next task starts from zero."""
+    with _lock :
+        data = {'stages': {p : list(r) for p, r in _stats.items()}, 'counters': dict(_counters),
+                'processes': dict(_processes)}
+        _stats.clear()
+        _counters.clear()
+        _processes.clear()
+    data['processes'][os.getpid()] = peakRss()
+    return data
+
+def merge(data) :
+    """Add the records returned by collect() in another process."""
+    if data is None : return
+    with _lock :
+        for path, (calls, seconds, peak) in data['stages'].items() :
+            rec = _stats.get(path)
+            if rec is None : rec = _stats[path] = [0, 0., 0]
+            rec[0] += calls
+            rec[1] += seconds
+            rec[2] = max(rec[2], peak)
+        for name, n in data['counters'].items() : _counters[name] = _counters.get(name, 0) + n
+        for pid, rss in data['processes'].items() : _processes[int(pid)] = max(_processes.get(int(pid), 0), rss)
+
+# Self time is a stage's time less that of its direct children.  Stages
+# run by workers add up their CPU time, which can exceed the wall time of
+# the parent stage that waited for them; self time is then 0.
+def summary() :
+    with _lock :
+        child = {}
+        for path, rec in _stats.items() :
+            parent = path.rpartition(";")[0]
+            if parent : child[parent] = child.get(parent, 0.) + rec[1]
+        stages = {path : {'calls': calls, 'seconds': seconds, 'self': max(seconds - child.get(path, 0.), 0.),
+                          'alloc_peak': peak}
+                  for path, (calls, seconds, peak) in sorted(_stats.items())}
+        return {'pid': os.getpid(), 'argv': sys.argv, 'wall': time.time() - _t0, 'memory': _memory,
+                'peak_rss_kb': peakRss(), 'workers_peak_rss_kb': {str(p) : r for p, r in _processes.items()},
+                'stages': stages, 'counters': dict(_counters)}
+
+# folded stacks ("a;b;c microseconds") of self time, for flamegraph.pl
+def flameLines() :
+    return ["{0:s} {1:d}".format(path, int(round(1.e6*s['self'])))
+            for path, s in summary()['stages'].items()]
+
+def writeSummary(file) :
+    with open(file, "w") as f :
+        json.dump(summary(), f, indent=1)
+
+if os.environ.get("CCERA_PROFILE", "") not in ("", "0") :
+    enable(memory=os.environ.get("CCERA_PROFILE") == "memory")
+    _pid = os.getpid()
+    atexit.register(lambda : os.getpid() == _pid and writeSummary(os.environ.get("CCERA_PROFILE_OUT", "ccera_profile.json")))
@@ -0,0 +1,31 @@
+# 2-D maps of radial functions f(r), r = sqrt(x^2 + y^2) (Lab06_01).
+#
+# The map is filled tile by tile with broadcasting over the x and y axes,
+# so the temporaries are bounded by the tile size whatever the size of the
+# map, and the output may be an np.memmap for maps that do not fit in
+# memory.  Row j of the map corresponds to x[j] and column i to y[i].
+
+import numpy as np
+
+# sin(kr)/r, equal to k at r=0
+def sinkr(k) :
+    return lambda r : k*np.sinc(k*r/np.pi)
+
+def openMap(file, nRows, nCols, dtype=np.float32) :
+    """Writable memmap to render a map straight to disk."""
+    return np.memmap(file, dtype=dtype, mode='w+', shape=(nRows, nCols))
+
+def radialMap(func, x, y, tile=2048, out=None, dtype=np.float64) :
+    """Evaluate func(hypot(x[j], y[i])) into a (len(x), len(y)) map.
+
+    func must accept an array of radii.  out may be an existing array or
+    memmap of that shape; otherwise a new array of dtype is returned.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if out is None : out = np.empty((len(x), len(y)), dtype=dtype)
+    for j0 in range(0, len(x), tile) :
+        xs = x[j0:j0+tile, np.newaxis]
+        for i0 in range(0, len(y), tile) :
+            out[j0:j0+tile, i0:i0+tile] = func(np.hypot(xs, y[np.newaxis, i0:i0+tile]))
+    return out
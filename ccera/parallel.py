@@ -0,0 +1,109 @@
+# Run anaSpectrum() over a whole campaign on a pool of worker processes.
+#
+# The sorted list of observations is cut into chunks of consecutive files
+# and each chunk is one task, so a worker reuses its cached axes and
+# baseline design for every file it handles.  Results are written into
+# the rows of one preallocated array in the order of base_names, whatever
+# order the tasks finish in.  A file that fails -- unreadable, or with a
+# velocity axis (freq, srate, fft_size) other than that of the first
+# readable file -- leaves a row of NaN and an entry in the returned error
+# list, and so does every file of a task whose worker died; none of them
+# stops the batch.
+# With ccera.instrument enabled, each worker sends its stage timings back
+# with the chunk and the parent merges them into its own.
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from ccera import instrument
+from ccera.spectrum import getMetaData, getWindow, anaSpectrum
+
+def getContext() :
+    """multiprocessing context for the worker pools of ccera: fork where
+    the platform has it, so that the Lab scripts (which have no __main__
+    guard) are not re-executed by every worker; None (the default start
+    method) elsewhere."""
+    if "fork" in multiprocessing.get_all_start_methods() :
+        return multiprocessing.get_context("fork")
+    return None
+
+def _anaChunk(start, base_names, kwargs, vRef, meta=None, report=False) :
+    if report : instrument.reset()
+    rows, errors = [], []
+    tolerance = 0.5*abs(vRef[1] - vRef[0]) if len(vRef) > 1 else 0.
+    for i, base_name in enumerate(base_names) :
+        try :
+            metadata = None if meta is None else meta[i]
+            vDoppler, power = anaSpectrum(base_name, metadata=metadata, **kwargs)
+            if len(vDoppler) != len(vRef) or not np.allclose(vDoppler, vRef, rtol=0., atol=tolerance) :
+                raise ValueError("velocity axis differs from that of the campaign")
+            rows.append(power)
+        except Exception as e :
+            rows.append(None)
+            errors.append((start+i, base_name, "{0:s}: {1:s}".format(type(e).__name__, str(e))))
+    return start, rows, errors, instrument.collect() if report else None
+
+def anaCampaign(base_names, nWorkers=None, chunksize=16, out=None, meta=None, **kwargs) :
+    """Analyse every observation in base_names in parallel.
+
+    nWorkers: number of processes (default os.cpu_count()); 1 runs in
+    this process without a pool.
+    out: optional (len(base_names), nChan) array to fill, e.g. mapData.
+    meta: optional metadata table with one record per base name (from
+    ccera.index or ccera.archive), so that no sidecar is parsed again.
+    kwargs are passed on to anaSpectrum() (chan, calib, vMin, vMax, ...).
+    Returns (vDoppler, mapData, errors) where errors is a list of
+    (row, base_name, message) for the files that could not be analysed.
+    """
+    base_names = list(base_names)
+    vMin, vMax = kwargs.get('vMin', -300.), kwargs.get('vMax', 300.)
+    if meta is not None and len(meta) != len(base_names) :
+        raise ValueError("meta has {0:d} records for {1:d} files".format(len(meta), len(base_names)))
+    vDoppler = _referenceAxis(base_names, vMin, vMax, meta)
+    mapData = np.zeros((len(base_names), len(vDoppler))) if out is None else out
+    chunks = [(start, base_names[start:start+chunksize], kwargs, vDoppler,
+               None if meta is None else meta[start:start+chunksize])
+              for start in range(0, len(base_names), chunksize)]
+
+    def store(start, rows, errors, stats) :
+        instrument.merge(stats)
+        for i, power in enumerate(rows) :
+            mapData[start+i] = np.nan if power is None else power
+        return errors
+
+    errors = []
+    if nWorkers is None : nWorkers = os.cpu_count() or 1
+    with instrument.stage("anaCampaign") :
+        if nWorkers <= 1 :
+            for chunk in chunks : errors += store(*_anaChunk(*chunk))
+        else :
+            with ProcessPoolExecutor(max_workers=nWorkers, mp_context=getContext(),
+                                     initializer=instrument.initWorker, initargs=instrument.workerArgs()) as pool :
+                futures = {pool.submit(_anaChunk, *chunk, instrument.isEnabled()) : chunk for chunk in chunks}
+                for future in as_completed(futures) :
+                    try :
+                        errors += store(*future.result())
+                    except Exception as e :
+                        # the worker died (BrokenProcessPool) or its result
+                        # could not be sent back: fail the files of the chunk
+                        start, names = futures[future][:2]
+                        message = "{0:s}: {1:s}".format(type(e).__name__, str(e))
+                        errors += store(start, [None]*len(names),
+                                        [(start+i, b, message) for i, b in enumerate(names)], None)
+    instrument.count("errors", len(errors))
+    errors.sort()
+    return vDoppler, mapData, errors
+
+# velocity axis of the first observation whose metadata can be read
+def _referenceAxis(base_names, vMin, vMax, meta=None) :
+    for i, base_name in enumerate(base_names) :
+        try :
+            metadata = getMetaData(base_name + ".json") if meta is None else meta[i]
+            freqs, vDoppler, i1, i2 = getWindow(metadata, vMin, vMax)
+            return vDoppler[i1:i2]
+        except (OSError, ValueError, KeyError, TypeError) :
+            continue
+    raise ValueError("no observation with readable metadata among {0:d} files".format(len(base_names)))
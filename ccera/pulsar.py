@@ -0,0 +1,98 @@
+# Epoch folding of the pulsar-mode power time series (Lab09).
+#
+# A pulsar run writes one float32 power sample per t_sample seconds for
+# each polarization (_1.sum, _2.sum).  The series are memory mapped and
+# streamed through in fixed-size chunks; for each chunk the pulse phase
+#     phi(t) = t/P - 0.5*Pdot*t^2/P^2
+# of every sample is binned and the summed power of both polarizations is
+# accumulated with np.bincount, so memory use is set by the chunk size and
+# not by the length of the run.  foldTrials() folds each chunk at many
+# trial periods at once.
+
+import numpy as np
+
+from ccera.reader import openSeries
+from ccera.spectrum import getMetaData
+
+def getSampleTime(metadata) :
+    if 't_sample' in metadata : return metadata['t_sample']
+    return metadata['fft_size']*metadata['decimation_factor']/metadata['srate']
+
+def openPulsarRun(base_name, n_chans=None) :
+    """(metadata, [series, ...]) with one memmapped series per polarization."""
+    metadata = getMetaData(base_name + ".json")
+    if n_chans is None : n_chans = metadata.get('n_chans', 2)
+    series = [openSeries(base_name + "_{0:d}.sum".format(chan)) for chan in range(1, n_chans+1)]
+    return metadata, series
+
+# summed power of all polarizations, chunk samples at a time
+def sumChunks(series, chunk=1<<20) :
+    nSamples = min(len(s) for s in series)
+    for start in range(0, nSamples, chunk) :
+        stop = min(start+chunk, nSamples)
+        total = np.array(series[0][start:stop], dtype=np.float64)
+        for s in series[1:] : total += s[start:stop]
+        yield start, total
+
+def getPhase(t, period, pdot=0.) :
+    return t/period - 0.5*pdot*t*t/(period*period)
+
+def foldSeries(series, t_sample, period, pdot=0., nBins=64, chunk=1<<20, t0=0.) :
+    """Fold the summed polarizations at one period.
+
+    series: list of 1-D arrays (e.g. from openPulsarRun())
+    t0: time of the first sample; phases are referred to t=0
+    Returns (profile, counts): mean power and number of samples per bin.
+    """
+    sums = np.zeros(nBins)
+    counts = np.zeros(nBins, dtype=np.int64)
+    for start, power in sumChunks(series, chunk) :
+        t = t0 + t_sample*np.arange(start, start+len(power), dtype=np.float64)
+        phase = getPhase(t, period, pdot)
+        bins = ((phase - np.floor(phase))*nBins).astype(np.intp)
+        np.minimum(bins, nBins-1, out=bins)
+        sums += np.bincount(bins, weights=power, minlength=nBins)
+        counts += np.bincount(bins, minlength=nBins)
+    with np.errstate(invalid='ignore') :
+        return sums/counts, counts
+
+def foldTrials(series, t_sample, periods, pdots=0., nBins=64, chunk=1<<16, t0=0.) :
+    """Fold the summed polarizations at every trial period in one pass.
+
+    periods, pdots: arrays of nTrials trial values (pdots may be a scalar)
+    Each chunk of the series is read once and, while it is in cache,
+    binned at every trial in turn, so the run is streamed from memory
+    once however many trials there are.
+    Returns (profiles, counts), both of shape (nTrials, nBins).
+    """
+    periods = np.atleast_1d(np.asarray(periods, dtype=np.float64))
+    pdots = np.broadcast_to(np.asarray(pdots, dtype=np.float64), periods.shape)
+    nTrials = len(periods)
+    sums = np.zeros((nTrials, nBins))
+    counts = np.zeros((nTrials, nBins), dtype=np.int64)
+    phase = np.empty(chunk)
+    bins = np.empty(chunk, dtype=np.int32)
+    for start, power in sumChunks(series, chunk) :
+        n = len(power)
+        t = t0 + t_sample*np.arange(start, start+n, dtype=np.float64)
+        for i in range(nTrials) :
+            p, b = phase[:n], bins[:n]
+            np.divide(t, periods[i], out=p)
+            if pdots[i] != 0. : p -= 0.5*pdots[i]*t*t/(periods[i]*periods[i])
+            p -= np.floor(p)
+            p *= nBins
+            b[:] = p
+            np.minimum(b, nBins-1, out=b)
+            sums[i] += np.bincount(b, weights=power, minlength=nBins)
+            counts[i] += np.bincount(b, minlength=nBins)
+    with np.errstate(invalid='ignore') :
+        return sums/counts, counts
+
+# a simple figure of merit for a folded profile: peak height above the
+# median in units of the robust (MAD) scatter of the bins
+def profileSignificance(profile) :
+    profile = np.asarray(profile)
+    med = np.nanmedian(profile, axis=-1, keepdims=True)
+    mad = 1.4826*np.nanmedian(np.abs(profile - med), axis=-1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore') :
+        return ((np.nanmax(profile, axis=-1, keepdims=True) - med)/mad)[..., 0]
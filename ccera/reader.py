@@ -0,0 +1,76 @@
+# Memory-mapped access to the receiver's .avg and .sum files.
+#
+# Both file types are raw float32: an .avg file holds rows of fft_size
+# channel powers, a .sum file holds the total power time series.  Nothing
+# here reads a whole file into memory -- the arrays returned are read-only
+# np.memmap views, so slicing and windowing do not copy.  Scaling (the
+# calibration factors the labs multiply by) is applied only to the part
+# that is actually requested, optionally into a buffer the caller owns.
+
+import os
+
+import numpy as np
+
+def openSeries(file, dtype=np.float32) :
+    """Read-only 1-D memmap of a .sum (or any raw float32) file."""
+    if os.path.getsize(file) == 0 : 
+        return np.empty(0, dtype=dtype)
+    return np.memmap(file, dtype=dtype, mode='r')
+
+def openSpectra(file, fft_size, dtype=np.float32) :
+    """Read-only (rows, fft_size) memmap of an .avg file.
+
+    A trailing partial row (a file still being written) is ignored.
+    """
+    itemsize = np.dtype(dtype).itemsize
+    rows = os.path.getsize(file)//(itemsize*fft_size)
+    if rows == 0 :
+        return np.empty((0, fft_size), dtype=dtype)
+    return np.memmap(file, dtype=dtype, mode='r', shape=(rows, fft_size))
+
+class ScaledSeries :
+    """A 1-D series with a scale factor that is applied on access.
+
+    series = ScaledSeries(openSeries(base_name + "_1.sum"), 1000.)
+    series[i:j] returns scale*data[i:j] (only that slice is copied),
+    series.window(i, j, out=buf) writes it into buf instead, and
+    series.chunks(n) walks the whole series n samples at a time.
+    """
+
+    def __init__(self, data, scale=1.) :
+        self.data = data
+        self.scale = scale
+
+    def __len__(self) :
+        return len(self.data)
+
+    @property
+    def shape(self) :
+        return self.data.shape
+
+    def __getitem__(self, idx) :
+        return self.scale*self.data[idx]
+
+    def window(self, start, stop, out=None) :
+        stop = min(stop, len(self.data))
+        if out is None :
+            return self.scale*self.data[start:stop]
+        out = out[:stop-start]
+        np.multiply(self.data[start:stop], self.scale, out=out)
+        return out
+
+    def chunks(self, size, overlap=0, out=None) :
+        """Yield (start, block) pairs covering the series.
+
+        Consecutive blocks overlap by overlap samples.  If out is given
+        (at least size long) every block is written into it, so the
+        caller must use each block before asking for the next one.
+        """
+        step = size - overlap
+        if step <= 0 : raise ValueError("chunk size must exceed the overlap")
+        nSamples = len(self.data)
+        start = 0
+        while start < nSamples :
+            yield start, self.window(start, start+size, out)
+            if start + size >= nSamples : break
+            start += step
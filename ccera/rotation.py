@@ -0,0 +1,55 @@
+# Galactic rotation curve from the tangent points of a longitude scan (Lab07).
+#
+# For each longitude l in the first quadrant the most negative approach
+# velocity with HI emission comes from the tangent point, at galactocentric
+# radius R*sin(l).  tangentVelocity() finds that velocity for every row of
+# a (longitude x velocity) map at once; rotationCurve() turns the tangent
+# velocities into rotation velocity, radius and angular velocity.
+
+import numpy as np
+
+R = 2.46e20/1000          # Sun's galactocentric radius (km)
+Omega = 7.98e-16          # Sun's angular velocity (rad/s)
+
+def tangentVelocity(mapData, vDoppler, threshold=5., last=False, interpolate=False) :
+    """Velocity of the first (or last) channel above threshold in each row.
+
+    mapData: (nRows, nChan) spectra on the velocity axis vDoppler
+    interpolate: place the crossing between channels by linear
+    interpolation instead of returning the channel velocity
+    Rows with no channel above threshold give NaN.
+    """
+    mapData = np.asarray(mapData)
+    vDoppler = np.asarray(vDoppler, dtype=np.float64)
+    above = mapData > threshold
+    found = above.any(axis=1)
+    nChan = mapData.shape[1]
+    if last : idx = nChan - 1 - np.argmax(above[:, ::-1], axis=1)
+    else : idx = np.argmax(above, axis=1)
+    v = vDoppler[idx]
+    if interpolate :
+        # the neighbour on the side that is below threshold
+        prev = idx + 1 if last else idx - 1
+        ok = found & (prev >= 0) & (prev < nChan)
+        prev = np.clip(prev, 0, nChan-1)
+        rows = np.arange(len(mapData))
+        p0, p1 = mapData[rows, prev], mapData[rows, idx]
+        with np.errstate(divide='ignore', invalid='ignore') :
+            frac = (threshold - p0)/(p1 - p0)
+            vi = vDoppler[prev] + frac*(vDoppler[idx] - vDoppler[prev])
+        v = np.where(ok, vi, v)
+    return np.where(found, v, np.nan)
+
+def rotationCurve(gLon, vTangent, vLSR, R=R, Omega=Omega) :
+    """(vRotation, radius, aRotation) for arrays of tangent-point data.
+
+    gLon in degrees, vTangent and vLSR in km/s; NaN tangent velocities
+    propagate to NaN results.
+    """
+    gLon = np.radians(np.asarray(gLon, dtype=np.float64))
+    sinl = np.sin(gLon)
+    vRotation = (np.asarray(vLSR) - np.asarray(vTangent)) + R*Omega*sinl
+    radius = R*sinl
+    with np.errstate(divide='ignore', invalid='ignore') :
+        aRotation = vRotation/radius
+    return vRotation, radius, aRotation
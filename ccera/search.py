@@ -0,0 +1,204 @@
+# FFT periodicity search for the pulsar-mode time series (Lab09).
+#
+# An hour at t_sample = 0.384 ms is ~9.4 million samples per polarization,
+# and a multi-hour run does not fit comfortably in memory as a complex
+# FFT.  powerSpectrum() therefore uses the "four-step" factorization
+# N = N1*N2: the (mean subtracted, polarization summed) series is viewed
+# as an (N2, N1) array, FFTs are taken down the columns a block of columns
+# at a time, multiplied by the twiddle factors, then taken along the rows a
+# block of rows at a time.  Intermediate results live in scratch memmaps
+# and every block is sized from the memory budget.
+#
+# The spectrum is then whitened (divided by its running median in blocks,
+# which also removes the red noise) so the powers are ~Exp(1), and the
+# harmonic sums S_h(f) = P(f) + P(2f) + ... + P(hf) for h = 1, 2, 4, 8, 16
+# are searched for the strongest candidates.  Only local maxima over
+# +/- cluster bins count as candidates, so the leakage of one signal into
+# its neighbouring bins gives a single candidate, and a candidate whose
+# frequency is a small ratio m/n of a stronger one (a harmonic or a
+# subharmonic found with another h) is dropped.
+
+import math
+import os
+import tempfile
+
+import numpy as np
+import scipy.fft
+import scipy.special as sps
+from scipy.ndimage import maximum_filter1d
+
+from ccera.pulsar import openPulsarRun, getSampleTime
+
+CANDIDATE_DTYPE = np.dtype([('freq', 'f8'), ('period', 'f8'), ('harmonics', 'i4'),
+                            ('bin', 'i8'), ('power', 'f8'), ('sigma', 'f8')])
+
+def _factor(n) :
+    n2 = scipy.fft.next_fast_len(max(1, int(math.sqrt(n))))
+    n1 = scipy.fft.next_fast_len(-(-n//n2))
+    return n1, n2
+
+def powerSpectrum(series, t_sample, scratch, memory=256<<20) :
+    """Power spectrum of the summed series, computed out of core.
+
+    series: list of 1-D (memmapped) arrays, one per polarization
+    scratch: directory for the temporary files
+    memory: approximate budget (bytes) for the in-memory blocks
+    Returns (power, df): a float32 memmap of the N//2+1 non-negative
+    frequency powers and the bin width in Hz.
+    """
+    nSamples = min(len(s) for s in series)
+    if nSamples == 0 : raise ValueError("cannot take the power spectrum of an empty series")
+    n1, n2 = _factor(nSamples)
+    nPad = n1*n2
+    step = max(1, memory//32)
+
+    # summed, mean subtracted, zero padded input
+    mean = sum(float(np.sum(s[start:start+step], dtype=np.float64))
+               for s in series for start in range(0, nSamples, step))/nSamples
+    x = np.memmap(os.path.join(scratch, "series.f4"), dtype=np.float32, mode='w+', shape=(nPad,))
+    for start in range(0, nSamples, step) :
+        stop = min(start+step, nSamples)
+        block = np.array(series[0][start:stop], dtype=np.float64)
+        for s in series[1:] : block += s[start:stop]
+        x[start:stop] = block - mean
+    x[nSamples:] = 0.
+    a = x.reshape(n2, n1)
+
+    # step 1: FFT down the columns and apply the twiddle factors
+    b = np.memmap(os.path.join(scratch, "columns.c8"), dtype=np.complex64, mode='w+', shape=(n2, n1))
+    k2 = np.arange(n2)[:, np.newaxis]
+    cols = max(1, memory//(48*n2))
+    for c0 in range(0, n1, cols) :
+        c1 = min(c0+cols, n1)
+        block = scipy.fft.fft(a[:, c0:c1], axis=0)
+        block *= np.exp(-2.j*np.pi*(k2*np.arange(c0, c1))/nPad)
+        b[:, c0:c1] = block
+
+    # step 2: FFT along the rows; X[k2 + n2*k1] = row k2, column k1
+    p = np.memmap(os.path.join(scratch, "power.f4"), dtype=np.float32, mode='w+', shape=(n1, n2))
+    rows = max(1, memory//(48*n1))
+    for r0 in range(0, n2, rows) :
+        r1 = min(r0+rows, n2)
+        block = scipy.fft.fft(b[r0:r1], axis=1)
+        p[:, r0:r1] = (block.real**2 + block.imag**2).T
+    p.flush()
+    del a, b
+    return p.reshape(-1)[:nPad//2+1], 1./(nPad*t_sample)
+
+def whiten(power, block=2048, chunk=1<<22) :
+    """Normalize power in place so that noise powers are ~Exp(1).
+
+    Each run of block bins is divided by its median/ln(2), which follows
+    any red noise that varies slowly on the scale of a block.
+    """
+    chunk -= chunk % block
+    for start in range(0, len(power), chunk) :
+        stop = min(start+chunk, len(power))
+        seg = np.array(power[start:stop], dtype=np.float64)
+        nFull = len(seg)//block
+        if nFull :
+            full = seg[:nFull*block].reshape(nFull, block)
+            full /= np.median(full, axis=1, keepdims=True)/math.log(2.)
+        if len(seg) > nFull*block :
+            tail = seg[nFull*block:]
+            tail /= np.median(tail)/math.log(2.)
+        power[start:stop] = seg
+    power[0] = 0.
+    return power
+
+# Gaussian-equivalent significance of a sum of h Exp(1) powers
+def getSigma(sums, h) :
+    logp = sps.gammaincc(h, sums)
+    with np.errstate(divide='ignore') :
+        logp = np.log(logp)
+    sigma = np.where(logp > -700., -sps.ndtri(np.exp(np.maximum(logp, -700.))), 0.)
+    deep = -2.*logp
+    with np.errstate(invalid='ignore', divide='ignore') :
+        tail = np.sqrt(np.maximum(deep - np.log(np.maximum(deep, 1.)) - math.log(2.*np.pi), 0.))
+    return np.where(logp > -700., sigma, tail)
+
+# strongest candidates first, dropping any within cluster bins of a
+# stronger one
+def _suppress(cand, cluster) :
+    cand = cand[np.argsort(cand['power'], kind='stable')[::-1]]
+    keep = []
+    for i, k in enumerate(cand['bin']) :
+        if all(abs(k - cand['bin'][j]) > cluster for j in keep) : keep.append(i)
+    return cand[keep]
+
+# indices of the bins (strongest first) that are not m/n times a stronger
+# kept one for m, n <= maxRatio, to a bin on either side (cluster bins for
+# the same frequency); stops once limit bins are kept
+def _unrelated(bins, cluster, maxRatio, limit=None) :
+    ratios = np.arange(1, maxRatio+1)
+    m, n = ratios[:, np.newaxis, np.newaxis], ratios[np.newaxis, :, np.newaxis]
+    tolerance = np.maximum(m + n, cluster)
+    keep = []
+    for i, k in enumerate(bins) :
+        if len(keep) == limit : break
+        if not np.any(np.abs(m*k - n*bins[keep]) <= tolerance) : keep.append(i)
+    return keep
+
+# drop candidates (sorted by sigma) harmonically related to a stronger one
+def _dedupeHarmonics(cand, cluster, maxRatio, limit=None) :
+    return cand[_unrelated(cand['bin'], cluster, maxRatio, limit)]
+
+def harmonicSum(power, df, harmonics=(1, 2, 4, 8, 16), fMin=0.1, fMax=None,
+                nCandidates=20, chunk=1<<20, cluster=3) :
+    """Ranked candidates from incoherent harmonic sums of a whitened spectrum.
+
+    For each number of harmonics h the fundamental bins k are processed a
+    chunk at a time: S_h[k] = sum_{j=1..h} power[j*k], which reads the
+    contiguous range power[j*k0 : j*k1] once per harmonic.  Of every h the
+    best nCandidates local maxima (over +/- cluster bins) that are not
+    harmonically related to a stronger one are kept, so that the harmonics
+    of a bright pulsar do not crowd out a weaker source; the union is
+    sorted by sigma, deduplicated the same way across h and cut to the
+    nCandidates most significant.
+    """
+    nBins = len(power)
+    kMin = max(1, int(math.ceil(fMin/df)))
+    maxRatio = max(harmonics, default=1)
+    found = []
+    for h in harmonics :
+        kMax = (nBins-1)//h
+        if fMax is not None : kMax = min(kMax, int(fMax/df))
+        best = np.empty(0, dtype=CANDIDATE_DTYPE)
+        for k0 in range(kMin, kMax+1, chunk) :
+            k1 = min(k0+chunk, kMax+1)
+            sums = np.zeros(k1-k0)
+            for j in range(1, h+1) :
+                sums += power[j*k0:j*(k1-1)+1:j]
+            peaks = np.nonzero(sums == maximum_filter1d(sums, 2*cluster+1, mode='nearest'))[0]
+            peaks = peaks[np.argsort(sums[peaks], kind='stable')[::-1]]
+            top = peaks[_unrelated(k0 + peaks, cluster, maxRatio, nCandidates)]
+            cand = np.empty(len(top), dtype=CANDIDATE_DTYPE)
+            cand['bin'] = k0 + top
+            cand['freq'] = cand['bin']*df
+            cand['period'] = 1./cand['freq']
+            cand['harmonics'] = h
+            cand['power'] = sums[top]
+            best = _dedupeHarmonics(_suppress(np.concatenate([best, cand]), cluster), cluster, maxRatio, nCandidates)
+        best['sigma'] = getSigma(best['power'], h)
+        found.append(best)
+    found = np.concatenate(found) if found else np.empty(0, dtype=CANDIDATE_DTYPE)
+    found = found[np.argsort(found['sigma'], kind='stable')[::-1]]
+    return _dedupeHarmonics(found, cluster, maxRatio, nCandidates)
+
+def searchSeries(series, t_sample, memory=256<<20, scratch=None, **kwargs) :
+    """Power spectrum, whitening and harmonic search of a set of series.
+
+    kwargs go to harmonicSum() (harmonics, fMin, fMax, nCandidates).
+    Scratch files are removed afterwards.
+    """
+    with tempfile.TemporaryDirectory(dir=scratch) as tmp :
+        power, df = powerSpectrum(series, t_sample, tmp, memory)
+        whiten(power, chunk=max(1<<16, memory//16))
+        candidates = harmonicSum(power, df, chunk=max(1<<14, memory//64), **kwargs)
+        del power
+    return candidates
+
+def searchRun(base_name, memory=256<<20, scratch=None, **kwargs) :
+    """Periodicity search of both polarizations of a Lab09 pulsar run."""
+    metadata, series = openPulsarRun(base_name)
+    return searchSeries(series, getSampleTime(metadata), memory, scratch, **kwargs)
@@ -0,0 +1,91 @@
+# Single-pulse search of the pulsar-mode power time series (Lab09).
+#
+# The summed polarizations are streamed in chunks that overlap by a few
+# detrending blocks.  In each chunk the slowly varying baseline is removed
+# with a running median (medians of block-sample blocks, median filtered
+# over nMedian blocks and interpolated back to every sample), the noise is
+# measured from the median absolute deviation, and boxcars of
+# log-spaced widths 1, 2, 4, ... are formed from one prefix sum, so every
+# width costs O(N).  Threshold crossings are reduced to the peak of each
+# run of samples, and events that overlap across widths are merged into
+# the one with the highest S/N.
+
+import numpy as np
+from scipy.ndimage import median_filter
+
+from ccera.pulsar import openPulsarRun, getSampleTime
+
+EVENT_DTYPE = np.dtype([('time', 'f8'), ('sample', 'i8'), ('width', 'i4'), ('snr', 'f4')])
+
+def getWidths(maxWidth=256) :
+    return 2**np.arange(int(np.log2(maxWidth))+1)
+
+# running median baseline of x from block medians
+def getBaseline(x, block=1024, nMedian=15) :
+    nBlocks = len(x)//block
+    if nBlocks < 2 : return np.full(len(x), np.median(x))
+    medians = np.median(x[:nBlocks*block].reshape(nBlocks, block), axis=1)
+    medians = median_filter(medians, size=min(nMedian, nBlocks), mode='nearest')
+    centres = (np.arange(nBlocks) + 0.5)*block
+    return np.interp(np.arange(len(x)), centres, medians)
+
+# the highest sample of every run of consecutive samples above threshold
+def _peaks(snr, threshold, lo, hi) :
+    idx = np.flatnonzero(snr[lo:hi] > threshold) + lo
+    if len(idx) == 0 : return idx
+    starts = np.flatnonzero(np.diff(idx, prepend=-2) > 1)
+    runs = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, len(idx))))
+    order = np.lexsort((-snr[idx], runs))
+    first = np.concatenate([[True], np.diff(runs[order]) != 0])
+    return idx[order[first]]
+
+def mergeEvents(events) :
+    """Keep the highest S/N event of every group of overlapping events."""
+    if len(events) == 0 : return events
+    events = events[np.argsort(events['sample'], kind='stable')]
+    ends = np.maximum.accumulate(events['sample'] + events['width'])
+    cluster = np.cumsum(np.concatenate([[0], events['sample'][1:] >= ends[:-1]]))
+    order = np.lexsort((-events['snr'], cluster))
+    first = np.concatenate([[True], np.diff(cluster[order]) != 0])
+    return events[order[first]]
+
+def searchPulses(series, t_sample, threshold=6., maxWidth=256, block=1024, nMedian=15,
+                 chunk=1<<21, merge=True) :
+    """Single-pulse events in the sum of series.
+
+    series: list of 1-D (memmapped) arrays, one per polarization
+    Returns a structured array with the time (s) and sample of the start
+    of each event, its boxcar width (samples) and S/N.
+    """
+    widths = getWidths(maxWidth)
+    nSamples = min(len(s) for s in series)
+    pad = max(int(widths.max()), block*(nMedian//2 + 1))
+    found = []
+    for start in range(0, nSamples, chunk) :
+        stop = min(start+chunk, nSamples)
+        lo, hi = max(start-pad, 0), min(stop+pad, nSamples)
+        x = np.array(series[0][lo:hi], dtype=np.float64)
+        for s in series[1:] : x += s[lo:hi]
+        x -= getBaseline(x, block, nMedian)
+        sigma = 1.4826*np.median(np.abs(x))
+        if sigma == 0 : continue
+        cs = np.concatenate([[0.], np.cumsum(x)])
+        for w in widths :
+            if w > len(x) : break
+            snr = (cs[w:] - cs[:-w])/(sigma*np.sqrt(w))
+            # only report boxcars that start inside this chunk's own samples
+            peaks = _peaks(snr, threshold, start-lo, min(stop-lo, len(snr)))
+            if len(peaks) == 0 : continue
+            events = np.empty(len(peaks), dtype=EVENT_DTYPE)
+            events['sample'] = lo + peaks
+            events['time'] = events['sample']*t_sample
+            events['width'] = w
+            events['snr'] = snr[peaks]
+            found.append(events)
+    events = np.concatenate(found) if found else np.empty(0, dtype=EVENT_DTYPE)
+    return mergeEvents(events) if merge else events[np.argsort(events['sample'], kind='stable')]
+
+def searchRunPulses(base_name, **kwargs) :
+    """Single-pulse search of both polarizations of a Lab09 pulsar run."""
+    metadata, series = openPulsarRun(base_name)
+    return searchPulses(series, getSampleTime(metadata), **kwargs)
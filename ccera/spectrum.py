@@ -0,0 +1,110 @@
+# Spectral analysis routines shared by the HI line labs (Lab05 - Lab07).
+#
+# These are the getMetaData/getData/getFreqs/getVelocities/anaSpectrum
+# functions that used to be copied into every Lab script.  The frequency
+# and velocity axes, the slice indices for the velocity window and the
+# baseline design matrix depend only on (freq, srate, fft_size, vMin, vMax),
+# which are fixed for a whole campaign, so they are computed once and
+# memoized.  The cached arrays are read-only; copy them before modifying.
+
+import json
+import os
+from functools import lru_cache
+
+import numpy as np
+
+from ccera import instrument
+from ccera.baseline import getDesign, fitBackground, fitBackgroundStack
+from ccera.reader import openSpectra
+
+f0, c = 1420.41, 3.0e5       # HI rest frequency (MHz), speed of light (km/s)
+
+# calibration (K per unit of .avg power) the Lab scripts use for each data
+# set: 1.3e5 for the Lab05/Lab06 observations, 1.10e5 (Lab07 and the
+# default of anaSpectrum) for everything else
+CALIB = {'Lab05_data': 1.3e5, 'Lab06_data': 1.3e5, 'AL045': 1.3e5}
+DEFAULT_CALIB = 1.10e5
+
+def getCalib(directory) :
+    return CALIB.get(os.path.basename(os.path.normpath(directory)), DEFAULT_CALIB)
+
+def getMetaData(file, verbose=False) :
+    with open(file) as json_file:
+        dict = json.load(json_file)
+    if verbose :
+        print("From file {0:s} \nread dictionary={1:s}".format(file,str(dict)))
+    return dict 
+
+# vals is a flat, read-only view of the memory-mapped (rows, fft_size)
+# array; use ccera.reader.openSpectra() to get it with its 2-D shape
+def getData(file,fft_size) :
+    spectra = openSpectra(file, fft_size)
+    rows, cols = spectra.shape
+    return spectra.reshape(-1), rows, cols
+
+def getFreqs(metadata) :
+    return getAxes(metadata['freq'], metadata['srate'], metadata['fft_size'])[0]
+
+def getVelocities(f) :
+    v = c*(f/f0 - 1.)
+    return v
+
+def _readOnly(a) :
+    a.setflags(write=False)
+    return a
+
+# frequency axis (MHz), velocity axis (km/s) and the [i1:i2] slice
+# covering vMin < v < vMax.  With no velocity window i1, i2 = 0, fft_size.
+@lru_cache(maxsize=64)
+def getAxes(freq, srate, fft_size, vMin=None, vMax=None) :
+    dF = 1.e-6*srate
+    fMin = 1.e-6*freq - 0.5*dF
+    fMax = 1.e-6*freq + 0.5*dF
+    freqs = np.linspace(fMin,fMax,fft_size)
+    vDoppler = getVelocities(freqs)
+    i1 = 0 if vMin is None else int(np.searchsorted(vDoppler,vMin))
+    i2 = fft_size if vMax is None else int(np.searchsorted(vDoppler,vMax))
+    return _readOnly(freqs), _readOnly(vDoppler), i1, i2
+
+# metadata may be a sidecar dict or a record of a campaign metadata table
+def getWindow(metadata, vMin=-300., vMax=300.) :
+    return getAxes(float(metadata['freq']), float(metadata['srate']), int(metadata['fft_size']), vMin, vMax)
+
+# baseline design matrix for the sliced velocity axis of a campaign
+@lru_cache(maxsize=64)
+def getBaselineDesign(freq, srate, fft_size, vMin, vMax, n, vSignal) :
+    freqs, vDoppler, i1, i2 = getAxes(freq, srate, fft_size, vMin, vMax)
+    return tuple(_readOnly(a) for a in getDesign(vDoppler[i1:i2], n, vSignal))
+
+# calibrated spectrum of one channel over vMin < v < vMax, before
+# baseline removal.  Pass metadata if it has already been read.
+# The "read" stage only maps the file; the page reads show up in "slice".
+def getSpectrum(base_name, chan=1, calib=1.10e5, vMin=-300., vMax=300., metadata=None) :
+    if metadata is None :
+        with instrument.stage("metadata") : metadata = getMetaData(base_name + ".json")
+    fft_size = metadata['fft_size']
+    data_file = base_name + "_{0:d}.avg".format(chan)
+    with instrument.stage("read") : power, rows, cols = getData(data_file,fft_size)
+
+    with instrument.stage("axis") : freqs, vDoppler, i1, i2 = getWindow(metadata, vMin, vMax)
+    with instrument.stage("slice") : power = calib*power[i1:i2]
+    return vDoppler[i1:i2], power
+
+@instrument.timed()
+def anaSpectrum(base_name, chan=1, calib=1.10e5, vMin=-300., vMax=300., n=5, vSignal=200., metadata=None) :
+    if metadata is None :
+        with instrument.stage("metadata") : metadata = getMetaData(base_name + ".json")
+    vDoppler, power = getSpectrum(base_name, chan, calib, vMin, vMax, metadata)
+    with instrument.stage("fit") :
+        design = getBaselineDesign(metadata['freq'], metadata['srate'], metadata['fft_size'],
+                                   vMin, vMax, n, vSignal)
+        background = fitBackgroundStack(vDoppler, power, n, vSignal, design=design)
+    instrument.count("spectra")
+    return vDoppler, power-background 
+
+# calibrated spectra of one channel for every observation of a campaign
+# loaded with ccera.archive.loadCampaign(), before baseline removal
+@instrument.timed()
+def getCampaignSpectra(meta, spectra, chan=1, calib=1.10e5, vMin=-300., vMax=300.) :
+    freqs, vDoppler, i1, i2 = getWindow(meta[0], vMin, vMax)
+    return vDoppler[i1:i2], np.multiply(spectra[:, chan-1, i1:i2], calib, dtype=np.float64)
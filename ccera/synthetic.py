@@ -0,0 +1,169 @@
+# Synthetic CCERA observations for benchmarking (see ccera/bench.py).
+#
+# Writes the same files the receiver does -- a JSON sidecar per run plus
+# raw float32 _1/_2.avg spectra or _1/_2.sum time series -- so every
+# reader in ccera and the Lab scripts can run on them unchanged.
+#   doppler  HI spectra of a galactic-plane scan: a smooth Chebyshev
+#            bandpass, HI emission from a flat rotation curve along each
+#            line of sight and radiometer noise
+#   transit  total power of a Sun/Cygnus drift scan: an Airy beam on a
+#            constant background plus noise
+#   pulsar   pulsar-mode total power: a periodic Gaussian pulse in noise
+# Files are named from t_start like the real ones, one run per minute
+# or more, so 100k observations still get unique names.  Spectra are
+# generated a block of files at a time.
+
+import json
+import os
+import time
+
+import numpy as np
+from numpy.polynomial import chebyshev
+
+from ccera.beam import airyBeam
+from ccera.spectrum import getAxes
+
+T_START = 1722128236.       # 2024-07-28, the Lab07 campaign
+R0, V0 = 8.5, 220.          # solar radius (kpc) and flat rotation speed (km/s)
+
+DOPPLER = {"freq": 1420400000.0, "srate": 4166666.6666666665, "fft_size": 2048,
+           "decimation_factor": 10000, "n_chans": 2, "run_mode": "doppler",
+           "target": "galactic_scan", "run_type": "Transit", "run_time": 180.}
+TRANSIT = {"freq": 1418500000.0, "srate": 8928571.42857143, "fft_size": 2048,
+           "decimation_factor": 10000, "n_chans": 2, "run_mode": "doppler",
+           "target": "Sun", "run_type": "Transit", "run_time": 3600.}
+PULSAR = {"freq": 1420400000.0, "srate": 20833333.333333332, "fft_size": 32,
+          "decimation_factor": 250, "n_chans": 2, "run_mode": "pulsar",
+          "target": "J0332+5434", "run_type": "Transit", "run_time": 3600.}
+KINDS = {"doppler": DOPPLER, "transit": TRANSIT, "pulsar": PULSAR}
+
+# J2000 equatorial -> galactic rotation matrix
+_GAL = np.array([[-0.0548755604, -0.8734370902, -0.4838350155],
+                 [ 0.4941094279, -0.4448296300,  0.7469822445],
+                 [-0.8676661490, -0.1980763734,  0.4559837762]])
+
+def galacticToEquatorial(gLon, gLat) :
+    l, b = np.radians(gLon), np.radians(gLat)
+    xyz = _GAL.T @ np.array([np.cos(b)*np.cos(l), np.cos(b)*np.sin(l), np.sin(b)])
+    return np.degrees(np.arctan2(xyz[1], xyz[0])), np.degrees(np.arcsin(xyz[2]))
+
+def getBaseName(t_start) :
+    return time.strftime("%Y-%m-%d-%H%M", time.gmtime(t_start))
+
+# nSamples: length of the .sum series, which sets run_time
+def makeMetadata(kind, t_start, fft_size=None, gLon=0., gLat=0., nSamples=None, **kwargs) :
+    metadata = dict(KINDS[kind])
+    if fft_size is not None : metadata['fft_size'] = int(fft_size)
+    metadata['t_sample'] = metadata['fft_size']*metadata['decimation_factor']/metadata['srate']
+    if nSamples is not None : metadata['run_time'] = nSamples*metadata['t_sample']
+    ra, dec = galacticToEquatorial(gLon, gLat)
+    metadata.update({"az": 180., "alt": 45., "RA": float(ra), "dec": float(dec),
+                     "gLon": float(gLon), "gLat": float(gLat), "t_start": float(t_start), "vlsr": 0.})
+    metadata.update(kwargs)
+    return metadata
+
+# HI brightness (K) on the velocity axis for each longitude: Gaussian
+# clouds at the radial velocities of a flat rotation curve, one per kpc
+# of distance along the line of sight
+def hiProfile(vDoppler, gLon, rng, dMax=20., sigma=8.) :
+    l = np.radians(np.asarray(gLon, dtype=np.float64))[:, np.newaxis]
+    d = np.arange(0.5, dMax, 1.)
+    R = np.maximum(np.sqrt(R0*R0 + d*d - 2.*R0*d*np.cos(l)), 0.1)
+    vRadial = V0*R0*np.sin(l)*(1./R - 1./R0)
+    amp = 10.*np.exp(-(R - R0)/6.)*rng.uniform(0.5, 1.5, vRadial.shape)
+    profile = np.zeros((len(l), len(vDoppler)))
+    for k in range(len(d)) :
+        profile += amp[:, k, np.newaxis]*np.exp(-0.5*np.square((vDoppler - vRadial[:, k, np.newaxis])/sigma))
+    return profile
+
+def makeSpectra(metadata, gLon, rng, rows=1, calib=1.10e5, level=6.e-4, noise=1.e-2) :
+    """Raw .avg powers, shape (len(gLon), n_chans, rows, fft_size), float32.
+
+    Each file gets its own bandpass (a random low-order Chebyshev series
+    around level) with the HI profile, divided by calib, on top.  noise is
+    the rms relative to the bandpass.
+    """
+    fft_size, n_chans = metadata['fft_size'], metadata['n_chans']
+    freqs, vDoppler, i1, i2 = getAxes(metadata['freq'], metadata['srate'], fft_size)
+    x = np.linspace(-1., 1., fft_size)
+    coef = rng.normal(0., 0.1, (len(gLon), n_chans, 6))
+    coef[..., 0] = 1.
+    bandpass = level*(coef @ chebyshev.chebvander(x, 5).T)                  # (nFiles, n_chans, fft_size)
+    line = hiProfile(vDoppler, gLon, rng)/calib
+    spectra = bandpass[:, :, np.newaxis, :] + line[:, np.newaxis, np.newaxis, :]
+    spectra = spectra*(1. + noise*rng.standard_normal(spectra.shape))
+    return spectra.astype(np.float32)
+
+def makeTransit(metadata, rng, calib=17.3, base_temp=150., peak_temp=13250., width=325., noise=0.01) :
+    """Raw .sum powers of a drift scan, shape (n_chans, nVals), float32."""
+    nVals = int(metadata['run_time']/metadata['t_sample'])
+    times = metadata['t_sample']*np.arange(nVals)
+    mean_time = rng.uniform(0.4, 0.6)*metadata['run_time']
+    model = airyBeam(times, mean_time, base_temp, peak_temp*rng.uniform(0.9, 1.1, metadata['n_chans']),
+                     width*rng.uniform(0.95, 1.05))
+    power = model*(1. + noise*rng.standard_normal(model.shape))
+    return (power/calib).astype(np.float32)
+
+def makePulsar(metadata, rng, nSamples=None, period=0.714519699, duty=0.03, snr=0.05) :
+    """Raw .sum powers of a pulsar run, shape (n_chans, nSamples), float32.
+
+    nSamples defaults to run_time/t_sample of metadata.
+    """
+    if nSamples is None : nSamples = int(round(metadata['run_time']/metadata['t_sample']))
+    t = metadata['t_sample']*np.arange(nSamples)
+    phase = t/period
+    phase = phase - np.floor(phase) - 0.5
+    pulse = snr*np.exp(-0.5*np.square(phase/duty))
+    power = 1. + pulse + rng.standard_normal((metadata['n_chans'], nSamples))
+    return power.astype(np.float32)
+
+def writeObservation(directory, metadata, avg=None, sums=None) :
+    base_name = os.path.join(directory, getBaseName(metadata['t_start']))
+    for chan in range(metadata['n_chans']) :
+        if avg is not None : avg[chan].tofile(base_name + "_{0:d}.avg".format(chan+1))
+        if sums is not None : sums[chan].tofile(base_name + "_{0:d}.sum".format(chan+1))
+    with open(base_name + ".json", "w") as json_file :
+        json.dump(metadata, json_file)
+    return base_name
+
+def generateCampaign(directory, nFiles, kind="doppler", fft_size=None, rows=1, nSamples=1<<20,
+                     seed=0, block=256, t_start=T_START) :
+    """Write nFiles synthetic observations of one kind into directory.
+
+    doppler runs step through gLon = 0..360 degrees along the plane.
+    Returns the list of base names, in time order.
+    """
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    if kind != "pulsar" : nSamples = None
+    step = max(60., 60.*np.ceil(makeMetadata(kind, t_start, fft_size, nSamples=nSamples)['run_time']/60.))
+    base_names = []
+    for start in range(0, nFiles, block) :
+        n = min(block, nFiles-start)
+        gLon = np.linspace(0., 360., nFiles, endpoint=False)[start:start+n]
+        metas = [makeMetadata(kind, t_start + step*(start+i), fft_size, gLon[i], nSamples=nSamples) for i in range(n)]
+        if kind == "doppler" :
+            spectra = makeSpectra(metas[0], gLon, rng, rows)
+            for i in range(n) : base_names.append(writeObservation(directory, metas[i], avg=spectra[i]))
+        elif kind == "transit" :
+            for meta in metas : base_names.append(writeObservation(directory, meta, sums=makeTransit(meta, rng)))
+        else :
+            for meta in metas : base_names.append(writeObservation(directory, meta, sums=makePulsar(meta, rng)))
+    return base_names
+
+if __name__ == "__main__" :
+    import argparse
+    parser = argparse.ArgumentParser(description="Write synthetic CCERA observations")
+    parser.add_argument("directory")
+    parser.add_argument("--files", type=int, default=1000, help="number of runs (e.g. 1000, 10000, 100000)")
+    parser.add_argument("--kind", choices=sorted(KINDS), default="doppler")
+    parser.add_argument("--fft-size", type=int, default=None, help="spectral channels, up to 32768")
+    parser.add_argument("--rows", type=int, default=1, help="spectra per .avg file")
+    parser.add_argument("--samples", type=int, default=1<<20, help="samples per pulsar .sum file")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    t0 = time.perf_counter()
+    base_names = generateCampaign(args.directory, args.files, args.kind, args.fft_size, args.rows,
+                                  args.samples, args.seed)
+    print("{0:d} {1:s} runs written to {2:s} in {3:.1f} s".format(
+        len(base_names), args.kind, args.directory, time.perf_counter() - t0))
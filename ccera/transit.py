@@ -0,0 +1,192 @@
+# Automatic Airy beam fits of the Sun and Cygnus A drift scans (Lab03, Lab04).
+#
+# Instead of hand-tuning (mean_time, base_temp, peak_temp, width) and
+# taking np.argmax of the noisy power for the peak time, every _1.sum /
+# _2.sum series is fitted with the Airy beam model of ccera/beam.py:
+#   1. initial guesses from the series matched-filtered with an Airy beam
+#      of the expected width (after a short running median that removes
+#      RFI spikes): peak time from the filter maximum, background from a
+#      low percentile, peak height from the smoothed series there;
+#   2. scipy.optimize.least_squares with the analytic Jacobian
+#      airyJacobian() over the main lobe, |t - mean_time| < fitRange*width,
+#      re-centred once on the first fit.  base_temp is bounded to the
+#      range of the data, peak_temp to twice that range and width to
+#      widthRange times the expected width;
+#   3. 1-sigma uncertainties from the covariance, with the noise taken
+#      from the rms of the residuals (the .sum files carry no errors).
+# A fit is only accepted (empty flag) when the optimizer converged, the
+# errors are finite, the width is not pinned at a bound and the peak is
+# at least minSnr times both its error and the residual rms.  fitRun()
+# also compares the polarizations, which see the same transit: when their
+# peak times disagree by more than a quarter of the width there is no
+# telling which one locked onto a baseline jump, so both are flagged.
+# fitRuns() fits many runs in parallel and returns one row per run and
+# channel in a structured array.
+#
+#     python -m ccera.transit Lab03_data Lab04_data --output transits.csv
+
+import glob
+import os
+
+import numpy as np
+from scipy.ndimage import median_filter
+from scipy.optimize import least_squares
+
+from ccera.beam import airyBeam, airyJacobian, airyPattern
+from ccera.reader import openSeries
+from ccera.spectrum import getMetaData
+
+FWHM = 2.*1.6163399483106482/np.pi     # Airy FWHM in units of width
+BEAM_WIDTH = 340.                      # expected width (s) of a Sun/Cygnus transit
+
+TRANSIT_DTYPE = np.dtype([('name', 'U32'), ('target', 'U32'), ('chan', 'i4'), ('t_start', 'f8'),
+                          ('mean_time', 'f8'), ('width', 'f8'), ('peak_temp', 'f8'), ('base_temp', 'f8'),
+                          ('dmean_time', 'f8'), ('dwidth', 'f8'), ('dpeak_temp', 'f8'), ('dbase_temp', 'f8'),
+                          ('rms', 'f8'), ('nPoints', 'i4'), ('ok', '?'), ('flag', 'U20')])
+
+def initialGuess(times, power, width=BEAM_WIDTH, smooth=15) :
+    """(mean_time, base_temp, peak_temp, width) from the series matched-
+    filtered with an Airy beam of the expected width."""
+    dt = times[1] - times[0]
+    smoothed = median_filter(np.asarray(power, dtype=np.float64), size=smooth, mode='nearest')
+    base = np.percentile(smoothed, 10.)
+    half = max(1, int(FWHM*width/dt))
+    kernel = airyPattern(np.pi*dt*np.arange(-half, half+1)/width)
+    kernel /= kernel.sum()
+    filtered = np.convolve(np.pad(smoothed - base, half, mode='edge'), kernel, mode='valid')
+    i = np.argmax(filtered)
+    return np.array([times[i], base, max(smoothed[i] - base, 0.), width])
+
+def checkFit(p, errors, rms, lo, hi, success, minSnr=5.) :
+    """'' for an acceptable fit, otherwise the reason it is not."""
+    if not success : return "no convergence"
+    if not np.all(np.isfinite(errors)) : return "singular"
+    if p[3] <= 1.01*lo[3] or p[3] >= 0.99*hi[3] : return "width at bound"
+    if p[2] < minSnr*errors[2] or p[2] < minSnr*rms : return "weak peak"
+    return ""
+
+def fitTransit(times, power, start=None, fitRange=2., width=BEAM_WIDTH, widthRange=(0.5, 2.),
+               smooth=15, minSnr=5.) :
+    """Fit airyBeam() to one drift scan.
+
+    width: expected beam width (s), used for the initial guess and the
+    bounds widthRange*width on the fitted width.
+    Returns (params, errors, rms, nPoints, flag) with params and errors in
+    the order (mean_time, base_temp, peak_temp, width); rms is that of
+    the residuals over the fitted samples and flag is '' for an accepted
+    fit or the reason it was rejected (see checkFit()).
+    """
+    times = np.asarray(times, dtype=np.float64)
+    power = np.asarray(power, dtype=np.float64)
+    pMin, pMax = power.min(), power.max()
+    lo = np.array([times[0], pMin, 0., widthRange[0]*width])
+    hi = np.array([times[-1], pMax, 2.*(pMax - pMin) + 1.e-9, widthRange[1]*width])
+    p = initialGuess(times, power, width, smooth) if start is None else np.asarray(start, dtype=np.float64)
+    p = np.clip(p, lo + 1.e-6*(hi - lo), hi - 1.e-6*(hi - lo))
+    result = None
+    for i in range(2) :
+        use = np.abs(times - p[0]) < fitRange*p[3]
+        if use.sum() < 8 : break
+        t, y = times[use], power[use]
+        result = least_squares(lambda q : airyBeam(t, *q) - y, p, jac=lambda q : airyJacobian(t, *q),
+                               bounds=(lo, hi), x_scale='jac')
+        p = result.x
+    if result is None :
+        return p, np.full(4, np.nan), np.nan, 0, "too few samples"
+    n = len(result.fun)
+    variance = float(np.sum(result.fun**2))/max(n - 4, 1)
+    try :
+        cov = np.linalg.inv(result.jac.T @ result.jac)*variance
+        errors = np.sqrt(np.diag(cov))
+    except np.linalg.LinAlgError :
+        errors = np.full(4, np.nan)
+    rms = np.sqrt(variance)
+    return p, errors, rms, n, checkFit(p, errors, rms, lo, hi, result.success, minSnr)
+
+def fitRun(base_name, chans=None, calib=17.3, **kwargs) :
+    """Fit every polarization of one run; returns rows of TRANSIT_DTYPE."""
+    metadata = getMetaData(base_name + ".json")
+    if chans is None : chans = range(1, metadata.get('n_chans', 2)+1)
+    rows = np.zeros(len(chans), dtype=TRANSIT_DTYPE)
+    for row, chan in zip(rows, chans) :
+        power = calib*np.asarray(openSeries(base_name + "_{0:d}.sum".format(chan)), dtype=np.float64)
+        times = metadata['t_sample']*np.arange(len(power))
+        p, e, rms, n, flag = fitTransit(times, power, **kwargs)
+        row['name'], row['target'], row['chan'] = os.path.basename(base_name), metadata.get('target', ''), chan
+        row['t_start'] = metadata['t_start']
+        row['mean_time'], row['base_temp'], row['peak_temp'], row['width'] = p
+        row['dmean_time'], row['dbase_temp'], row['dpeak_temp'], row['dwidth'] = e
+        row['rms'], row['nPoints'], row['flag'] = rms, n, flag
+    good = rows['flag'] == ""
+    if good.sum() > 1 :
+        t, w = rows['mean_time'][good], rows['width'][good]
+        if t.max() - t.min() > 0.25*w.min() : rows['flag'][good] = "channels disagree"
+    rows['ok'] = rows['flag'] == ""
+    return rows
+
+def _fitOne(base_name, kwargs) :
+    try :
+        return base_name, fitRun(base_name, **kwargs), None
+    except Exception as e :
+        return base_name, None, "{0:s}: {1:s}".format(type(e).__name__, str(e))
+
+def listTransits(directories) :
+    """Base names of the runs with .sum files that are not pulsar runs."""
+    base_names = []
+    for directory in directories :
+        for json_file in sorted(glob.glob(os.path.join(directory, "*.json"))) :
+            base_name = json_file.removesuffix(".json")
+            if not os.path.exists(base_name + "_1.sum") : continue
+            if getMetaData(json_file).get('run_mode') == 'pulsar' : continue
+            base_names.append(base_name)
+    return base_names
+
+def fitRuns(base_names, nWorkers=None, **kwargs) :
+    """Fit all runs, in parallel when nWorkers > 1 (default: all CPUs).
+
+    Returns (table, errors): the rows of every run in the order of
+    base_names, and a list of (base_name, message) for runs that failed.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from ccera.parallel import getContext
+    if nWorkers is None : nWorkers = os.cpu_count() or 1
+    if nWorkers <= 1 or len(base_names) <= 1 :
+        results = [_fitOne(b, kwargs) for b in base_names]
+    else :
+        with ProcessPoolExecutor(max_workers=nWorkers, mp_context=getContext()) as pool :
+            results = list(pool.map(_fitOne, base_names, [kwargs]*len(base_names)))
+    table = [rows for b, rows, error in results if rows is not None]
+    errors = [(b, error) for b, rows, error in results if error is not None]
+    return (np.concatenate(table) if table else np.zeros(0, dtype=TRANSIT_DTYPE)), errors
+
+def printTable(table) :
+    print("{0:16s} {1:10s} {2:>4s} {3:>17s} {4:>15s} {5:>19s} {6:>15s} {7:>7s}".format(
+        "run", "target", "chan", "peak time (s)", "width (s)", "peak temp (K)", "base temp (K)", "rms (K)"))
+    for r in table :
+        print("{0:16s} {1:10s} {2:4d} {3:8.1f} +/- {4:5.1f} {5:6.1f} +/- {6:4.1f} {7:8.1f} +/- {8:6.1f} "
+              "{9:6.1f} +/- {10:4.1f} {11:7.1f}  {12:s}".format(
+              r['name'], r['target'], r['chan'], r['mean_time'], r['dmean_time'], r['width'], r['dwidth'],
+              r['peak_temp'], r['dpeak_temp'], r['base_temp'], r['dbase_temp'], r['rms'], r['flag']))
+
+def saveTable(table, file) :
+    names = TRANSIT_DTYPE.names
+    with open(file, "w") as f :
+        f.write(",".join(names) + "\n")
+        for r in table : f.write(",".join(str(r[n]) for n in names) + "\n")
+
+if __name__ == "__main__" :
+    import argparse
+    parser = argparse.ArgumentParser(description="Fit the Airy beam to every Sun/Cygnus drift scan")
+    parser.add_argument("directories", nargs="*", default=["./Lab03_data", "./Lab04_data"])
+    parser.add_argument("--calib", type=float, default=17.3)
+    parser.add_argument("--fit-range", type=float, default=2., help="fit |t - mean_time| < fit_range*width")
+    parser.add_argument("--width", type=float, default=BEAM_WIDTH, help="expected beam width (s)")
+    parser.add_argument("--smooth", type=int, default=15, help="running median length against RFI spikes")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", help="write the table to this CSV file")
+    args = parser.parse_args()
+    table, errors = fitRuns(listTransits(args.directories), args.workers, calib=args.calib,
+                            fitRange=args.fit_range, width=args.width, smooth=args.smooth)
+    printTable(table)
+    for base_name, message in errors : print("FAILED {0:s}: {1:s}".format(base_name, message))
+    if args.output : saveTable(table, args.output)
@@ -0,0 +1,80 @@
+# Batched vLSR corrections for arrays of pointings.
+#
+# This is the vlsr() calculation from Lab06_animation.py: the barycentric
+# radial velocity correction for the observer minus the projection of the
+# Sun's motion towards the solar apex, but done for whole arrays of
+# (RA, dec, t_start) in one astropy call.  The solar apex coordinate and the
+# observatory location are built once.  The sign follows the "vlsr" value
+# the receiver stores in the JSON sidecars,
+#     vlsr = vBarycentric - vSun.source
+# (the opposite sign to what the old vlsr() returned); with the default
+# location the results agree with the sidecars to better than 1 m/s.
+#
+# cachedVlsr() memoizes results keyed on the pointing and a time bucket,
+# for repeated corrections of the same fields.
+
+from functools import lru_cache
+
+import numpy as np
+import astropy.units as u
+from astropy.coordinates import SkyCoord, EarthLocation
+from astropy.time import Time
+
+# CCERA site, as recovered from the vlsr values in the sidecars
+CCERA_LAT, CCERA_LON, CCERA_HEIGHT = 45.3486, -76.0414, 0.
+vSun = -20.0              # km/s, towards the solar apex
+
+@lru_cache(maxsize=None)
+def getSolarApex() :
+    return SkyCoord(ra="18:03:50.29", dec="+30:00:16.8", frame="icrs", unit=(u.hourangle, u.deg))
+
+@lru_cache(maxsize=8)
+def getLocation(lat=CCERA_LAT, lon=CCERA_LON, height=CCERA_HEIGHT) :
+    return EarthLocation.from_geodetic(lon=lon*u.deg, lat=lat*u.deg, height=height*u.m)
+
+def getVlsr(ra, dec, t_start, loc=None) :
+    """vLSR (km/s) for arrays of RA, dec (deg) and t_start (unix seconds)."""
+    if loc is None : loc = getLocation()
+    ra, dec, t_start = np.broadcast_arrays(np.asarray(ra, dtype=np.float64),
+                                           np.asarray(dec, dtype=np.float64),
+                                           np.asarray(t_start, dtype=np.float64))
+    psrc = SkyCoord(ra=ra*u.deg, dec=dec*u.deg, frame="icrs")
+    t = Time(t_start, scale="utc", format="unix")
+    vsrc = psrc.radial_velocity_correction(obstime=t, location=loc).to(u.km/u.s).value
+    vsun_proj = vSun*psrc.cartesian.dot(getSolarApex().cartesian).value
+    return vsrc - vsun_proj
+
+def metadataVlsr(metadata, loc=None) :
+    """vLSR for a sidecar dict, a list of them or a campaign metadata table."""
+    if isinstance(metadata, dict) : metadata = [metadata]
+    if isinstance(metadata, list) :
+        ra = [m['RA'] for m in metadata]
+        dec = [m['dec'] for m in metadata]
+        t_start = [m['t_start'] for m in metadata]
+    else :
+        ra, dec, t_start = metadata['RA'], metadata['dec'], metadata['t_start']
+    return getVlsr(ra, dec, t_start, loc)
+
+_cache = {}
+
+def cachedVlsr(ra, dec, t_start, loc=None, bucket=60., precision=1.e-3) :
+    """getVlsr() with results memoized per (RA, dec, time bucket).
+
+    Pointings are rounded to precision degrees and times to bucket seconds;
+    the correction is evaluated at the centre of the bucket.  The
+    correction changes by at most a few m/s per minute.  Only the keys not
+    already cached are sent to astropy, in one batch.
+    """
+    if loc is None : loc = getLocation()
+    ra, dec, t_start = np.broadcast_arrays(np.atleast_1d(ra), np.atleast_1d(dec), np.atleast_1d(t_start))
+    kRa = np.rint(np.asarray(ra, dtype=np.float64)/precision).astype(np.int64)
+    kDec = np.rint(np.asarray(dec, dtype=np.float64)/precision).astype(np.int64)
+    kT = np.floor(np.asarray(t_start, dtype=np.float64)/bucket).astype(np.int64)
+    site = tuple(loc.geocentric[i].to_value(u.m) for i in range(3))
+    keys = [(site, bucket, precision, a, d, t) for a, d, t in zip(kRa.tolist(), kDec.tolist(), kT.tolist())]
+    missing = sorted(set(k for k in keys if k not in _cache))
+    if missing :
+        m = np.array([k[3:] for k in missing], dtype=np.float64)
+        values = getVlsr(m[:, 0]*precision, m[:, 1]*precision, (m[:, 2] + 0.5)*bucket, loc)
+        _cache.update(zip(missing, values.tolist()))
+    return np.array([_cache[k] for k in keys])
@@ -0,0 +1,281 @@
+# Incremental waterfall for a campaign directory that is still growing.
+#
+# The receiver drops a YYYY-MM-DD-HHMM.json / _1.avg / _2.avg triple into
+# the campaign directory for every observation.  refreshWaterfall() keeps
+# the analysed waterfall and a manifest of what went into it in a state
+# directory (by default <campaign>.waterfall/):
+#
+#     waterfall.f8     raw float64 rows of anaSpectrum() output
+#                      (waterfall.<n>.f8 after the n-th full rewrite)
+#     manifest.jsonl   a header line with the analysis parameters and the
+#                      generation n of the data file, then one line per
+#                      row: name, t_start, row and the (mtime, size)
+#                      stamps of the three files
+#
+# Only triples whose names are not in the manifest yet are analysed
+# (recheck=True also stats the known triples and redoes those whose stamps
+# changed).  New rows are appended (the files stay sorted by t_start; an
+# observation that arrives out of order triggers a one-off rewrite),
+# changed rows are rewritten in place, so a refresh costs the same however
+# long the campaign already is.  A triple is only taken once all three
+# files exist, the .avg files hold whole spectra and nothing has been
+# modified for settle seconds; one whose axis differs from that of the
+# waterfall, or that anaSpectrum() fails on, is reported and skipped
+# until its files change.
+# Rows are appended before their manifest lines, so after a crash the
+# waterfall file may be longer than the manifest says; it is cut back to
+# the rows in the manifest before anything is added.  A full rewrite goes
+# to a data file of the next generation, and only the manifest that names
+# it switches over, so a crash leaves either the old pair or the new one;
+# data files no manifest refers to are deleted.
+#
+#     python -m ccera.watch ./AL045 --interval 30
+
+import json
+import os
+import time
+
+import numpy as np
+
+from ccera import instrument
+from ccera.spectrum import getMetaData, getWindow, anaSpectrum, getCalib
+
+WATERFALL = "waterfall.f8"
+MANIFEST = "manifest.jsonl"
+DEFAULTS = {'chan': 1, 'vMin': -300., 'vMax': 300.}       # calib: getCalib(directory)
+
+_failed = {}         # (state, name) -> stamp of triples that could not be analysed
+
+def defaultState(directory) :
+    return directory.rstrip("/") + ".waterfall"
+
+def _readManifest(state) :
+    header, entries = None, {}
+    path = os.path.join(state, MANIFEST)
+    if not os.path.exists(path) : return header, entries
+    with open(path) as f :
+        for line in f :
+            if not line.strip() : continue
+            try : entry = json.loads(line)
+            except ValueError : break             # line cut short by a crash
+            if not line.endswith("\n") : break
+            if header is None : header = entry
+            else : entries[entry['name']] = entry
+    return header, entries
+
+# data file of the waterfall described by header
+def _dataPath(state, header) :
+    generation = header.get('generation', 0)
+    if generation == 0 : return os.path.join(state, WATERFALL)
+    root, ext = os.path.splitext(WATERFALL)
+    return os.path.join(state, "{0:s}.{1:d}{2:s}".format(root, generation, ext))
+
+# delete the data files in state other than keep, left by a crash before
+# the manifest that would have used (or dropped) them was written
+def _removeData(state, keep=None) :
+    root, ext = os.path.splitext(WATERFALL)
+    for name in os.listdir(state) :
+        path = os.path.join(state, name)
+        if name.startswith(root) and name.endswith(ext) and path != keep : os.remove(path)
+
+def _writeManifest(state, header, entries) :
+    path = os.path.join(state, MANIFEST)
+    with open(path + ".tmp", "w") as f :
+        f.write(json.dumps(header) + "\n")
+        for entry in sorted(entries.values(), key=lambda e : e['row']) :
+            f.write(json.dumps(entry) + "\n")
+    os.replace(path + ".tmp", path)
+
+def _stamp(base_name, n_chans=2) :
+    files = [base_name + ".json"] + [base_name + "_{0:d}.avg".format(c) for c in range(1, n_chans+1)]
+    stamp = []
+    for file in files :
+        try : st = os.stat(file)
+        except FileNotFoundError : return None
+        stamp.append([st.st_mtime, st.st_size])
+    return stamp
+
+# all files present, the .avg files hold whole spectra and nothing has
+# been touched for settle seconds
+def _complete(stamp, fft_size, now, settle) :
+    if stamp is None : return False
+    for mtime, size in stamp[1:] :
+        if size == 0 or size % (4*fft_size) : return False
+    return all(now - mtime >= settle for mtime, size in stamp)
+
+# cut the waterfall file back to the rows listed in the manifest and
+# forget entries whose rows never made it to disk.  Returns True when the
+# manifest has to be rewritten (entries dropped or a line cut short).
+def _recover(state, header, entries) :
+    freqs, vDoppler, i1, i2 = getWindow(header, header['vMin'], header['vMax'])
+    rowBytes = 8*(i2 - i1)
+    path = _dataPath(state, header)
+    _removeData(state, keep=path)
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    lost = [n for n, e in entries.items() if (e['row']+1)*rowBytes > size]
+    for name in lost : del entries[name]
+    rows = sorted(e['row'] for e in entries.values())
+    if rows != list(range(len(rows))) :
+        raise ValueError("manifest of {0:s} does not match its waterfall; delete the state to rebuild it".format(state))
+    if size != len(rows)*rowBytes :
+        with open(path, "ab") as f : f.truncate(len(rows)*rowBytes)
+    with open(os.path.join(state, MANIFEST), "rb") as f :
+        f.seek(-1, os.SEEK_END)
+        return bool(lost) or f.read(1) != b"\n"
+
+def loadWaterfall(state) :
+    """(vDoppler, mapData, names, t_start) from a state directory.
+
+    mapData is a read-only memmap with one row per observation in time order.
+    """
+    header, entries = _readManifest(state)
+    if header is None : raise FileNotFoundError("no waterfall in {0:s}".format(state))
+    freqs, vDoppler, i1, i2 = getWindow(header, header['vMin'], header['vMax'])
+    order = sorted(entries.values(), key=lambda e : e['row'])
+    nCols = i2 - i1
+    if order :
+        mapData = np.memmap(_dataPath(state, header), dtype=np.float64, mode='r', shape=(len(order), nCols))
+    else :
+        mapData = np.empty((0, nCols))
+    return (vDoppler[i1:i2], mapData, [e['name'] for e in order],
+            np.array([e['t_start'] for e in order]))
+
+@instrument.timed()
+def refreshWaterfall(directory, state=None, chan=None, calib=None, vMin=None, vMax=None,
+                     settle=2., recheck=False) :
+    """Bring the waterfall of directory up to date.
+
+    chan, calib, vMin, vMax: analysis parameters; None takes them from
+    the existing waterfall, or DEFAULTS and getCalib(directory) for a new
+    one.  Values that differ
+    from those of an existing waterfall raise ValueError.
+    recheck=True also stats the triples already in the manifest and
+    redoes those that changed; by default only new names are looked at.
+    Returns the list of names that were (re)analysed.
+    """
+    if state is None : state = defaultState(directory)
+    os.makedirs(state, exist_ok=True)
+    header, entries = _readManifest(state)
+    params = {'chan': chan, 'calib': calib, 'vMin': vMin, 'vMax': vMax}
+    if header is not None :
+        for key, value in params.items() :
+            if value is not None and value != header[key] :
+                raise ValueError("{0:s}={1:s} differs from {2:s} of the waterfall in {3:s}".format(
+                    key, str(value), str(header[key]), state))
+        if _recover(state, header, entries) : _writeManifest(state, header, entries)
+    now = time.time()
+
+    todo = []
+    with instrument.stage("scan") :
+        with os.scandir(directory) as listing :
+            names = sorted(e.name.removesuffix(".json") for e in listing if e.name.endswith(".json"))
+        for name in names :
+            entry = entries.get(name)
+            if entry is not None and not recheck : continue
+            base_name = os.path.join(directory, name)
+            stamp = _stamp(base_name)
+            if entry is not None and stamp == entry['stamp'] : continue
+            if _failed.get((state, name)) == stamp : continue
+            try : metadata = getMetaData(base_name + ".json")
+            except ValueError : continue            # sidecar still being written
+            if not _complete(stamp, metadata['fft_size'], now, settle) : continue
+            todo.append((metadata['t_start'], name, base_name, stamp, metadata))
+    if not todo : return []
+
+    if header is None :
+        metadata = todo[0][4]
+        header = {'freq': metadata['freq'], 'srate': metadata['srate'], 'fft_size': metadata['fft_size']}
+        defaults = dict(DEFAULTS, calib=getCalib(directory))
+        header.update({key : defaults[key] if value is None else value for key, value in params.items()})
+        header['generation'] = 0
+    todo.sort()
+    rows = {}
+    freqs, vDoppler, i1, i2 = getWindow(header, header['vMin'], header['vMax'])
+    for item in todo :
+        t_start, name, base_name, stamp, metadata = item
+        try :
+            if any(metadata[key] != header[key] for key in ('freq', 'srate', 'fft_size')) :
+                raise ValueError("freq/srate/fft_size differ from those of the waterfall")
+            v, rows[name] = anaSpectrum(base_name, header['chan'], header['calib'],
+                                        header['vMin'], header['vMax'], metadata=metadata)
+            _failed.pop((state, name), None)
+        except Exception as e :
+            print("refreshWaterfall: skipped {0:s}: {1:s}: {2:s}".format(base_name, type(e).__name__, str(e)))
+            _failed[(state, name)] = stamp
+    todo = [item for item in todo if item[1] in rows]
+    if not todo : return []
+    nCols = i2 - i1
+
+    if not entries : _removeData(state)           # rows of a first refresh that crashed
+    path = _dataPath(state, header)
+    last = max([e['t_start'] for e in entries.values()], default=-np.inf)
+    changed = [item for item in todo if item[1] in entries]
+    added = [item for item in todo if item[1] not in entries]
+    if added and added[0][0] < last :
+        # out of order arrival: merge and rewrite everything sorted by time
+        vDoppler, old, names, t_start = loadWaterfall(state) if entries else (None, np.empty((0, nCols)), [], [])
+        merged = dict(zip(names, np.array(old)))
+        merged.update(rows)
+        for t, name, base_name, stamp, metadata in todo :
+            entries[name] = {'name': name, 't_start': t, 'stamp': stamp, 'row': -1}
+        order = sorted(entries.values(), key=lambda e : (e['t_start'], e['name']))
+        header['generation'] = header.get('generation', 0) + 1
+        with open(_dataPath(state, header), "wb") as f :
+            for row, entry in enumerate(order) :
+                entry['row'] = row
+                f.write(np.asarray(merged[entry['name']], dtype=np.float64).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        _writeManifest(state, header, entries)
+        os.remove(path)
+        return [item[1] for item in todo]
+
+    if changed :
+        with open(path, "r+b") as f :
+            for t, name, base_name, stamp, metadata in changed :
+                entry = entries[name]
+                f.seek(entry['row']*nCols*8)
+                f.write(np.asarray(rows[name], dtype=np.float64).tobytes())
+                entry['stamp'], entry['t_start'] = stamp, t
+    if added :
+        nRows = len(entries)
+        with open(path, "ab") as f :
+            for row, (t, name, base_name, stamp, metadata) in enumerate(added, nRows) :
+                f.write(np.asarray(rows[name], dtype=np.float64).tobytes())
+                entries[name] = {'name': name, 't_start': t, 'stamp': stamp, 'row': row}
+    if changed or len(entries) == len(added) :
+        _writeManifest(state, header, entries)
+    else :
+        with open(os.path.join(state, MANIFEST), "a") as f :
+            for t, name, base_name, stamp, metadata in added :
+                f.write(json.dumps(entries[name]) + "\n")
+    return [item[1] for item in todo]
+
+def watchWaterfall(directory, state=None, interval=30., callback=None, **kwargs) :
+    """Refresh the waterfall every interval seconds until interrupted.
+
+    callback(names) is called after every refresh that analysed something.
+    """
+    while True :
+        names = refreshWaterfall(directory, state, **kwargs)
+        if names and callback is not None : callback(names)
+        time.sleep(interval)
+
+if __name__ == "__main__" :
+    import argparse
+    parser = argparse.ArgumentParser(description="Incrementally update the waterfall of a campaign")
+    parser.add_argument("directory")
+    parser.add_argument("--state")
+    parser.add_argument("--interval", type=float, default=0.,
+                        help="seconds between refreshes; 0 refreshes once and exits")
+    parser.add_argument("--chan", type=int, help="default: that of the waterfall, or 1")
+    parser.add_argument("--calib", type=float, help="default: that of the waterfall, or getCalib(directory)")
+    parser.add_argument("--recheck", action="store_true", help="also redo observations whose files changed")
+    args = parser.parse_args()
+    report = lambda names : print("added/updated {0:d} observations, last {1:s}".format(len(names), names[-1]))
+    kwargs = dict(chan=args.chan, calib=args.calib, recheck=args.recheck)
+    if args.interval > 0 :
+        watchWaterfall(args.directory, args.state, args.interval, report, **kwargs)
+    else :
+        names = refreshWaterfall(args.directory, args.state, **kwargs)
+        if names : report(names)
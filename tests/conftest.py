@@ -0,0 +1,17 @@
+# Shared fixtures for the ccera tests; run from the repository root with
+#     python -m pytest -q
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ccera.synthetic import generateCampaign
+
+# a small synthetic doppler campaign, one per test
+@pytest.fixture
+def campaign(tmp_path) :
+    directory = str(tmp_path / "campaign")
+    return directory, generateCampaign(directory, 6, "doppler", 512)
@@ -0,0 +1,60 @@
+import os
+
+import numpy as np
+
+from ccera.archive import packCampaign, unpackCampaign, openCampaign, loadCampaign, readHeader
+from ccera.reader import openSeries
+
+def touch(file, seconds) :
+    t = os.path.getmtime(file) + seconds
+    os.utime(file, (t, t))
+
+def test_pack_load_roundtrip(campaign, tmp_path) :
+    directory, base_names = campaign
+    direct = loadCampaign(directory)
+    archive = packCampaign(directory)
+    assert readHeader(archive)['names'] == [os.path.basename(b) for b in base_names]
+    meta, spectra = loadCampaign(directory)
+    assert isinstance(spectra, np.memmap)
+    assert meta.dtype == direct[0].dtype
+    for field in meta.dtype.names : assert np.array_equal(meta[field], direct[0][field]), field
+    assert np.array_equal(spectra, direct[1])
+    assert np.array_equal(spectra[2, 1], openSeries(base_names[2] + "_2.avg"))
+
+    target = str(tmp_path / "restored")
+    unpackCampaign(archive, target)
+    for base_name in base_names :
+        name = os.path.basename(base_name)
+        for suffix in (".json", "_1.avg", "_2.avg") :
+            with open(base_name + suffix, "rb") as a, open(os.path.join(target, name + suffix), "rb") as b :
+                assert a.read() == b.read()
+
+def test_stale_archive_is_not_used(campaign) :
+    directory, base_names = campaign
+    archive = packCampaign(directory)
+    assert isinstance(loadCampaign(directory)[1], np.memmap)
+
+    # a re-reduced data file newer than the archive
+    vals = np.fromfile(base_names[1] + "_1.avg", dtype=np.float32)
+    (vals + 1.).tofile(base_names[1] + "_1.avg")
+    touch(base_names[1] + "_1.avg", 10.)
+    meta, spectra = loadCampaign(directory)
+    assert not isinstance(spectra, np.memmap)
+    assert np.array_equal(spectra[1, 0], vals + 1.)
+
+    # same number of files, different names
+    packCampaign(directory)
+    old = base_names[3]
+    new = os.path.join(directory, "2099-01-01-0000")
+    for suffix in (".json", "_1.avg", "_2.avg") : os.rename(old + suffix, new + suffix)
+    touch(archive, 100.)
+    meta, spectra = loadCampaign(directory)
+    assert not isinstance(spectra, np.memmap)
+    assert "2099-01-01-0000" in meta['name']
+
+def test_open_archive_file(campaign) :
+    directory, base_names = campaign
+    archive = packCampaign(directory)
+    meta, spectra = openCampaign(archive)
+    assert spectra.shape[:2] == (len(base_names), 2)
+    assert not spectra.flags.writeable
@@ -0,0 +1,24 @@
+import numpy as np
+from numpy.polynomial import Chebyshev
+
+from ccera.baseline import getWeights, fitBackground, fitBackgroundStack
+
+def chebyshevFit(vDoppler, power, n, vSignal) :
+    return Chebyshev.fit(vDoppler, power, n, w=getWeights(vDoppler, vSignal))(vDoppler)
+
+def test_stack_matches_chebyshev_fit() :
+    rng = np.random.default_rng(1)
+    vDoppler = np.linspace(-300., 300., 1396)
+    line = 30.*np.exp(-0.5*np.square(vDoppler/40.))
+    powers = rng.normal(100., 5., (7, 1)) + 0.02*vDoppler + line + rng.normal(0., 1., (7, len(vDoppler)))
+    background = fitBackgroundStack(vDoppler, powers, 5, 200.)
+    assert background.shape == powers.shape
+    for power, fitted in zip(powers, background) :
+        assert np.allclose(fitted, chebyshevFit(vDoppler, power, 5, 200.), rtol=1.e-9, atol=1.e-8)
+
+def test_single_spectrum_keeps_its_shape() :
+    vDoppler = np.linspace(-300., 300., 500)
+    power = 1. + 1.e-3*vDoppler**2
+    fitted = fitBackground(vDoppler, power, 5, 200.)
+    assert fitted.shape == power.shape
+    assert np.allclose(fitted, chebyshevFit(vDoppler, power, 5, 200.))
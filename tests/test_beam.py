@@ -0,0 +1,43 @@
+from math import factorial, pi
+
+import numpy as np
+
+from ccera.beam import airy, airyBeam, airyJacobian
+
+# the 19 term power series the Lab03/Lab04 scripts used to sum
+def airySeries(r) :
+    t, I = 0.5*pi*r, 1.
+    for k in range(1, 20) :
+        I = I + (-1)**k * t**(2*k) / (factorial(k)*factorial(k+1))
+    return I*I
+
+def test_closed_form_matches_series() :
+    # the series is accurate where it converges quickly, |r| < 2
+    times = np.linspace(1855. - 650., 1855. + 650., 201)
+    r = (times - 1855.)/325.
+    series = 150. + 13250.*np.array([airySeries(x) for x in r])
+    assert np.allclose(airyBeam(times, 1855., 150., 13250., 325.), series, rtol=1.e-9, atol=1.e-6)
+
+def test_airy_helper_grid() :
+    times, power = airy(1855., 150., 13250., 325.)
+    assert len(times) == 200
+    assert np.isclose(times[0], 855.) and np.isclose(times[-1], 2855.)
+    # the grid has no sample at mean_time itself
+    assert np.isclose(power.max(), 150. + 13250., rtol=1.e-3)
+
+def test_batch_of_beams_broadcasts() :
+    times = np.linspace(0., 3600., 500)
+    means = np.array([1500., 1800., 2100.])
+    batch = airyBeam(times, means, 150., 13250., 325.)
+    assert batch.shape == (3, 500)
+    for i, m in enumerate(means) : assert np.allclose(batch[i], airyBeam(times, m, 150., 13250., 325.))
+
+def test_jacobian_matches_finite_differences() :
+    times = np.linspace(1000., 2700., 300)
+    p = np.array([1855., 150., 13250., 325.])
+    jac = airyJacobian(times, *p)
+    for i, h in enumerate([1.e-3, 1.e-4, 1.e-3, 1.e-3]) :
+        dp = np.zeros(4)
+        dp[i] = h
+        numeric = (airyBeam(times, *(p + dp)) - airyBeam(times, *(p - dp)))/(2.*h)
+        assert np.allclose(jac[:, i], numeric, rtol=1.e-5, atol=1.e-5*np.abs(numeric).max())
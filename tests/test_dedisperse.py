@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from ccera.dedisperse import dedisperse, dedisperseChunks, getDelays
+
+FREQS = np.linspace(1400., 1430., 32)
+T_SAMPLE = 1.e-4
+
+# noise plus one pulse at sample t0 of the top channel, dispersed at dm
+def filterbank(dm, t0=3000, nSamples=8000, seed=0) :
+    rng = np.random.default_rng(seed)
+    data = rng.standard_normal((nSamples, len(FREQS)))
+    data[t0 + getDelays(FREQS, dm, T_SAMPLE), np.arange(len(FREQS))] += 3.
+    return data.astype(np.float32)
+
+def test_zero_dm_is_the_channel_sum() :
+    data = filterbank(0.)
+    out = dedisperse(data, FREQS, T_SAMPLE, [0.])
+    assert np.allclose(out[0], data.sum(axis=1), atol=1.e-4)
+
+def test_pulse_lines_up_at_its_dm() :
+    data = filterbank(50.)
+    dms = np.arange(0., 100.5, 5.)
+    out = dedisperse(data, FREQS, T_SAMPLE, dms, nSub=4)
+    best = np.unravel_index(np.argmax(out), out.shape)
+    assert dms[best[0]] == 50. and best[1] == 3000
+    assert out[10, 3000] > 0.9*3.*len(FREQS)
+
+def test_subbands_match_brute_force() :
+    # the subband delays are within a sample of the exact ones, so on a
+    # slowly varying signal the two agree closely
+    t = np.arange(8000)[:, np.newaxis]
+    data = np.sin(2.*np.pi*t/800. + np.arange(len(FREQS)))
+    for dm in (7., 50., 93.) :
+        out = dedisperse(data, FREQS, T_SAMPLE, [dm], nSub=4)[0]
+        delays = getDelays(FREQS, dm, T_SAMPLE)
+        brute = sum(data[d:d+len(out), c] for c, d in enumerate(delays))
+        assert np.allclose(out, brute, atol=0.01*len(FREQS))
+
+def test_chunks_join_up() :
+    data = filterbank(30.)
+    dms = [0., 12.5, 30., 61.]
+    whole = dedisperse(data, FREQS, T_SAMPLE, dms, chunk=1<<16)
+    pieces = dedisperse(data, FREQS, T_SAMPLE, dms, chunk=999)
+    assert np.array_equal(whole, pieces)
+    starts = [start for start, block in dedisperseChunks(data, FREQS, T_SAMPLE, dms, chunk=999)]
+    assert starts == list(range(0, whole.shape[1], 999))
+
+def test_negative_dm_is_rejected() :
+    with pytest.raises(ValueError) : dedisperse(filterbank(0.), FREQS, T_SAMPLE, [10., -1.])
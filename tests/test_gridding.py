@@ -0,0 +1,39 @@
+import numpy as np
+
+from ccera.gridding import CubeGrid, getAxis, gridSpectra
+
+def test_overlapping_pointings_are_averaged() :
+    lonAxis = getAxis(0., 10., 1.)
+    spectra = np.array([[1., 2., 3.], [3., 4., 5.]])
+    cube, weight = gridSpectra([5., 5.], [0., 0.], spectra, lonAxis, [0.], fwhm=1.5, fill=0.)
+    assert cube.shape == (len(lonAxis), 1, 3)
+    assert np.allclose(cube[5, 0], [2., 3., 4.])
+    assert np.isclose(weight[5, 0], 2.) and weight[4, 0] > 0. and weight[0, 0] == 0.
+    assert np.all(cube[0, 0] == 0.)
+
+def test_batches_and_weights() :
+    rng = np.random.default_rng(0)
+    lon, lat = rng.uniform(0., 20., 500), rng.uniform(-3., 3., 500)
+    spectra = rng.standard_normal((500, 16))
+    weights = rng.uniform(0.5, 2., 500)
+    lonAxis, latAxis = getAxis(0., 20., 0.5), getAxis(-3., 3., 0.5)
+    one = gridSpectra(lon, lat, spectra, lonAxis, latAxis, 1., weights=weights)
+    many = gridSpectra(lon, lat, spectra, lonAxis, latAxis, 1., weights=weights, batch=37)
+    assert np.allclose(one[1], many[1])
+    assert np.allclose(one[0], many[0], equal_nan=True)
+
+    # the slow definition: Gaussian weights of every pointing within the support
+    i, j = 10, 6
+    dx = (lonAxis[i] - lon)*np.cos(np.radians(lat))
+    dy = latAxis[j] - lat
+    r2 = dx*dx + dy*dy
+    w = np.where(r2 <= 1.5**2, np.exp(-4.*np.log(2.)*r2), 0.)*weights
+    assert np.isclose(one[1][i, j], w.sum())
+    assert np.allclose(one[0][i, j], w @ spectra/w.sum())
+
+def test_longitudes_wrap_and_nan_rows_are_skipped() :
+    grid = CubeGrid(getAxis(-5., 5., 1.), [0.], 2, fwhm=1.)
+    grid.add([359.5, 0.5, 1.], [0., 0., 0.], np.array([[1., 1.], [3., 3.], [np.nan, 7.]]))
+    cube, weight = grid.cube()
+    assert np.allclose(cube[5, 0], [2., 2.])
+    assert np.isnan(cube[0, 0]).all()
@@ -0,0 +1,67 @@
+import json
+import os
+
+from ccera.index import updateIndex, loadIndex, selectDirectories, queryIndex, baseNames
+from ccera.synthetic import generateCampaign
+
+def test_only_changed_sidecars_are_parsed(campaign, tmp_path, monkeypatch) :
+    directory, base_names = campaign
+    cache = str(tmp_path / "index.npy")
+    index = updateIndex([directory], cache)
+    assert baseNames(index) == [os.path.normpath(b) for b in base_names]
+
+    parsed = []
+    import ccera.index
+    record = ccera.index._record
+    monkeypatch.setattr(ccera.index, "_record", lambda path, stat : parsed.append(path) or record(path, stat))
+    mtime = os.path.getmtime(cache)
+    assert len(updateIndex([directory], cache)) == len(base_names)
+    assert parsed == [] and os.path.getmtime(cache) == mtime
+
+    with open(base_names[2] + ".json") as f : metadata = json.load(f)
+    metadata['target'] = "changed"
+    with open(base_names[2] + ".json", "w") as f : json.dump(metadata, f)
+    os.utime(base_names[2] + ".json", (mtime + 10., mtime + 10.))
+    index = updateIndex([directory], cache)
+    assert parsed == [os.path.normpath(base_names[2] + ".json")]
+    assert queryIndex(index, target="changed")['name'].tolist() == [os.path.basename(base_names[2])]
+
+def test_other_directories_are_kept(campaign, tmp_path) :
+    directory, base_names = campaign
+    other = generateCampaign(str(tmp_path / "other"), 3, "doppler", 512, t_start=1.8e9)
+    cache = str(tmp_path / "index.npy")
+    updateIndex([directory, str(tmp_path / "other")], cache)
+
+    # refreshing one directory keeps the rows of the other
+    index = updateIndex([directory + "/"], cache)
+    assert len(index) == len(base_names) + len(other)
+    assert len(loadIndex(cache)) == len(index)
+    assert len(selectDirectories(index, [str(tmp_path / "other")])) == len(other)
+
+    # deleted sidecars only disappear from the directory that is scanned
+    os.remove(base_names[0] + ".json")
+    index = updateIndex([directory], cache)
+    assert len(index) == len(base_names) - 1 + len(other)
+
+def test_long_paths_are_not_truncated(tmp_path) :
+    directory = str(tmp_path / ("x"*120) / ("y"*120) / ("z"*120))
+    base_names = generateCampaign(directory, 2, "doppler", 512)
+    cache = str(tmp_path / "index.npy")
+    updateIndex([directory], cache)
+    index = loadIndex(cache)
+    assert baseNames(index) == [os.path.normpath(b) for b in base_names]
+    # the stored paths match the files, so nothing is parsed again
+    mtime = os.path.getmtime(cache)
+    assert len(updateIndex([directory], cache)) == 2
+    assert os.path.getmtime(cache) == mtime
+
+def test_unreadable_sidecar_is_skipped(campaign, tmp_path, capsys) :
+    directory, base_names = campaign
+    cache = str(tmp_path / "index.npy")
+    with open(base_names[1] + ".json", "w") as f : f.write('{"fft_size": 10')
+    index = updateIndex([directory], cache)
+    assert len(index) == len(base_names) - 1
+    assert "skipped" in capsys.readouterr().out
+    # written out completely by the next update
+    generateCampaign(directory, len(base_names), "doppler", 512)
+    assert len(updateIndex([directory], cache)) == len(base_names)
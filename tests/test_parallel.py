@@ -0,0 +1,30 @@
+import os
+
+import numpy as np
+
+from ccera.archive import loadCampaign
+from ccera.parallel import anaCampaign
+from ccera.spectrum import anaSpectrum
+from ccera.synthetic import generateCampaign
+
+def test_rows_match_anaSpectrum(campaign) :
+    directory, base_names = campaign
+    vDoppler, mapData, errors = anaCampaign(base_names, 2, chunksize=2, calib=1.3e5)
+    assert errors == []
+    for base_name, row in zip(base_names, mapData) :
+        v, power = anaSpectrum(base_name, calib=1.3e5)
+        assert np.array_equal(v, vDoppler) and np.allclose(row, power)
+    meta, spectra = loadCampaign(directory)
+    assert np.array_equal(anaCampaign(base_names, 1, meta=meta, calib=1.3e5)[1], mapData)
+
+def test_bad_files_leave_rows_of_nan(campaign, tmp_path) :
+    directory, base_names = campaign
+    os.remove(base_names[1] + "_1.avg")
+    # an observation with another velocity axis
+    other = generateCampaign(str(tmp_path / "other"), 1, "doppler", 1024)[0]
+    names = base_names + [other]
+    vDoppler, mapData, errors = anaCampaign(names, 2, chunksize=4)
+    assert [row for row, base_name, message in errors] == [1, len(base_names)]
+    assert "velocity axis" in errors[-1][2]
+    assert np.isnan(mapData[[1, -1]]).all()
+    assert np.isfinite(np.delete(mapData, [1, len(base_names)], axis=0)).all()
@@ -0,0 +1,20 @@
+import numpy as np
+
+from ccera.galaxy import G, R_D, mUnit, besselExact, diskVelocity
+from ccera.profiles import circularVelocity, compareExponentialDisk
+
+def test_exponential_disk_matches_closed_form() :
+    err, seconds = compareExponentialDisk(n=2048)
+    assert err < 1.e-3
+
+def test_disk_and_sphere_add_in_quadrature() :
+    rTab = np.geomspace(1.e-6*R_D, 30.*R_D, 4096)
+    surface = 0.5*mUnit/(2.*np.pi*R_D**2)*np.exp(-rTab/R_D)
+    radius = np.linspace(0.5*R_D, 8.*R_D, 50)
+    # uniform sphere of radius 30 R_D: M(<r) grows as r^3
+    rho = 0.3*mUnit/(4./3.*np.pi*(30.*R_D)**3)
+    v = circularVelocity(radius, rTab, surface=surface, density=np.full(len(rTab), rho))
+    vDisk = np.sqrt(2.*G*0.5*mUnit/R_D*besselExact(0.5*radius/R_D))
+    vSphere = np.sqrt(G*4./3.*np.pi*rho*radius**2)
+    assert np.allclose(v, np.sqrt(vDisk**2 + vSphere**2), rtol=2.e-3)
+    assert np.allclose(diskVelocity(radius, 0.5), vDisk, rtol=1.e-5)
@@ -0,0 +1,22 @@
+import numpy as np
+
+from ccera.pulsar import foldSeries, foldTrials, profileSignificance
+
+def test_trials_match_single_folds() :
+    rng = np.random.default_rng(0)
+    series = [rng.standard_normal(100003).astype(np.float32) for chan in range(2)]
+    periods = 0.7145*(1. + 1.e-4*np.arange(-3, 4))
+    profiles, counts = foldTrials(series, 3.84e-4, periods, pdots=1.e-12, nBins=32, chunk=4096)
+    for period, profile, count in zip(periods, profiles, counts) :
+        single, singleCounts = foldSeries(series, 3.84e-4, period, 1.e-12, nBins=32, chunk=10000)
+        assert np.array_equal(count, singleCounts)
+        assert np.allclose(profile, single, rtol=1.e-12)
+
+def test_pulse_folds_up_at_its_period() :
+    t = 1.e-3*np.arange(200000)
+    phase = (t/0.25) % 1. - 0.5
+    rng = np.random.default_rng(1)
+    series = [(rng.standard_normal(len(t)) + 0.2*np.exp(-0.5*np.square(phase/0.02))).astype(np.float32)]
+    profiles, counts = foldTrials(series, 1.e-3, [0.25, 0.2513])
+    significance = profileSignificance(profiles)
+    assert significance[0] > 10. and significance[0] > 3.*significance[1]
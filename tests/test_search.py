@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from ccera.search import powerSpectrum, harmonicSum, whiten
+
+@pytest.mark.parametrize("nSamples", [4096, 10007, 65536 + 3])
+def test_four_step_matches_numpy(tmp_path, nSamples) :
+    rng = np.random.default_rng(nSamples)
+    series = [rng.normal(1., 1., nSamples).astype(np.float32) for i in range(2)]
+    # a small memory budget forces several column and row blocks
+    power, df = powerSpectrum(series, 1.e-3, str(tmp_path), memory=1<<16)
+    x = series[0].astype(np.float64) + series[1]
+    x -= x.mean()
+    nPad = int(round(1./(df*1.e-3)))
+    assert nPad >= nSamples and len(power) == nPad//2 + 1
+    expected = np.abs(np.fft.rfft(x, nPad))**2
+    assert np.allclose(power, expected[:len(power)], rtol=1.e-3, atol=1.e-4*expected.max())
+
+def test_empty_series_is_rejected(tmp_path) :
+    with pytest.raises(ValueError) :
+        powerSpectrum([np.zeros(0, dtype=np.float32)], 1.e-3, str(tmp_path))
+
+def test_one_candidate_per_pulsar(tmp_path) :
+    rng = np.random.default_rng(0)
+    t = 1.e-3*np.arange(1<<18)
+    phase = (t/0.0714) % 1. - 0.5
+    x = (rng.standard_normal(len(t)) + 0.3*np.exp(-0.5*np.square(phase/0.02))).astype(np.float32)
+    power, df = powerSpectrum([x], 1.e-3, str(tmp_path))
+    power = whiten(np.array(power))
+    found = harmonicSum(power, df, fMin=1., nCandidates=10)
+    # the strongest candidate is the pulsar or one of its harmonics
+    ratio = found['freq'][0]*0.0714
+    assert abs(ratio - round(ratio)) < 2.*df*0.0714*round(ratio)
+    # neither the neighbouring bins nor the harmonics come back
+    strong = found[found['sigma'] > 8.]
+    assert len(strong) == 1
+
+def test_weaker_pulsar_survives_a_bright_one(tmp_path) :
+    rng = np.random.default_rng(1)
+    t = 1.e-3*np.arange(1<<18)
+    x = rng.standard_normal(len(t))
+    for period, height, width in ((0.0714, 0.3, 0.02), (0.2313, 0.12, 0.05)) :
+        phase = (t/period) % 1. - 0.5
+        x += height*np.exp(-0.5*np.square(phase/width))
+    power, df = powerSpectrum([x.astype(np.float32)], 1.e-3, str(tmp_path))
+    found = harmonicSum(whiten(np.array(power)), df, fMin=1., nCandidates=5)
+    # the harmonics of the bright pulsar do not use up the candidate slots
+    assert len(found) == 5
+    ratio = found['freq']*0.2313
+    assert np.any((np.abs(ratio - np.round(ratio)) < 2.*df*0.2313*np.round(ratio)) & (np.round(ratio) >= 1))
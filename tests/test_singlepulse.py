@@ -0,0 +1,40 @@
+import numpy as np
+
+from ccera.singlepulse import searchPulses, mergeEvents, EVENT_DTYPE
+
+def series(pulses, nSamples=1<<17, seed=0) :
+    rng = np.random.default_rng(seed)
+    x = 5. + rng.standard_normal(nSamples)
+    for start, width, height in pulses : x[start:start+width] += height
+    return x.astype(np.float32)
+
+def test_pulses_are_found_once_with_their_width() :
+    pulses = [(20000, 1, 12.), (70000, 16, 3.), (100000, 64, 1.5)]
+    events = searchPulses([series(pulses)], 1.e-3, threshold=7.)
+    assert len(events) == 3
+    for event, (start, width, height) in zip(events, pulses) :
+        assert abs(event['sample'] - start) <= width//2 and event['width'] in (width//2, width, 2*width)
+        assert np.isclose(event['time'], 1.e-3*event['sample'])
+        assert event['snr'] > 7.
+
+def test_chunk_edges_and_polarizations() :
+    pulses = [(1<<15, 8, 5.), (3*(1<<15) - 4, 8, 5.)]
+    x = series(pulses)
+    # the pulses are split in two halves of equal height across polarizations
+    split = [0.5*x, 0.5*x]
+    one = searchPulses(split, 1.e-3, threshold=7.)
+    chunked = searchPulses(split, 1.e-3, threshold=7., chunk=1<<15)
+    assert len(one) == 2
+    assert np.array_equal(one['sample'], chunked['sample'])
+    assert np.array_equal(one['width'], chunked['width'])
+
+def test_quiet_series_has_no_events() :
+    assert len(searchPulses([series([])], 1.e-3, threshold=7.)) == 0
+
+def test_merge_keeps_the_strongest_overlapping_event() :
+    events = np.zeros(4, dtype=EVENT_DTYPE)
+    events['sample'] = [100, 104, 200, 98]
+    events['width'] = [8, 2, 4, 16]
+    events['snr'] = [9., 12., 7., 8.]
+    merged = mergeEvents(events)
+    assert merged['sample'].tolist() == [104, 200]
@@ -0,0 +1,39 @@
+import json
+import os
+
+import numpy as np
+
+from ccera.beam import airyBeam
+from ccera.transit import fitTransit, fitRun
+
+TIMES = 2.29376*np.arange(1569)
+TRUE = np.array([1855., 150., 13250., 325.])
+
+def scan(p=TRUE, noise=150., seed=0) :
+    rng = np.random.default_rng(seed)
+    return airyBeam(TIMES, *p) + noise*rng.standard_normal(len(TIMES))
+
+def test_fit_recovers_the_beam() :
+    power = scan()
+    power[[300, 1100]] += 2.e4          # RFI spikes, larger than the transit
+    p, errors, rms, n, flag = fitTransit(TIMES, power)
+    assert flag == ""
+    assert np.all(np.abs(p - TRUE) < 5.*errors)
+    assert errors[0] < 2. and abs(rms - 150.) < 100.
+
+def test_noise_only_is_rejected() :
+    p, errors, rms, n, flag = fitTransit(TIMES, scan(p=(1855., 150., 0., 325.)))
+    assert flag != ""
+
+def test_polarizations_that_disagree_are_flagged(tmp_path) :
+    base_name = str(tmp_path / "2024-07-03-1340")
+    metadata = {'t_sample': 2.29376, 't_start': 1.72e9, 'n_chans': 2, 'target': "Sun"}
+    with open(base_name + ".json", "w") as f : json.dump(metadata, f)
+    for chan in (1, 2) :
+        (scan(seed=chan)/17.3).astype(np.float32).tofile(base_name + "_{0:d}.sum".format(chan))
+    rows = fitRun(base_name)
+    assert rows['ok'].all() and rows['name'].tolist() == [os.path.basename(base_name)]*2
+
+    (scan((2400., 150., 13250., 325.), seed=2)/17.3).astype(np.float32).tofile(base_name + "_2.sum")
+    rows = fitRun(base_name)
+    assert not rows['ok'].any() and set(rows['flag']) == {"channels disagree"}
@@ -0,0 +1,96 @@
+import os
+
+import numpy as np
+import pytest
+
+from ccera.parallel import anaCampaign
+from ccera.synthetic import generateCampaign
+from ccera.watch import refreshWaterfall, loadWaterfall, WATERFALL, MANIFEST
+
+# move the triples of base_names out of the directory and back
+def hide(base_names) :
+    for b in base_names :
+        for suffix in (".json", "_1.avg", "_2.avg") : os.rename(b + suffix, b + suffix + ".hold")
+
+def show(base_names) :
+    for b in base_names :
+        for suffix in (".json", "_1.avg", "_2.avg") : os.rename(b + suffix + ".hold", b + suffix)
+
+def expected(base_names) :
+    return anaCampaign(base_names, 1)[1]
+
+def test_incremental_refresh(campaign, tmp_path) :
+    directory, base_names = campaign
+    state = str(tmp_path / "state")
+    hide(base_names[4:])
+    assert len(refreshWaterfall(directory, state, settle=0.)) == 4
+    show(base_names[4:])
+    assert refreshWaterfall(directory, state, settle=0.) == [os.path.basename(b) for b in base_names[4:]]
+    assert refreshWaterfall(directory, state, settle=0.) == []
+    vDoppler, mapData, names, t_start = loadWaterfall(state)
+    assert names == [os.path.basename(b) for b in base_names]
+    assert np.allclose(mapData, expected(base_names))
+
+def test_recovery_after_crash(campaign, tmp_path) :
+    directory, base_names = campaign
+    state = str(tmp_path / "state")
+    hide(base_names[3:])
+    refreshWaterfall(directory, state, settle=0.)
+    # rows appended without their manifest lines, and a half-written line
+    with open(os.path.join(state, WATERFALL), "ab") as f : f.write(b"\0"*1234)
+    with open(os.path.join(state, MANIFEST), "a") as f : f.write('{"name": "2024-')
+    show(base_names[3:])
+    refreshWaterfall(directory, state, settle=0.)
+    vDoppler, mapData, names, t_start = loadWaterfall(state)
+    assert os.path.getsize(os.path.join(state, WATERFALL)) == mapData.nbytes
+    assert np.allclose(mapData, expected(base_names))
+
+    # a row lost before its manifest line was written is analysed again
+    with open(os.path.join(state, WATERFALL), "ab") as f : f.truncate(mapData.nbytes - 8)
+    assert refreshWaterfall(directory, state, settle=0.) == [os.path.basename(base_names[-1])]
+    assert np.allclose(loadWaterfall(state)[1], expected(base_names))
+
+def test_mismatched_files_and_parameters(campaign, tmp_path, capsys) :
+    directory, base_names = campaign
+    state = str(tmp_path / "state")
+    bad = generateCampaign(str(tmp_path / "bad"), 1, "doppler", 1024, t_start=1.8e9)[0]
+    for suffix in (".json", "_1.avg", "_2.avg") :
+        os.rename(bad + suffix, os.path.join(directory, "2030-01-01-0000" + suffix))
+    names = refreshWaterfall(directory, state, settle=0.)
+    assert "2030-01-01-0000" not in names and len(names) == len(base_names)
+    assert "skipped" in capsys.readouterr().out
+    with pytest.raises(ValueError) : refreshWaterfall(directory, state, calib=1.3e5)
+    assert refreshWaterfall(directory, state, chan=1, settle=0.) == []
+
+def test_crash_during_first_refresh(campaign, tmp_path) :
+    directory, base_names = campaign
+    state = str(tmp_path / "state")
+    # rows written by a first refresh that died before its manifest
+    os.makedirs(state)
+    with open(os.path.join(state, WATERFALL), "wb") as f : f.write(b"\1"*4096)
+    refreshWaterfall(directory, state, settle=0.)
+    vDoppler, mapData, names, t_start = loadWaterfall(state)
+    assert os.path.getsize(os.path.join(state, WATERFALL)) == mapData.nbytes
+    assert np.allclose(mapData, expected(base_names))
+
+def test_out_of_order_rewrite_is_atomic(campaign, tmp_path, monkeypatch) :
+    directory, base_names = campaign
+    state = str(tmp_path / "state")
+    hide(base_names[2:3])
+    refreshWaterfall(directory, state, settle=0.)
+    before = np.array(loadWaterfall(state)[1])
+    show(base_names[2:3])
+
+    # die after the reordered data is written but before the manifest
+    import ccera.watch
+    def crash(*args) : raise KeyboardInterrupt
+    monkeypatch.setattr(ccera.watch, "_writeManifest", crash)
+    with pytest.raises(KeyboardInterrupt) : refreshWaterfall(directory, state, settle=0.)
+    monkeypatch.undo()
+    assert np.array_equal(loadWaterfall(state)[1], before)
+
+    assert refreshWaterfall(directory, state, settle=0.) == [os.path.basename(base_names[2])]
+    vDoppler, mapData, names, t_start = loadWaterfall(state)
+    assert names == [os.path.basename(b) for b in base_names]
+    assert np.allclose(mapData, expected(base_names))
+    assert sorted(os.listdir(state)) == [MANIFEST, "waterfall.1.f8"]